@@ -0,0 +1,254 @@
+# analytics.py
+# ---------------------------------------------------------
+# Analítica de inscripciones: conteos diarios precalculados
+# ---------------------------------------------------------
+# La tabla EstadisticaDiaria guarda, por día, cuántas inscripciones
+# hubo por curso, cuántos alumnos se registraron y cuántos de esos
+# registros terminaron inscribiéndose (conversión, contada en el día
+# del registro). Se mantiene en la misma transacción que el INSERT:
+#   · formulario / ORM  → before_flush
+#   · importación / bulk → do_orm_execute (insert(Inscripcion), filas)
+# así el panel nunca recorre Inscripcion; agrupa unos cientos de
+# filas por semana o mes y la respuesta JSON se guarda en memoria
+# hasta el próximo commit que cambie los conteos (instance/
+# analytics.version avisa a los demás workers).
+#
+# Si algo se desincroniza (SQL a mano, restauraciones):
+#   flask --app app analytics-rebuild
+#
+# Archivar inscripciones (archive.py) no resta nada: los conteos son
+# de lo que entró, y rebuild suma también las particiones archivadas.
+import os, time, hashlib, threading
+from collections import Counter, OrderedDict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, func
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.orm import Session
+
+from models import db, Inscripcion, User, EstadisticaDiaria
+from archive import archive
+
+GROUPS = ("dia", "semana", "mes")
+
+
+def _day(value):
+    # func.date() devuelve str en SQLite y date en PostgreSQL
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+def _period(day, group):
+    if group == "semana":
+        return day - timedelta(days=day.weekday())      # lunes
+    if group == "mes":
+        return day.replace(day=1)
+    return day
+
+def _periods(desde, hasta, group):
+    out, day = [], _period(desde, group)
+    while day <= hasta:
+        out.append(day)
+        if group == "mes":
+            day = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            day += timedelta(days=7 if group == "semana" else 1)
+    return out
+
+
+class Analytics:
+
+    def __init__(self, app=None):
+        self.app    = None
+        self._lock  = threading.Lock()
+        self._cache = OrderedDict()          # (desde, hasta, grupo, versión) → (json, etag)
+        self._stamp = None
+        if app is not None:
+            self.init_app(app)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app):
+        app.config.setdefault("ANALYTICS_DEFAULT_DAYS", 90)
+        app.config.setdefault("ANALYTICS_CACHE_SIZE", 64)
+        self.app = app
+        os.makedirs(app.instance_path, exist_ok=True)
+        self._stamp = os.path.join(app.instance_path, "analytics.version")
+        if not os.path.exists(self._stamp):
+            self._touch()
+
+        event.listen(Session, "before_flush", self._before_flush)
+        event.listen(Session, "do_orm_execute", self._on_execute)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_soft_rollback", self._after_rollback)
+        app.extensions["analytics"] = self
+
+    def _touch(self):
+        with open(self._stamp, "w") as fh:
+            fh.write(str(time.time()))
+
+    def version(self):
+        try:
+            return os.stat(self._stamp).st_mtime_ns
+        except OSError:
+            return None
+
+    # ─── mantenimiento incremental ─────────────────────
+    def _before_flush(self, sess, flush_context, instances):
+        now = datetime.utcnow()
+        insc, users = [], []
+        for obj in sess.new:
+            if isinstance(obj, Inscripcion):
+                obj.fecha = obj.fecha or now          # el día contado = el guardado
+                insc.append((obj.email, obj.curso, obj.fecha))
+            elif isinstance(obj, User):
+                obj.created = obj.created or now
+                users.append((obj.email, obj.created, obj.role))
+        if insc or users:
+            self._apply(sess.connection(), insc, users)
+            sess.info["analytics_dirty"] = True
+
+    def _on_execute(self, state):
+        # db.session.execute(db.insert(Inscripcion), [dicts]) no pasa por el flush
+        if not state.is_insert or state.bind_mapper is None:
+            return
+        model = state.bind_mapper.class_
+        if model not in (Inscripcion, User) or not isinstance(state.parameters, list):
+            return
+        now = datetime.utcnow()
+        if model is Inscripcion:
+            rows = [(p["email"], p["curso"], p.setdefault("fecha", now)) for p in state.parameters]
+            insc, users = rows, []
+        else:
+            rows = [(p["email"], p.setdefault("created", now), p.get("role", "guest"))
+                    for p in state.parameters]
+            insc, users = [], rows
+        conn = state.session.connection(bind_arguments={"clause": state.statement})
+        self._apply(conn, insc, users)
+        state.session.info["analytics_dirty"] = True
+
+    def _apply(self, conn, insc, users):
+        """Suma a EstadisticaDiaria lo que aportan las filas nuevas.
+        Se llama ANTES de que existan en la BD."""
+        counts = Counter()
+        for _, curso, fecha in insc:
+            counts[(fecha.date(), "inscripcion", curso)] += 1
+        students = {email: created for email, created, role in users if role == "student"}
+        for created in students.values():
+            counts[(created.date(), "registro", "")] += 1
+
+        # conversión: alumno con al menos una inscripción, en el día de su registro
+        new_insc = {email for email, _, _ in insc}
+        emails = list(new_insc | set(students))
+        if emails:
+            prior = set(conn.scalars(db.select(Inscripcion.email).distinct()
+                                     .where(Inscripcion.email.in_(emails))))
+            prior.update(archive.emails().intersection(emails))
+            for email, created in students.items():
+                if email in prior or email in new_insc:
+                    counts[(created.date(), "conversion", "")] += 1
+            primeras = [e for e in new_insc if e not in prior and e not in students]
+            if primeras:
+                for _, created in conn.execute(
+                        db.select(User.email, User.created)
+                        .where(User.email.in_(primeras), User.role == "student")):
+                    counts[(created.date(), "conversion", "")] += 1
+        self._upsert(conn, counts)
+
+    @staticmethod
+    def _upsert(conn, counts):
+        if not counts:
+            return
+        table = EstadisticaDiaria.__table__
+        insert = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=["dia", "serie", "curso"],
+                                          set_={"n": table.c.n + stmt.excluded.n})
+        conn.execute(stmt, [{"dia": d, "serie": s, "curso": c, "n": n}
+                            for (d, s, c), n in counts.items()])
+
+    def _after_commit(self, sess):
+        if sess.info.pop("analytics_dirty", False):
+            self._touch()
+
+    def _after_rollback(self, sess, previous_transaction):
+        if previous_transaction.parent is None:
+            sess.info.pop("analytics_dirty", None)
+
+    # ─── reconstrucción ────────────────────────────────
+    def rebuild(self):
+        """Recalcula EstadisticaDiaria desde cero. Devuelve filas escritas."""
+        counts = Counter()
+        dia = func.date(Inscripcion.fecha)
+        for d, curso, n in db.session.execute(
+                db.select(dia, Inscripcion.curso, func.count()).group_by(dia, Inscripcion.curso)):
+            counts[(_day(d), "inscripcion", curso)] += n
+        for r in archive.scan():
+            counts[(r.fecha.date(), "inscripcion", r.curso)] += 1
+
+        dia = func.date(User.created)
+        alumnos = db.select(dia, func.count()).where(User.role == "student").group_by(dia)
+        for d, n in db.session.execute(alumnos):
+            counts[(_day(d), "registro", "")] += n
+        inscrito = db.select(Inscripcion.id).where(Inscripcion.email == User.email).exists()
+        for d, n in db.session.execute(alumnos.where(inscrito)):
+            counts[(_day(d), "conversion", "")] += n
+        archivados = archive.emails()
+        if archivados:                       # sus inscripciones ya no están en la tabla
+            sin_inscripcion = (db.select(dia, User.email)
+                               .where(User.role == "student", ~inscrito))
+            for d, email in db.session.execute(sin_inscripcion):
+                if email in archivados:
+                    counts[(_day(d), "conversion", "")] += 1
+
+        db.session.execute(db.delete(EstadisticaDiaria))
+        self._upsert(db.session.connection(), counts)
+        db.session.info["analytics_dirty"] = True
+        db.session.commit()
+        return len(counts)
+
+    # ─── consulta ──────────────────────────────────────
+    def series(self, desde, hasta, group):
+        """Datos para las gráficas, agrupados por día / semana / mes."""
+        periods = _periods(desde, hasta, group)
+        index = {p: i for i, p in enumerate(periods)}
+        zeros = lambda: [0] * len(periods)
+        data = {"inscripcion": zeros(), "registro": zeros(), "conversion": zeros()}
+        por_curso = {}
+        rows = db.session.execute(
+            db.select(EstadisticaDiaria.dia, EstadisticaDiaria.serie,
+                      EstadisticaDiaria.curso, EstadisticaDiaria.n)
+            .where(EstadisticaDiaria.dia.between(desde, hasta)))
+        for dia, serie, curso, n in rows:
+            i = index[_period(dia, group)]
+            data[serie][i] += n
+            if serie == "inscripcion":
+                por_curso.setdefault(curso, zeros())[i] += n
+
+        registros, conversiones = sum(data["registro"]), sum(data["conversion"])
+        return {
+            "desde": desde.isoformat(), "hasta": hasta.isoformat(), "agrupar": group,
+            "periodos": [p.isoformat() for p in periods],
+            "inscripciones": data["inscripcion"],
+            "registros": data["registro"],
+            "conversiones": data["conversion"],
+            "por_curso": [{"curso": c, "inscripciones": v} for c, v in
+                          sorted(por_curso.items(), key=lambda kv: -sum(kv[1]))],
+            "totales": {"inscripciones": sum(data["inscripcion"]),
+                        "registros": registros, "conversiones": conversiones,
+                        "tasa_conversion": round(conversiones / registros, 4) if registros else None},
+        }
+
+    def cached_json(self, desde, hasta, group):
+        """(cuerpo JSON, etag) de series(), en memoria hasta que cambien los conteos."""
+        key = (desde, hasta, group, self.version())
+        hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+        body = self.app.json.dumps(self.series(desde, hasta, group))
+        entry = (body, hashlib.sha1(body.encode()).hexdigest())
+        with self._lock:
+            self._cache[key] = entry
+            while len(self._cache) > self.app.config["ANALYTICS_CACHE_SIZE"]:
+                self._cache.popitem(last=False)
+        return entry
+
+
+analytics = Analytics()
@@ -1,126 +1,338 @@
 # app.py ───────────────────────────────────────────────────────────
-import os, secrets, itsdangerous
-from datetime import datetime
+import os, hmac, secrets, itsdangerous, click
+from datetime import datetime, date, timedelta
+from itertools import chain
 from flask import (
     Flask, render_template, redirect, url_for,
-    request, flash, session, send_file
+    request, flash, session, send_file, abort,
+    Response, stream_with_context, stream_template, current_app
 )
+from flask.cli import AppGroup
 from flask_login import (
     LoginManager, login_user, login_required,
     logout_user, current_user
 )
 from flask_mail import Mail, Message
 from flask_migrate import Migrate
+from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.utils import secure_filename
+from werkzeug.datastructures import FileStorage
 
 from models import (
     db, HomeContent, Programa, Galeria,
-    Testimonio, User, Inscripcion
+    Testimonio, User, Inscripcion, Job
 )
-# ─── al principio de app.py ─────────────────────────
+from cache import page_cache, snapshot
+import images
+from jobs import jobs
+from mailqueue import outbox
+import listings, export, backup, database, importer, sessions
+from profiling import profiler
+from identity import user_cache
+import passwords
+from passwords import hasher
+from ratelimit import limiter, RateLimited
+from assets import assets
+from analytics import analytics, GROUPS as ANALYTICS_GROUPS
+from search import search
+from archive import archive, ArchiveError, parse_period
+from testimonials import testimonials, ESTADOS as TESTIMONIO_ESTADOS
 from forms import (
     HomeContentForm, InscripcionForm, GaleriaForm, ProgramaForm,
-    LoginForm, ResetRequestForm, ResetPasswordForm, RestoreForm,
-    PublicRegisterForm, AdminUserForm
+    LoginForm, ResetRequestForm, ResetPasswordForm, RestoreForm, ImportForm,
+    PublicRegisterForm, AdminUserForm, TestiForm
 )
 
 
-
-import zipfile, shutil, datetime as dt
-# … create_backup() sin cambios …
-
 BASE_DIR   = os.path.abspath(os.path.dirname(__file__))
 UPLOAD_DIR = os.path.join("static", "img")
 ALLOWED_EXT = {"jpg", "jpeg", "png"}
 
-app = Flask(__name__)
-app.config.update(
-    SECRET_KEY="c" + secrets.token_hex(16),
+DEFAULTS = dict(
     SQLALCHEMY_DATABASE_URI="sqlite:///ciipa.db",
     SQLALCHEMY_TRACK_MODIFICATIONS=False,
     UPLOAD_FOLDER=UPLOAD_DIR,
-    MAX_CONTENT_LENGTH=10 * 1024 * 1024
+    MAX_CONTENT_LENGTH=10 * 1024 * 1024,
+    CATALOG_TTL=300,
+    ADMIN_PAGE_SIZE=50,
+    GALERIA_PAGE_SIZE=12,                 # fotos por página (portada y /galeria.json)
+    GALERIA_MAX_AGE=300                   # s que el navegador reusa cada página del feed
 )
-app.config.from_pyfile("config.py", silent=True)
-
-db.init_app(app)
-migrate = Migrate(app, db)
-mail = Mail(app)
-serializer = itsdangerous.URLSafeTimedSerializer(app.config["SECRET_KEY"])
 
-login_manager = LoginManager(app)
+migrate = Migrate()
+mail = Mail()
+login_manager = LoginManager()
 login_manager.login_view = "login"
 login_manager.login_message = None
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.get(int(user_id))       # Principal (id, email, role), sin SQL en caché
+
+# ─── Registro de rutas y comandos ──────────────────────
+# Las vistas se declaran a nivel de módulo con @route / @cli.command
+# y create_app() las registra en la app (mismos endpoints que con
+# @app.route, así que url_for('home') etc. no cambian).
+_ROUTES = []
+cli = AppGroup("ciipa")
+
+def route(rule, **options):
+    def deco(view):
+        _ROUTES.append((rule, view, options))
+        return view
+    return deco
+
+
+def create_app(config=None):
+    """Construye la app: config.py, variables FLASK_* y luego `config`
+    (dict) encima. Sin consultas a la BD: arrancar es sólo importar y
+    registrar; lo caro lo hace warm() una vez, antes de hacer fork."""
+    app = Flask(__name__)
+    app.config.update(DEFAULTS, SECRET_KEY="c" + secrets.token_hex(16))
+    app.config.from_pyfile("config.py", silent=True)
+    app.config.from_prefixed_env()        # FLASK_SECRET_KEY, FLASK_MAIL_SUPPRESS_SEND…
+    if config:
+        app.config.from_mapping(config)
+
+    database.init_app(app, db)
+    sessions.init_app(app)
+    profiler.init_app(app)
+    hasher.init_app(app)
+    limiter.init_app(app)
+    page_cache.init_app(app)
+    user_cache.init_app(app)
+    images.init_app(app)
+    assets.init_app(app)
+    backup.init_app(app)
+    importer.init_app(app)
+    archive.init_app(app)
+    analytics.init_app(app)
+    search.init_app(app)
+    testimonials.init_app(app)
+    jobs.init_app(app)
+    migrate.init_app(app, db)
+    mail.init_app(app)
+    outbox.init_app(app, mail)
+    login_manager.init_app(app)
+
+    app.context_processor(inject_globals)
+    app.before_request(_start_jobs)
+    app.register_error_handler(passwords.HashingBusy, _hashing_busy)
+    app.register_error_handler(RateLimited, _rate_limited)
+    for rule, view, options in _ROUTES:
+        app.add_url_rule(rule, view_func=view, **options)
+    for command in cli.commands.values():
+        app.cli.add_command(command)
+    return app
+
+
+def warm(app):
+    """Precalienta lo que todos los workers comparten: plantillas
+    compiladas, la portada entera (con catálogo, galería y carrusel)
+    y los manifiestos de estáticos. Pensado para el proceso maestro de
+    gunicorn con preload_app (ver wsgi.py): los workers lo heredan por fork.
+
+    No arranca hilos ni deja conexiones abiertas. Si la BD aún no está
+    migrada sólo se compilan las plantillas."""
+    env = app.jinja_env
+    for name in env.list_templates(filter_func=lambda n: n.endswith(".html")):
+        env.get_template(name)
+    try:
+        with app.test_request_context("/"):
+            # sin pasar por before_request: en el maestro no se arrancan hilos
+            app.view_functions["home"]()      # portada + catálogo + carrusel en caché
+    except SQLAlchemyError as exc:
+        app.logger.warning("warm: sin datos precalentados (%s)", exc.__class__.__name__)
+    finally:
+        database.dispose(app)             # ninguna conexión cruza el fork
+
+def _serializer():
+    return itsdangerous.URLSafeTimedSerializer(current_app.config["SECRET_KEY"])
 
 # ─── Helpers Jinja ─────────────────────────────────────
-@app.context_processor
 def inject_globals():
     """Expone fetch_testimonios() y now() en todas las plantillas."""
     from datetime import datetime
 
-    def fetch_testimonios():
-        return (Testimonio.query
-                .filter_by(visible=True)
-                .order_by(Testimonio.id.desc())
-                .all())
-
     # lo que devuelvas aquí queda disponible en Jinja
     return {
-        'fetch_testimonios': fetch_testimonios,
+        # últimos aprobados, en memoria hasta la próxima moderación
+        'fetch_testimonios': testimonials.carousel,
+        'fetch_programas': catalogo,
         'now': datetime.utcnow
     }
 
+# ─── Catálogo de programas ─────────────────────────────
+def catalogo():
+    """Programas visibles (dicts), cacheados por versión de contenido + TTL."""
+    return page_cache.fragment("catalogo", lambda: [
+        snapshot(p) for p in (Programa.query
+                              .filter_by(visible=True)
+                              .order_by(Programa.id)
+                              .all())
+    ], ttl=current_app.config["CATALOG_TTL"])
+
+def curso_choices():
+    """Opciones de InscripcionForm.curso a partir del catálogo cacheado."""
+    return [(p["nombre"], f"{p['nombre']} ({p['duracion']})" if p["duracion"]
+             else p["nombre"]) for p in catalogo()]
+
+def save_upload(file):
+    """Guarda una imagen subida en UPLOAD_FOLDER y devuelve su ruta en static/."""
+    folder = os.path.join(BASE_DIR, current_app.config["UPLOAD_FOLDER"])
+    base, ext = os.path.splitext(secure_filename(file.filename))
+    # los derivados se nombran por la raíz: foo.png no puede convivir con foo.jpg
+    usados = {os.path.splitext(n)[0].lower() for n in os.listdir(folder)}
+    stem = base
+    while stem.lower() in usados:
+        stem = f"{base}-{secrets.token_hex(3)}"
+    fname = f"{stem}{ext}"
+    file.save(os.path.join(folder, fname))
+    return f"img/{fname}"
+
+def retire_image(path, ancho=None):
+    """Borra los derivados de una imagen reemplazada, si ya nadie la usa."""
+    if not path:
+        return
+    usos = sum(db.session.scalar(db.select(db.func.count()).where(col == path))
+               for col in (Programa.imagen, Galeria.filename, HomeContent.imagen))
+    if not usos:
+        images.remove_derivatives(path, ancho)
+
+# ─── Trabajos en segundo plano (jobs.py) ───────────────
+# Los derivados de imágenes se generan fuera del request: la vista
+# sólo guarda el original y encola el trabajo.
+@jobs.handler("galeria_imagen")
+def job_galeria_imagen(gid, visible):
+    foto = db.session.get(Galeria, gid)
+    if foto:
+        foto.ancho, foto.alto = images.process_image(foto.filename)
+        foto.visible = visible            # la foto se publica ya procesada
+        db.session.commit()
+
+@jobs.handler("programa_imagen")
+def job_programa_imagen(pid):
+    prog = db.session.get(Programa, pid)
+    if prog and prog.imagen:
+        prog.ancho, prog.alto = images.process_image(prog.imagen)
+        db.session.commit()
+
+@jobs.handler("portada_imagen")
+def job_portada_imagen(ruta):
+    images.process_image(ruta)
+
+def _start_jobs():
+    jobs.start()                          # no-op salvo el primer request del worker
+
+def _hashing_busy(exc):
+    flash("Hay muchos inicios de sesión en este momento; intenta de nuevo "
+          "en unos segundos.", "warning")
+    return redirect(request.path, code=303)
+
+def _rate_limited(exc):
+    return (render_template("limite.html", retry_after=exc.retry_after), 429,
+            {"Retry-After": str(exc.retry_after)})
+
+@profiler.gauge("ciipa_jobs", "Trabajos en segundo plano por estado")
+def _jobs_gauge():
+    return [({"status": st}, n) for st, n in jobs.counts().items()]
+
+@profiler.gauge("ciipa_outbox", "Correos del outbox por estado")
+def _outbox_gauge():
+    depth = outbox.depth()
+    depth.pop("oldest_pending_s")
+    return [({"status": st}, n) for st, n in depth.items()]
+
 
 # ───────── Rutas públicas ──────────────────────────────────────
-@app.route("/")
+@route("/")
+@page_cache.cached
 def home():
-    return render_template("index.html", content=HomeContent.query.first())
+    return render_template("index.html",
+                           content=page_cache.fragment("home_content", _load_home),
+                           galeria=page_cache.fragment("galeria", _load_galeria))
+
+def _load_home():
+    hc = HomeContent.query.first()
+    return snapshot(hc) if hc else None
+
+def _load_galeria():
+    # sólo la primera página; el resto lo pide el scroll a /galeria.json
+    return listings.galeria_page(per_page=current_app.config["GALERIA_PAGE_SIZE"])
+
+@route("/galeria.json")
+@page_cache.cached(max_age="GALERIA_MAX_AGE")
+def galeria_json():
+    """Página siguiente de la galería: HTML de las fotos + cursor."""
+    after = request.args.get("after", "")
+    if listings.decode_cursor(after, Galeria.timestamp) is None:
+        abort(400)                        # la primera página va en la portada
+    page = listings.galeria_page(after, current_app.config["GALERIA_PAGE_SIZE"])
+    return {"html": render_template("partials/galeria_items.html", fotos=page.items),
+            "next": page.next_cursor}
 
 # ---------- Login / 2FA ----------
-@app.route("/login", methods=["GET", "POST"])
+@route("/login", methods=["GET", "POST"])
+@limiter.limit("RATELIMIT_LOGIN_IP")
 def login():
     form = LoginForm()
     if form.validate_on_submit():
+        limiter.hit("login-email", form.email.data, "RATELIMIT_LOGIN_EMAIL")
         user = User.query.filter_by(email=form.email.data).first()
-        if user and user.check_password(form.password.data):
+        if user is not None:
+            limiter.check("2fa", user.id)        # bloqueado por códigos erróneos
+        with profiler.timer("hash"):
+            ok = user is not None and user.check_password(form.password.data)
+        if ok:
             if user.role == "admin":
                 code = secrets.randbelow(899999) + 100000
                 user.twofactor_code = str(code); db.session.commit()
                 session["pre_2fa_user"] = user.id
                 flash(f"Código 2FA simulado: {code}", "info")
                 return redirect(url_for("twofactor"))
+            db.session.commit()                  # guarda el rehash, si lo hubo
             login_user(user)
             return redirect(url_for("dashboard"))
         flash("Credenciales inválidas", "danger")
     return render_template("login.html", form=form)
 
-@app.route("/twofactor", methods=["GET", "POST"])
+@route("/twofactor", methods=["GET", "POST"])
+@limiter.limit("RATELIMIT_TWOFACTOR_IP")
 def twofactor():
     uid = session.get("pre_2fa_user")
     if not uid:
         return redirect(url_for("login"))
     user = User.query.get(uid)
 
-    # limpiar alertas heredadas
-    if request.method == "GET" and '_flashes' in session:
+    # limpiar alertas heredadas (sólo si hay alguna: reescribir la sesión cuesta)
+    if request.method == "GET" and any(m[0] == 'danger' for m in session.get('_flashes', ())):
         session['_flashes'] = [m for m in session['_flashes'] if m[0] != 'danger']
 
     if request.method == "POST":
-        if user and user.twofactor_code == request.form["code"]:
+        limiter.check("2fa", uid)
+        code = request.form.get("code", "").strip().encode()
+        if user and user.twofactor_code and hmac.compare_digest(
+                user.twofactor_code.encode(), code):
             user.twofactor_code = None
             db.session.commit()
+            limiter.reset("2fa", uid)
             login_user(user)
             session.pop("pre_2fa_user")
             return redirect(url_for("dashboard"))
+        if limiter.fail("2fa", uid, current_app.config["RATELIMIT_2FA_MAX_FAILS"],
+                        current_app.config["RATELIMIT_2FA_LOCKOUT"]):
+            if user:
+                user.twofactor_code = None       # el código ya no sirve
+                db.session.commit()
+            session.pop("pre_2fa_user")
+            flash("Demasiados códigos incorrectos. La cuenta quedó bloqueada "
+                  "temporalmente.", "danger")
+            return redirect(url_for("login"))
         flash("Código incorrecto", "danger")
 
     return render_template("twofactor.html")
 
-@app.route("/logout")
+@route("/logout")
 @login_required
 def logout():
     logout_user()
@@ -128,7 +340,8 @@ def logout():
     return redirect(url_for("home"))
 
 # ---------- Registro público ----------
-@app.route("/register", methods=["GET", "POST"])
+@route("/register", methods=["GET", "POST"])
+@limiter.limit("RATELIMIT_REGISTER_IP")
 def register():
     if current_user.is_authenticated:
         return redirect(url_for("dashboard"))
@@ -146,7 +359,7 @@ def register():
     return render_template("register.html", form=form)
 
 # ---------- Alta de usuarios (admin) ----------
-@app.route("/admin/usuarios/nuevo", methods=["GET", "POST"])
+@route("/admin/usuarios/nuevo", methods=["GET", "POST"])
 @login_required
 def admin_nuevo_usuario():
     if current_user.role != "admin":
@@ -164,24 +377,604 @@ def admin_nuevo_usuario():
             return redirect(url_for("admin_nuevo_usuario"))
     return render_template("admin/nuevo_usuario.html", form=form)
 
-# ---------- Password reset ---------- (sin cambios)
-# … reset_request y reset_token …
+# ---------- Password reset ----------
+@route("/reset", methods=["GET", "POST"])
+@limiter.limit("RATELIMIT_RESET_IP")
+def reset_request():
+    form = ResetRequestForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(email=form.email.data).first()
+        if user:
+            # ligado al hash actual: al cambiar la contraseña el enlace deja de servir
+            token = _serializer().dumps([user.id, user.password[-16:]], salt="reset")
+            link = url_for("reset_token", token=token, _external=True)
+            outbox.enqueue(user.email, "CIIPA · Restablecer contraseña",
+                           f"Para elegir una nueva contraseña abre este enlace "
+                           f"(válido 1 hora):\n\n{link}\n")
+            db.session.commit()
+        # mismo mensaje exista o no la cuenta
+        flash("Si el correo está registrado recibirás un enlace.", "info")
+        return redirect(url_for("login"))
+    return render_template("auth/reset_request.html", form=form)
+
+@route("/reset/<token>", methods=["GET", "POST"])
+def reset_token(token):
+    try:
+        uid, huella = _serializer().loads(token, salt="reset", max_age=3600)
+    except (itsdangerous.BadData, TypeError, ValueError):
+        huella = None
+    user = db.session.get(User, uid) if huella else None
+    if user is None or not hmac.compare_digest(user.password[-16:], huella):
+        # expirado, alterado o ya usado (la contraseña cambió desde entonces)
+        flash("El enlace no es válido o ya expiró.", "warning")
+        return redirect(url_for("reset_request"))
+
+    form = ResetPasswordForm()
+    if form.validate_on_submit():
+        user.set_password(form.password.data); db.session.commit()
+        flash("Contraseña actualizada. Inicia sesión.", "success")
+        return redirect(url_for("login"))
+    return render_template("auth/reset_password.html", form=form)
 
 # ---------- Inscripción ----------
-# … inscribirme() sin cambios …
+@route("/inscribirme", methods=["GET", "POST"])
+@limiter.limit("RATELIMIT_INSCRIPCION_IP")
+def inscribirme():
+    form = InscripcionForm()
+    choices = curso_choices()
+    if choices:                      # sin programas en BD → opciones por defecto
+        form.curso.choices = choices
+    if request.method == "GET" and request.args.get("curso"):
+        form.curso.data = request.args["curso"]
+
+    if form.validate_on_submit():
+        db.session.add(Inscripcion(
+            nombre=form.nombre.data, curso=form.curso.data,
+            email=form.email.data,
+            telefono_contacto=form.telefono_contacto.data))
+        outbox.enqueue(form.email.data, "CIIPA · Recibimos tu inscripción",
+                       f"Hola {form.nombre.data}:\n\nRecibimos tu solicitud para "
+                       f"«{form.curso.data}». Te contactaremos pronto al "
+                       f"{form.telefono_contacto.data}.\n\nCIIPA")
+        db.session.commit()                  # inscripción + correo, juntos
+        flash("¡Inscripción recibida! Te contactaremos pronto.", "success")
+        return redirect(url_for("home"))
+    return render_template("inscribirme.html", form=form)
 
 # ---------- Testimonio ----------
-# … nuevo_testimonio() sin cambios …
+@route("/nuevo_testimonio", methods=["POST"])
+@limiter.limit("RATELIMIT_TESTIMONIO_IP")
+def nuevo_testimonio():
+    # sin CSRF: el modal va en la portada cacheada (ver testimonials.py)
+    form = TestiForm(meta={"csrf": False})
+    if not form.validate():
+        flash("Revisa tu testimonio: nombre, año (2020–2100) y una frase "
+              "de 10 a 500 caracteres.", "warning")
+    else:
+        estado = testimonials.submit(form.nombre.data, form.anio.data,
+                                     form.frase.data, form.sitio.data)
+        if estado == "link":
+            flash("Por favor, escribe tu testimonio sin enlaces.", "warning")
+        elif estado == "full":
+            flash("No podemos recibir testimonios en este momento; "
+                  "intenta más tarde.", "warning")
+        else:
+            flash("¡Gracias! Tu testimonio se publicará en cuanto lo revisemos.", "success")
+    return redirect(url_for("home", _anchor="testimonios"))
 
 # ---------- Dashboard ----------
-# … dashboard / admin routes sin cambios …
+@route("/dashboard")
+@login_required
+def dashboard():
+    if current_user.role == "admin":
+        return render_template("admin_dashboard.html",
+                               testimonios_pendientes=testimonials.counts().get("pending", 0))
+    return render_template("student_dashboard.html")
+
+# ---------- Listados (admin) ----------
+@route("/admin/inscripciones")
+@login_required
+def admin_inscripciones():
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    page = listings.inscripciones_page(request.args, current_app.config["ADMIN_PAGE_SIZE"])
+    return render_template("admin/inscripciones.html", insc=page.items, page=page,
+                           cursos=[c for c, _ in curso_choices()],
+                           archivo=archive.periods(),
+                           con_archivo=listings.reaches_archive(request.args))
+
+@route("/admin/alumnos")
+@login_required
+def admin_alumnos():
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    page = listings.alumnos_page(request.args, current_app.config["ADMIN_PAGE_SIZE"])
+    return render_template("admin/alumnos.html", alumnos=page.items, page=page)
+
+# ---------- Analítica (admin) ----------
+@route("/admin/analitica")
+@login_required
+def admin_analitica():
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+    return render_template("admin/analitica.html")
+
+@route("/admin/analitica.json")
+@login_required
+def admin_analitica_json():
+    if current_user.role != "admin":
+        abort(403)
+
+    hasta = request.args.get("hasta", type=date.fromisoformat) or date.today()
+    desde = request.args.get("desde", type=date.fromisoformat) or \
+            hasta - timedelta(days=current_app.config["ANALYTICS_DEFAULT_DAYS"] - 1)
+    group = request.args.get("agrupar", "dia")
+    if group not in ANALYTICS_GROUPS or desde > hasta:
+        abort(400)
+
+    body, etag = analytics.cached_json(desde, hasta, group)
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"   # revalida con ETag → 304
+    return resp.make_conditional(request)
+
+# ---------- Búsqueda (admin) ----------
+@route("/admin/buscar")
+@login_required
+def admin_buscar():
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    q = request.args.get("q", "").strip()
+    archivo = request.args.get("archivo") == "1"
+    return render_template("admin/buscar.html", q=q, archivo=archivo,
+                           hay_archivo=bool(archive.periods()),
+                           resultados=search.search(q, archivo=archivo) if q else [])
+
+# ---------- Importación masiva (admin / API) ----------
+IMPORT_FORMATS = {"csv": "csv", "json": "json", "ndjson": "json", "jsonl": "json"}
+
+def importar(binary, fmt, dry_run=False):
+    """Corre importer.run con los cursos del formulario público."""
+    cursos = [c for c, _ in curso_choices()] or \
+             [c for c, _ in InscripcionForm.curso.kwargs["choices"]]
+    return importer.run(importer.rows_for(binary, fmt), cursos,
+                        batch_size=current_app.config["IMPORT_BATCH_SIZE"], dry_run=dry_run,
+                        max_errors=current_app.config["IMPORT_MAX_ERRORS"])
+
+@route("/admin/inscripciones/importar", methods=["GET", "POST"])
+@login_required
+def admin_importar():
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    request.max_content_length = current_app.config["IMPORT_MAX_BYTES"]
+    form = ImportForm()
+    report = None
+    if form.validate_on_submit():
+        archivo = form.archivo.data
+        fmt = IMPORT_FORMATS[archivo.filename.rsplit(".", 1)[-1].lower()]
+        report = importar(archivo.stream, fmt, dry_run=form.dry_run.data)
+    return render_template("admin/importar.html", form=form, report=report)
+
+@route("/api/inscripciones/import", methods=["POST"])
+def api_importar():
+    """Cuerpo CSV (text/csv) o JSON/NDJSON; ?dry_run=1 sólo valida.
+    Sesión de admin o `Authorization: Bearer IMPORT_TOKEN`."""
+    token = current_app.config["IMPORT_TOKEN"]
+    if not (token and hmac.compare_digest(request.headers.get("Authorization", ""),
+                                          f"Bearer {token}")):
+        if not (current_user.is_authenticated and current_user.role == "admin"):
+            abort(403)
+
+    request.max_content_length = current_app.config["IMPORT_MAX_BYTES"]
+    mimetype = request.mimetype
+    if mimetype in ("text/csv", "application/csv"):
+        fmt = "csv"
+    elif mimetype in ("application/json", "application/x-ndjson", "application/jsonl"):
+        fmt = "json"
+    else:
+        return {"error": "Content-Type debe ser text/csv, application/json "
+                         "o application/x-ndjson."}, 415
+    report = importar(request.stream, fmt, dry_run=request.args.get("dry_run") == "1")
+    return report.to_dict(), 422 if report.fatal else 200
+
+# ---------- Exportación (admin) ----------
+# listado → (SELECT, orden, encabezados, filas archivadas o None)
+EXPORTS = {
+    "inscripciones": (listings.inscripciones_stmt, Inscripcion.id,
+                      ["ID", "Nombre", "Curso", "Email", "Fecha", "Teléfono"],
+                      listings.archivadas),
+    "alumnos":       (listings.alumnos_stmt, User.id,
+                      ["ID", "Correo", "Registrado en"], None),
+}
+
+@route("/admin/<listado>/export.<fmt>")
+@login_required
+def admin_export(listado, fmt):
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+    if listado not in EXPORTS or fmt not in export.FORMATS:
+        abort(404)
+
+    build_stmt, id_col, headers, cold = EXPORTS[listado]
+    stmt = build_stmt(request.args).order_by(id_col)      # mismos filtros que el listado
+    rows = export.iter_rows(stmt)
+    if cold and listings.reaches_archive(request.args):
+        rows = chain(cold(request.args), rows)            # primero lo archivado (lo más viejo)
+    writer, mimetype = export.FORMATS[fmt]
+    fname = f"{listado}_{datetime.now():%Y%m%d_%H%M}.{fmt}"
+    return Response(stream_with_context(writer(headers, rows)),
+                    mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={fname}"})
+
+# ---------- Respaldo (admin) ----------
+@route("/admin/backup")
+@login_required
+def admin_backup():
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    name, _, _ = backup.create_backup()
+    return Response(stream_with_context(backup.stream_zip(name)),
+                    mimetype="application/zip",
+                    headers={"Content-Disposition": f"attachment; filename={name}.zip"})
+
+@route("/admin/restore", methods=["GET", "POST"])
+@login_required
+def admin_restore():
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    # los respaldos con imágenes superan el límite general de subida
+    request.max_content_length = current_app.config["RESTORE_MAX_BYTES"]
+    form = RestoreForm()
+    if not form.validate_on_submit():
+        return render_template("admin/restore.html", form=form)
+
+    archivo = os.path.join(current_app.config["BACKUP_DIR"], f"subida_{secrets.token_hex(8)}.zip")
+    os.makedirs(current_app.config["BACKUP_DIR"], exist_ok=True)
+    form.archivo.data.save(archivo)          # werkzeug ya lo tiene en disco, no en RAM
+
+    logger = current_app.logger
+    def pasos():
+        try:
+            yield from backup.restore(archivo)
+            yield "Listo."
+        except backup.RestoreError as exc:
+            yield f"ERROR: {exc}"
+        except Exception:
+            logger.exception("Restauración fallida")
+            yield "ERROR: la restauración falló; revisa el log del servidor."
+        finally:
+            os.remove(archivo)
+
+    return stream_template("admin/restore.html", form=form, pasos=pasos())
+
+# ---------- Programas (admin) ----------
+@route("/admin/programas", methods=["GET", "POST"])
+@route("/admin/programas/<int:pid>", methods=["GET", "POST"])
+@login_required
+def admin_programas(pid=None):
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    prog = db.get_or_404(Programa, pid) if pid else None
+    form = ProgramaForm(obj=prog)
+    if form.validate_on_submit():
+        prog = prog or Programa()
+        prog.nombre, prog.tipo = form.nombre.data, form.tipo.data
+        prog.duracion, prog.precio = form.duracion.data, form.precio.data
+        prog.visible = form.visible.data
+        nueva = isinstance(form.imagen.data, FileStorage)   # si no, es la ruta previa
+        anterior = (prog.imagen, prog.ancho)
+        if nueva:
+            prog.imagen, prog.ancho, prog.alto = save_upload(form.imagen.data), None, None
+        db.session.add(prog); db.session.commit()   # invalida el catálogo
+        if nueva:
+            jobs.enqueue("programa_imagen", pid=prog.id)
+            retire_image(*anterior)
+        flash("Programa guardado ✔", "success")
+        return redirect(url_for("admin_programas"))
+
+    progs = Programa.query.order_by(Programa.id).all()
+    return render_template("admin/programas.html", form=form, progs=progs, prog=prog)
+
+# ---------- Galería (admin) ----------
+@route("/admin/galeria", methods=["GET", "POST"])
+@login_required
+def admin_galeria():
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    form = GaleriaForm()
+    if form.validate_on_submit():
+        foto = Galeria(filename=save_upload(form.imagen.data), visible=False)
+        db.session.add(foto); db.session.commit()
+        jobs.enqueue("galeria_imagen", gid=foto.id, visible=form.visible.data)
+        flash("Imagen subida ✔ – se publicará en cuanto termine de procesarse.", "success")
+        return redirect(url_for("admin_galeria"))
+
+    fotos = Galeria.query.order_by(Galeria.timestamp.desc()).all()
+    return render_template("admin/galeria.html", form=form, fotos=fotos)
+
+# ---------- Portada (admin) ----------
+@route("/admin/portada", methods=["GET", "POST"])
+@login_required
+def admin_portada():
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    hc = HomeContent.query.first()
+    form = HomeContentForm(obj=hc)
+    if form.validate_on_submit():
+        if not isinstance(form.imagen.data, FileStorage) and not hc:
+            flash("La portada necesita una imagen.", "warning")
+            return render_template("admin/editar.html", form=form)
+        hc = hc or HomeContent()
+        hc.titulo, hc.subtitulo = form.titulo.data, form.subtitulo.data
+        anterior = None
+        if isinstance(form.imagen.data, FileStorage):
+            anterior, hc.imagen = hc.imagen, save_upload(form.imagen.data)
+            jobs.enqueue("portada_imagen", ruta=hc.imagen)
+        db.session.add(hc); db.session.commit()
+        retire_image(anterior)
+        flash("Portada actualizada ✔", "success")
+        return redirect(url_for("admin_portada"))
+    return render_template("admin/editar.html", form=form)
+
+# ---------- Trabajos en segundo plano (admin) ----------
+@route("/admin/trabajos")
+@login_required
+def admin_trabajos():
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    recientes = Job.query.order_by(Job.id.desc()).limit(100).all()
+    return render_template("admin/trabajos.html", trabajos=recientes,
+                           counts=jobs.counts(), correo=outbox.depth())
+
+@route("/admin/trabajos/<int:job_id>/reintentar", methods=["POST"])
+@login_required
+def admin_trabajo_reintentar(job_id):
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    jobs.retry(job_id)
+    flash(f"Trabajo {job_id} reencolado.", "info")
+    return redirect(url_for("admin_trabajos"))
+
+# ---------- Moderación de testimonios (admin) ----------
+MODERACION = {"approved": "aprobados", "rejected": "rechazados", "pending": "devueltos a pendientes"}
+
+@route("/admin/testimonios", methods=["GET", "POST"])
+@login_required
+def admin_testimonios():
+    if current_user.role != "admin":
+        return redirect(url_for("dashboard"))
+
+    estado = request.args.get("estado", "pending")
+    if estado not in TESTIMONIO_ESTADOS:
+        abort(400)
+    if request.method == "POST":
+        accion = request.form.get("accion")
+        if accion not in MODERACION:
+            abort(400)
+        ids = (testimonials.pending_ids() if request.form.get("todos")
+               else request.form.getlist("ids", type=int))
+        n = testimonials.moderate(ids, accion)
+        flash(f"{n} testimonios {MODERACION[accion]}.", "success" if n else "info")
+        return redirect(url_for("admin_testimonios", estado=estado))
+
+    items = (Testimonio.query.filter_by(estado=estado)
+             .order_by(Testimonio.id.desc()).limit(200).all())
+    return render_template("admin/testimonios.html", items=items, estado=estado,
+                           counts=testimonials.counts())
+
+# … resto de rutas admin sin cambios …
+
+# ---------- Derivados de imágenes ----------
+@cli.command("images-backfill")
+def images_backfill():
+    """Genera derivados para las imágenes existentes en static/img y
+    guarda sus dimensiones en Galeria / Programa."""
+    img_dir = os.path.join(BASE_DIR, current_app.config["UPLOAD_FOLDER"])
+    dims = {}
+    for name in sorted(os.listdir(img_dir)):
+        if name.rsplit(".", 1)[-1].lower() in ALLOWED_EXT:
+            ancho, alto = dims[f"img/{name}"] = images.process_image(f"img/{name}")
+            print(f"  {name}: {ancho}×{alto}")
+
+    for row in Galeria.query.all():
+        row.ancho, row.alto = dims.get(row.filename, (row.ancho, row.alto))
+    for row in Programa.query.all():
+        row.ancho, row.alto = dims.get(row.imagen, (row.ancho, row.alto))
+    db.session.commit()
+    print(f"{len(dims)} imágenes procesadas.")
+
+@cli.command("jobs-run")
+def jobs_run():
+    """Procesa en primer plano los trabajos pendientes y termina."""
+    print(f"{jobs.run_pending()} trabajos procesados.")
+
+@cli.command("mail-flush")
+def mail_flush():
+    """Envía ahora el correo pendiente del outbox."""
+    print(f"{outbox.flush()} correos enviados. Cola: {outbox.depth()}")
+
+# ---------- Estáticos ----------
+@cli.command("assets-build")
+@click.option("--vendor", is_flag=True, help="Descarga Bootstrap y Chart.js a static/vendor/.")
+def assets_build(vendor):
+    """Copia static/ con huellas a static/dist/ (+ .gz/.br) para caché larga."""
+    if vendor:
+        for ruta, sri in assets.vendor():
+            print(f"  {ruta}  integrity={sri}")
+    archivos, comprimidos = assets.build()
+    page_cache.bump()                        # páginas en caché con las URLs viejas
+    print(f"{archivos} archivos con huella, {comprimidos} precomprimidos.")
+
+# ---------- Analítica ----------
+@cli.command("analytics-rebuild")
+def analytics_rebuild():
+    """Recalcula la tabla de conteos diarios desde Inscripcion y User."""
+    print(f"{analytics.rebuild()} conteos diarios escritos.")
+
+# ---------- Búsqueda ----------
+@cli.command("search-rebuild")
+def search_rebuild():
+    """Vuelve a crear el índice de búsqueda (FTS5) desde las tablas."""
+    if not search.enabled():
+        raise click.ClickException("El índice FTS5 sólo existe con SQLite.")
+    print(f"{search.rebuild()} filas indexadas.")
+
+# ---------- Archivo de inscripciones ----------
+@cli.command("archive-inscripciones")
+@click.option("--before", default=None, help="Archivar los meses anteriores a AAAA-MM "
+              "(por defecto, los de hace más de ARCHIVE_AFTER_DAYS días).")
+def archive_inscripciones(before):
+    """Mueve las inscripciones viejas a particiones mensuales comprimidas."""
+    try:
+        hecho = archive.archive(parse_period(before) if before else None)
+    except ArchiveError as exc:
+        raise click.ClickException(str(exc))
+    for periodo, n in hecho:
+        print(f"  {periodo:%Y-%m}: {n} inscripciones")
+    print(f"{sum(n for _, n in hecho)} inscripciones archivadas en {len(hecho)} particiones.")
+
+@cli.command("archive-restore")
+@click.argument("periodos", nargs=-1, required=True)
+def archive_restore(periodos):
+    """Devuelve a la tabla los meses AAAA-MM indicados."""
+    try:
+        for periodo in map(parse_period, periodos):
+            print(f"  {periodo:%Y-%m}: {archive.restore(periodo)} inscripciones restauradas")
+    except ArchiveError as exc:
+        raise click.ClickException(str(exc))
+
+@cli.command("archive-list")
+def archive_list():
+    """Lista las particiones del archivo."""
+    total = 0
+    for periodo, n, size in archive.info():
+        print(f"  {periodo:%Y-%m}: {n:>7} inscripciones  {size / 1024:8.1f} KiB")
+        total += n
+    print(f"{total} inscripciones archivadas; el próximo archive-inscripciones "
+          f"archiva lo anterior a {archive.cutoff():%Y-%m}.")
+
+# ---------- Importación ----------
+@cli.command("import-inscripciones")
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+@click.option("--dry-run", is_flag=True, help="Sólo validar.")
+def import_inscripciones(archivo, dry_run):
+    """Importa inscripciones desde un .csv / .json / .ndjson."""
+    fmt = IMPORT_FORMATS.get(archivo.rsplit(".", 1)[-1].lower())
+    if fmt is None:
+        raise click.ClickException("Formato no soportado (csv, json, ndjson).")
+    with open(archivo, "rb") as fh:
+        report = importar(fh, fmt, dry_run=dry_run)
+    for err in report.errores[:20]:
+        print(f"  fila {err['fila']}: {err['errores']}")
+    if report.fatal:
+        print(f"ERROR: {report.fatal}")
+    print(f"{report.total} filas en {report.segundos:.1f} s: {report.insertadas} "
+          f"{'válidas' if dry_run else 'insertadas'}, {report.duplicadas} duplicadas, "
+          f"{report.invalidas} inválidas.")
+
+# ---------- Respaldos ----------
+@cli.command("backup")
+def backup_cmd():
+    """Respaldo incremental en backups/ (para cron / tarea programada)."""
+    name, manifest, nuevos = backup.create_backup()
+    print(f"{name}: BD + {len(manifest['files'])} archivos, {nuevos} blobs nuevos.")
+
+@cli.command("restore")
+@click.argument("archivo", type=click.Path(exists=True, dir_okay=False))
+def restore_cmd(archivo):
+    """Restaura un .zip descargado desde /admin/backup."""
+    try:
+        for paso in backup.restore(archivo):
+            print(paso)
+    except backup.RestoreError as exc:
+        raise click.ClickException(str(exc))
+
+@cli.command("backup-prune")
+@click.option("--keep", type=int, default=None, help="Respaldos a conservar.")
+def backup_prune(keep):
+    """Aplica la política de retención y borra blobs huérfanos."""
+    borrados = backup.prune(keep or current_app.config["BACKUP_KEEP"])
+    print(f"{borrados} blobs eliminados; quedan {len(backup.list_backups())} respaldos.")
+
+# ---------- Contraseñas ----------
+@cli.command("passwords-calibrate")
+@click.option("--target-ms", type=float, default=250, help="Tiempo objetivo por hash.")
+@click.option("--algorithm", type=click.Choice(passwords.ALGORITHMS), default=None)
+def passwords_calibrate(target_ms, algorithm):
+    """Mide el costo de hash que cabe en --target-ms en esta máquina."""
+    algorithm = algorithm or current_app.config["PASSWORD_HASH"]
+    cost, medidas = passwords.calibrate(algorithm, target_ms)
+    for c, ms in medidas:
+        print(f"  {algorithm} {c:>9}: {ms:7.1f} ms")
+    key = {"scrypt": "PASSWORD_SCRYPT_N", "pbkdf2": "PASSWORD_PBKDF2_ITERATIONS",
+           "bcrypt": "PASSWORD_BCRYPT_ROUNDS"}[algorithm]
+    print(f"\nEn config.py:\n  PASSWORD_HASH = \"{algorithm}\"\n  {key} = {cost}")
+    print(f"Actual: {current_app.config['PASSWORD_HASH']} {hasher.policy[1]}")
+
+# ---------- Semilla del catálogo ----------
+PROGRAMAS_BASE = [
+    ("Carrera Téc. en Computación + Inglés", "Carrera", "2 años",
+     "$1 799 MXN/mes", "img/carrera.jpg"),
+    ("Diplomado en TIC", "Diplomado", "6-12 meses",
+     "$999 MXN/mes", "img/diplomado_tic.jpg"),
+    ("Diplomado en Inglés", "Diplomado", "6-12 meses",
+     "$999 MXN/mes", "img/diplomado_ingles.jpg"),
+    ("Diplomado Inglés para Niños", "Diplomado", "6-12 meses",
+     "$899 MXN/mes", "img/diplomado_kids.jpg"),
+    ("Diplomado en Computación", "Diplomado", "6-12 meses",
+     "$999 MXN/mes", "img/diplomado_comp.jpg"),
+]
+
+@cli.command("seed-programas")
+def seed_programas():
+    """Carga los programas que antes estaban fijos en card_programa.html."""
+    if Programa.query.first():
+        print("Ya hay programas en la BD; no se cargó nada.")
+        return
+    for nombre, tipo, duracion, precio, imagen in PROGRAMAS_BASE:
+        db.session.add(Programa(nombre=nombre, tipo=tipo, duracion=duracion,
+                                precio=precio, imagen=imagen, visible=True))
+    db.session.commit()
+    print(f"{len(PROGRAMAS_BASE)} programas cargados.")
+
+@cli.command("seed-galeria")
+def seed_galeria():
+    """Carga las fotos que antes estaban fijas en index.html (galeria1–6.jpg)."""
+    if Galeria.query.first():
+        print("Ya hay fotos en la galería; no se cargó nada.")
+        return
+    ahora = datetime.utcnow()
+    for i in range(1, 7):
+        # galeria1 primero: el orden es del más reciente al más antiguo
+        db.session.add(Galeria(filename=f"img/galeria{i}.jpg", visible=True,
+                               timestamp=ahora - timedelta(seconds=i)))
+    db.session.commit()
+    print("6 fotos cargadas (corre images-backfill para sus derivados).")
+
+@cli.command("seed-admin")
+def seed_admin():
+    """Crea el admin de demostración si no hay ningún admin."""
+    if User.query.filter_by(role="admin").first():
+        print("Ya hay un admin; no se creó nada.")
+        return
+    admin = User(email="admin@ciipa.com", role="admin")
+    admin.set_password("Admin123")
+    db.session.add(admin); db.session.commit()
+    print("Admin demo: admin@ciipa.com / Admin123")
 
 # ─── MAIN ───────────────────────────────────────────────
+# Sólo para desarrollo (servidor de Flask con recarga y depurador).
+# En producción: gunicorn -c gunicorn.conf.py (ver wsgi.py).
 if __name__ == "__main__":
-    with app.app_context():
-        if not User.query.filter_by(role="admin").first():
-            admin = User(email="admin@ciipa.com", role="admin")
-            admin.set_password("Admin123")
-            db.session.add(admin); db.session.commit()
-            print("Admin demo: admin@ciipa.com / Admin123")
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,267 @@
+# archive.py
+# ---------------------------------------------------------
+# Archivo frío de inscripciones: particiones mensuales
+# comprimidas fuera de la tabla
+# ---------------------------------------------------------
+# Inscripcion sólo guarda los últimos ARCHIVE_AFTER_DAYS días (en
+# meses completos); lo anterior se mueve a
+#   instance/archivo/inscripciones_AAAA-MM.ndjson.gz
+# una fila JSON por inscripción, ordenadas por (fecha, id). Un mes
+# archivado ocupa ~10× menos que en la BD y ya no pesa en los
+# índices ni en los listados y exportaciones de siempre.
+#
+# Para cron / tarea programada (meses completos, idempotente):
+#   flask --app app archive-inscripciones
+#   flask --app app archive-restore 2024-03      # de vuelta a la tabla
+#
+# Qué ve cada parte:
+#   · listado y exportación (listings.py) leen también las particiones
+#     cuando el filtro de fechas llega a algún mes archivado; si no,
+#     ni se abren
+#   · búsqueda (search.py) sólo a pedido: no hay índice, se recorren
+#   · analítica: EstadisticaDiaria no se toca al archivar (se cuenta
+#     al insertar, no al borrar) y analytics-rebuild suma el archivo
+#   · respaldos (backup.py) incluyen las particiones
+#
+# Al archivar primero se escribe la partición y después se borran las
+# filas; si algo se corta a la mitad, volver a correr el comando
+# termina el trabajo (las filas se combinan por id).
+#
+# Cada worker guarda en memoria las últimas ARCHIVE_CACHE_PERIODS
+# particiones leídas; el mtime del archivo avisa si otro proceso la cambió.
+import os, re, gzip, json, threading
+from collections import namedtuple, OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from models import db, Inscripcion, normalize_email
+
+# mismas columnas y orden que listings.inscripciones_stmt
+Archivada = namedtuple("Archivada", "id nombre curso email fecha telefono_contacto")
+COLUMNS = [getattr(Inscripcion, name) for name in Archivada._fields]
+
+_FILE = re.compile(r"^inscripciones_(\d{4})-(\d{2})\.ndjson\.gz$")
+ID_CHUNK = 500                       # ids por cada IN (…)
+
+
+class ArchiveError(Exception):
+    """Partición inexistente o ilegible; no se tocó la BD."""
+
+
+def month(value):
+    """Primer día (datetime) del mes de `value`."""
+    return datetime(value.year, value.month, 1)
+
+def next_month(m):
+    return (m.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def parse_period(s):
+    """'AAAA-MM' → datetime del día 1, o ArchiveError."""
+    try:
+        return datetime.strptime(s, "%Y-%m")
+    except (TypeError, ValueError):
+        raise ArchiveError(f"Periodo inválido: {s!r} (AAAA-MM).") from None
+
+
+# ─── formato de la partición ───────────────────────────
+def _read(path):
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            ident, nombre, curso, email, fecha, telefono = json.loads(line)
+            yield Archivada(ident, nombre, curso, email, datetime.fromisoformat(fecha), telefono)
+
+def _write(path, rows):
+    # mtime=0: el mismo contenido da los mismos bytes (los respaldos no lo duplican)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+            for r in rows:
+                gz.write(json.dumps([r.id, r.nombre, r.curso, r.email, r.fecha.isoformat(),
+                                     r.telefono_contacto], ensure_ascii=False,
+                                    separators=(",", ":")).encode("utf-8") + b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+
+
+class Archive:
+
+    def __init__(self, app=None):
+        self.app     = None
+        self.path    = None
+        self._lock   = threading.Lock()
+        self._rows   = OrderedDict()       # (periodo, mtime) → [Archivada]
+        self._months = None                # (versión, [periodo])
+        self._emails = None                # (versión, frozenset)
+        if app is not None:
+            self.init_app(app)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app):
+        app.config.setdefault("ARCHIVE_DIR", os.path.join(app.instance_path, "archivo"))
+        app.config.setdefault("ARCHIVE_AFTER_DAYS", 365)      # lo más viejo va al archivo
+        app.config.setdefault("ARCHIVE_CACHE_PERIODS", 36)    # particiones (meses) en memoria por worker
+        self.app = app
+        self.path = app.config["ARCHIVE_DIR"]
+        app.extensions["archive"] = self
+
+    def file(self, periodo):
+        return os.path.join(self.path, f"inscripciones_{periodo:%Y-%m}.ndjson.gz")
+
+    def version(self):
+        # crear, reemplazar o borrar una partición cambia el mtime del directorio
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except (OSError, TypeError):
+            return None
+
+    # ─── lectura ───────────────────────────────────────
+    def periods(self):
+        """Meses archivados (día 1), del más antiguo al más reciente."""
+        version, hit = self.version(), self._months
+        if version is None:
+            return []
+        if hit is not None and hit[0] == version:
+            return hit[1]
+        found = sorted(datetime(int(m[1]), int(m[2]), 1)
+                       for m in map(_FILE.match, os.listdir(self.path)) if m)
+        self._months = (version, found)
+        return found
+
+    def periods_between(self, desde=None, hasta=None):
+        """Meses archivados que se cruzan con [desde, hasta)."""
+        return [p for p in self.periods()
+                if (desde is None or desde < next_month(p)) and (hasta is None or p < hasta)]
+
+    def rows(self, periodo):
+        """Filas del mes, por (fecha, id); en memoria hasta que cambie el archivo."""
+        path = self.file(periodo)
+        try:
+            key = (periodo, os.stat(path).st_mtime_ns)
+        except FileNotFoundError:
+            return []
+        hit = self._rows.get(key)
+        if hit is not None:
+            with self._lock:
+                if key in self._rows:
+                    self._rows.move_to_end(key)
+            return hit
+        rows = list(_read(path))
+        with self._lock:
+            self._rows[key] = rows
+            while len(self._rows) > self.app.config["ARCHIVE_CACHE_PERIODS"]:
+                self._rows.popitem(last=False)
+        return rows
+
+    def scan(self):
+        """Todas las filas archivadas, mes a mes y sin pasar por la caché."""
+        for periodo in self.periods():
+            yield from _read(self.file(periodo))
+
+    def emails(self):
+        """Correos (en minúsculas) con alguna inscripción archivada: la
+        conversión de analytics y la deduplicación del importador."""
+        version, hit = self.version(), self._emails
+        if hit is not None and hit[0] == version:
+            return hit[1]
+        # particiones de antes de normalizar los correos pueden traer mayúsculas
+        emails = frozenset(normalize_email(r.email) for r in self.scan())
+        self._emails = (version, emails)
+        return emails
+
+    def info(self):
+        """[(periodo, filas, bytes)] de cada partición."""
+        return [(p, sum(1 for _ in _read(self.file(p))), os.path.getsize(self.file(p)))
+                for p in self.periods()]
+
+    # ─── archivar / restaurar ──────────────────────────
+    def cutoff(self, days=None):
+        """Inicio del mes más antiguo que se queda en la tabla."""
+        days = self.app.config["ARCHIVE_AFTER_DAYS"] if days is None else days
+        return month(datetime.utcnow() - timedelta(days=days))
+
+    def archive(self, before=None):
+        """Mueve a sus particiones las inscripciones de los meses anteriores
+        a `before` (por defecto, cutoff()). Devuelve [(periodo, filas)]."""
+        before = month(before or self.cutoff())
+        os.makedirs(self.path, exist_ok=True)
+        # SQLite sin AUTOINCREMENT reutiliza ids si se borra el más alto:
+        # esa fila se queda para que ningún id archivado vuelva a aparecer
+        top = db.session.scalar(db.select(func.max(Inscripcion.id)))
+        first = db.session.scalar(db.select(func.min(Inscripcion.fecha))
+                                  .where(Inscripcion.fecha < before, Inscripcion.id != top))
+        done = []
+        periodo = month(first) if first else before
+        while periodo < before:
+            fin = next_month(periodo)
+            rows = [Archivada(*r) for r in db.session.execute(
+                db.select(*COLUMNS)
+                .where(Inscripcion.fecha >= periodo, Inscripcion.fecha < fin,
+                       Inscripcion.id != top)
+                .order_by(Inscripcion.fecha, Inscripcion.id))]
+            if rows:
+                self._merge(periodo, rows)
+                ids = [r.id for r in rows]
+                for i in range(0, len(ids), ID_CHUNK):
+                    # el trigger de búsqueda saca las filas del índice; analytics no cuenta borrados
+                    db.session.execute(db.delete(Inscripcion)
+                                       .where(Inscripcion.id.in_(ids[i:i + ID_CHUNK]))
+                                       .execution_options(synchronize_session=False))
+                db.session.commit()
+                done.append((periodo, len(rows)))
+            periodo = fin
+        return done
+
+    def _merge(self, periodo, rows):
+        path = self.file(periodo)
+        merged = {}
+        if os.path.exists(path):                 # un mes ya archivado (importación tardía, reintento)
+            merged.update((r.id, r) for r in _read(path))
+        merged.update((r.id, r) for r in rows)
+        _write(path, sorted(merged.values(), key=lambda r: (r.fecha, r.id)))
+
+    def restore(self, periodo):
+        """Devuelve a la tabla las filas del mes y borra su partición.
+        Devuelve cuántas se insertaron (las que ya estaban se omiten)."""
+        path = self.file(periodo)
+        if not os.path.exists(path):
+            raise ArchiveError(f"No hay partición para {periodo:%Y-%m}.")
+        try:
+            rows = list(_read(path))
+        except (OSError, ValueError, EOFError) as exc:
+            raise ArchiveError(f"{os.path.basename(path)} ilegible ({exc}).") from None
+
+        ids = [r.id for r in rows]
+        present = set()
+        for i in range(0, len(ids), ID_CHUNK):
+            present.update(db.session.scalars(
+                db.select(Inscripcion.id).where(Inscripcion.id.in_(ids[i:i + ID_CHUNK]))))
+        nuevas = [r._asdict() for r in rows if r.id not in present]
+        if nuevas:
+            # INSERT de Core: el trigger las reindexa y analytics no las vuelve a contar
+            stmt = db.insert(Inscripcion.__table__)
+            db.session.connection(bind_arguments={"clause": stmt}).execute(stmt, nuevas)
+        db.session.commit()
+        os.remove(path)
+        return len(nuevas)
+
+    # ─── respaldos ─────────────────────────────────────
+    def files(self):
+        """{nombre: ruta} de las particiones (lo que copia backup.py)."""
+        return {os.path.basename(self.file(p)): self.file(p) for p in self.periods()}
+
+    def replace_all(self, staged):
+        """Deja exactamente las particiones `staged` ({nombre: ruta ya
+        verificada, junto a ARCHIVE_DIR}). Lo usa la restauración de respaldos."""
+        for name in set(self.files()) - set(staged):
+            os.remove(os.path.join(self.path, name))
+        for name, src in staged.items():
+            os.replace(src, os.path.join(self.path, name))
+
+    @staticmethod
+    def valid_name(name):
+        return bool(_FILE.match(name))
+
+
+archive = Archive()
@@ -0,0 +1,255 @@
+# assets.py
+# ---------------------------------------------------------
+# Archivos estáticos con huella: nombres con hash del contenido,
+# versiones .gz/.br precomprimidas y caché "para siempre"
+# ---------------------------------------------------------
+#   flask --app app assets-build [--vendor]
+#
+# Copia static/** a static/dist/ como css/style.<hash>.css (más
+# .gz y, si está instalado `brotli`, .br) y escribe
+# static/dist/manifest.json. Desde ese momento
+# url_for('static', filename='css/style.css') apunta a la copia con
+# huella, que se sirve con `Cache-Control: immutable` de un año: el
+# navegador no vuelve a preguntar, y al cambiar el archivo cambia
+# el nombre.
+#
+# Lo que no está en el manifiesto (p.ej. imágenes subidas después
+# del build) se sirve como siempre. En modo debug no se usan huellas
+# para que los cambios en style.css se vean al recargar.
+#
+# --vendor descarga Bootstrap (y Chart.js, del panel de analítica) a
+# static/vendor/ y las plantillas los piden ahí en vez de al CDN
+# (vendor_url()).
+import os, re, gzip, json, time, base64, hashlib, mimetypes, threading
+from urllib.request import urlopen
+
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:                 # opcional: sólo .gz
+    brotli = None
+
+DIST_DIR      = "dist"              # relativo a static/
+MANIFEST_NAME = "manifest.json"
+COMPRESSIBLE  = {".css", ".js", ".svg", ".json", ".txt", ".map", ".xml", ".ico"}
+ENCODINGS     = (("br", ".br"), ("gzip", ".gz"))   # en orden de preferencia
+ONE_YEAR      = 365 * 86400
+
+VENDOR = {
+    # nombre: (URL del CDN, ruta en static/)
+    "bootstrap.css": ("https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css",
+                      "vendor/bootstrap-5.3.3/bootstrap.min.css"),
+    "bootstrap.js":  ("https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js",
+                      "vendor/bootstrap-5.3.3/bootstrap.bundle.min.js"),
+    "chart.js":      ("https://cdn.jsdelivr.net/npm/chart.js@4.4.4/dist/chart.umd.min.js",
+                      "vendor/chart.js-4.4.4/chart.umd.min.js"),
+}
+
+CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def _fingerprint(rel, data):
+    stem, ext = os.path.splitext(rel)
+    return f"{DIST_DIR}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+class Assets:
+
+    def __init__(self, app=None):
+        self.app      = None
+        self._lock    = threading.Lock()
+        self._data    = {"files": {}, "encodings": {}}
+        self._mtime   = None
+        self._checked = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app):
+        app.config.setdefault("ASSETS_FINGERPRINT", True)    # usar el manifiesto (salvo debug)
+        app.config.setdefault("ASSETS_VENDOR", True)         # copia local de Bootstrap si existe
+        app.config.setdefault("ASSETS_MAX_AGE", ONE_YEAR)    # s, sólo archivos con huella
+        self.app = app
+        app.url_defaults(self._url_defaults)
+        app.view_functions["static"] = self.send_static
+        app.jinja_env.globals["vendor_url"] = self.vendor_url
+        app.extensions["assets"] = self
+
+    # ─── manifiesto ────────────────────────────────────
+    def _path(self, *parts):
+        return os.path.join(self.app.static_folder, *parts)
+
+    def manifest(self):
+        """{"files": {original: con_huella}, "encodings": {con_huella: [".br", ".gz"]}}"""
+        now = time.monotonic()
+        if now - self._checked < 1:                # a lo más un stat() por segundo
+            return self._data
+        self._checked = now
+        try:
+            mtime = os.stat(self._path(DIST_DIR, MANIFEST_NAME)).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                data = {"files": {}, "encodings": {}}
+                if mtime is not None:
+                    with open(self._path(DIST_DIR, MANIFEST_NAME), encoding="utf-8") as fh:
+                        data = json.load(fh)
+                self._data, self._mtime = data, mtime
+        return self._data
+
+    def _url_defaults(self, endpoint, values):
+        # url_for('static', filename=…) → copia con huella, si la hay
+        if endpoint != "static" or "filename" not in values:
+            return
+        if self.app.config["ASSETS_FINGERPRINT"] and not self.app.debug:
+            values["filename"] = self.manifest()["files"].get(values["filename"],
+                                                              values["filename"])
+
+    def vendor_url(self, name):
+        """URL local de una librería de VENDOR si se descargó, si no la del CDN."""
+        cdn, local = VENDOR[name]
+        if self.app.config["ASSETS_VENDOR"] and os.path.exists(self._path(local)):
+            return url_for("static", filename=local)
+        return cdn
+
+    # ─── servir ────────────────────────────────────────
+    def send_static(self, filename):
+        if not filename.startswith(DIST_DIR + "/"):
+            return self.app.send_static_file(filename)
+
+        # con huella: precomprimido si el cliente lo acepta, caché inmutable
+        encodings = self.manifest()["encodings"].get(filename, [])
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        for encoding, ext in ENCODINGS:
+            if ext in encodings and encoding in request.accept_encodings:
+                response = send_from_directory(self.app.static_folder, filename + ext,
+                                               mimetype=mimetype)
+                response.headers["Content-Encoding"] = encoding
+                break
+        else:
+            response = send_from_directory(self.app.static_folder, filename,
+                                           mimetype=mimetype)
+        if encodings:
+            response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.max_age = self.app.config["ASSETS_MAX_AGE"]
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+        return response
+
+    # ─── build ─────────────────────────────────────────
+    def vendor(self):
+        """Descarga las librerías de VENDOR a static/vendor/. Devuelve
+        [(ruta, sha384)] para poder fijar `integrity` si se usa el CDN."""
+        hechos = []
+        for cdn, local in VENDOR.values():
+            with urlopen(cdn, timeout=30) as resp:
+                data = resp.read()
+            os.makedirs(os.path.dirname(self._path(local)), exist_ok=True)
+            with open(self._path(local) + ".tmp", "wb") as fh:
+                fh.write(data)
+            os.replace(self._path(local) + ".tmp", self._path(local))
+            sri = base64.b64encode(hashlib.sha384(data).digest()).decode()
+            hechos.append((local, f"sha384-{sri}"))
+        return hechos
+
+    def _sources(self):
+        for root, dirs, files in os.walk(self.app.static_folder):
+            rel_root = os.path.relpath(root, self.app.static_folder).replace(os.sep, "/")
+            if rel_root == DIST_DIR:
+                dirs[:] = []
+                continue
+            for name in files:
+                if not name.endswith((".gz", ".br", ".tmp")):
+                    yield name if rel_root == "." else f"{rel_root}/{name}"
+
+    def _rewrite_css(self, rel, data, files):
+        # url(../img/x.png) relativo al CSS original → ruta con huella,
+        # relativa a donde queda la copia en dist/
+        base = os.path.dirname(rel)
+
+        def repl(m):
+            quote, ref = m.groups()
+            if ref.startswith(("data:", "http:", "https:", "/", "#")):
+                return m.group(0)
+            path, _, frag = ref.partition("#")
+            path, _, query = path.partition("?")
+            target = os.path.normpath(os.path.join(base, path)).replace(os.sep, "/")
+            if target not in files:
+                return m.group(0)
+            new = os.path.relpath(files[target], os.path.dirname(f"{DIST_DIR}/{rel}"))
+            new = new.replace(os.sep, "/") + (f"?{query}" if query else "") + (f"#{frag}" if frag else "")
+            return f"url({quote}{new}{quote})"
+
+        return CSS_URL_RE.sub(repl, data.decode("utf-8")).encode("utf-8")
+
+    def _write(self, hashed, data, min_size):
+        """Copia con huella + .gz/.br si compensan. Devuelve las extensiones."""
+        dest = self._path(hashed)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        if not os.path.exists(dest):
+            with open(dest + ".tmp", "wb") as fh:
+                fh.write(data)
+            os.replace(dest + ".tmp", dest)
+        if os.path.splitext(hashed)[1] not in COMPRESSIBLE or len(data) < min_size:
+            return []
+        encodings = []
+        for ext, compress in ((".br", brotli and (lambda d: brotli.compress(d, quality=11))),
+                              (".gz", lambda d: gzip.compress(d, 9, mtime=0))):
+            if not compress:
+                continue
+            if not os.path.exists(dest + ext):
+                packed = compress(data)
+                if len(packed) >= len(data) * 0.95:
+                    continue
+                with open(dest + ext + ".tmp", "wb") as fh:
+                    fh.write(packed)
+                os.replace(dest + ext + ".tmp", dest + ext)
+            encodings.append(ext)
+        return encodings
+
+    def build(self, min_size=512):
+        """Genera static/dist/ y su manifiesto. Conserva los archivos del
+        build anterior (páginas ya en caché pueden seguir pidiéndolos) y
+        borra los más viejos. Devuelve (archivos, comprimidos)."""
+        files, encodings = {}, {}
+        # primero todo lo que no es CSS: el CSS puede apuntar a ello
+        sources = sorted(self._sources(), key=lambda rel: rel.endswith(".css"))
+        for rel in sources:
+            with open(self._path(rel), "rb") as fh:
+                data = fh.read()
+            if rel.endswith(".css"):
+                data = self._rewrite_css(rel, data, files)
+            files[rel] = hashed = _fingerprint(rel, data)
+            encs = self._write(hashed, data, min_size)
+            if encs:
+                encodings[hashed] = encs
+
+        manifest_path = self._path(DIST_DIR, MANIFEST_NAME)
+        try:
+            with open(manifest_path, encoding="utf-8") as fh:
+                previous = json.load(fh)
+        except (OSError, ValueError):
+            previous = {"files": {}, "encodings": {}}
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as fh:
+            json.dump({"files": files, "encodings": encodings}, fh, indent=1, sort_keys=True)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        keep = {MANIFEST_NAME}
+        for m in (previous, {"files": files, "encodings": encodings}):
+            for hashed in m["files"].values():
+                rel = hashed[len(DIST_DIR) + 1:]
+                keep.add(rel)
+                keep.update(rel + ext for ext in m["encodings"].get(hashed, []))
+        for root, _, names in os.walk(self._path(DIST_DIR)):
+            for name in names:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, self._path(DIST_DIR)).replace(os.sep, "/")
+                if rel not in keep:
+                    os.remove(path)
+        return len(files), len(encodings)
+
+
+assets = Assets()
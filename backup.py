@@ -0,0 +1,424 @@
+# backup.py
+# ---------------------------------------------------------
+# Respaldos incrementales de CIIPA (BD + imágenes + archivo
+# de inscripciones)
+# ---------------------------------------------------------
+# backups/
+#   blobs/ab/ab12…      contenido por SHA-256 (BD e imágenes, sin duplicados)
+#   manifests/ciipa_YYYYmmdd_HHMMSS.json
+#   hashcache.json       (ruta → tamaño, mtime, sha) para no re-hashear
+#
+# La BD se copia con la API de backup en línea de SQLite (una
+# transacción de lectura: en WAL no bloquea a los escritores).
+# Una imagen que no cambió no se vuelve a guardar: el manifiesto
+# sólo apunta a su hash. La descarga arma el .zip al vuelo.
+#
+# La restauración nunca escribe sobre lo vivo hasta que todo está
+# verificado: extrae a un área temporal, comprueba las sumas del
+# manifiesto, migra la BD extraída y sólo entonces hace el cambio.
+import os, json, time, sqlite3, hashlib, shutil, zipfile
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import text, create_engine
+
+from models import db
+from export import ZipPipe
+from cache import page_cache
+from identity import user_cache
+from testimonials import testimonials
+from archive import archive as particiones       # (restore() recibe un `archive`)
+import images
+
+CHUNK = 64 * 1024
+SKIP_DIRS = {"derivados"}          # se regeneran con `flask images-backfill`
+
+
+# ─── rutas ──────────────────────────────────────────────
+def _dir(*parts):
+    return os.path.join(current_app.config["BACKUP_DIR"], *parts)
+
+def _blob(sha):
+    return _dir("blobs", sha[:2], sha)
+
+def db_path():
+    url = db.engine.url
+    if url.get_backend_name() != "sqlite" or not url.database:
+        raise RuntimeError("El respaldo en línea sólo está disponible para SQLite.")
+    return url.database
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _store(path, sha, move=False):
+    """Guarda `path` en el almacén si ese contenido aún no existe."""
+    dest = _blob(sha)
+    if os.path.exists(dest):
+        if move:
+            os.remove(path)
+        return False
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp = dest + ".tmp"
+    (shutil.move if move else shutil.copyfile)(path, tmp)
+    os.replace(tmp, dest)
+    return True
+
+
+# ─── snapshot de la BD ─────────────────────────────────
+def snapshot_db(dest):
+    """Copia consistente de la BD viva en `dest` (API de backup de SQLite)."""
+    src = sqlite3.connect(f"file:{db_path()}?mode=ro", uri=True)
+    dst = sqlite3.connect(dest)
+    try:
+        with dst:
+            src.backup(dst)                 # pages=-1: un solo paso, sin reinicios
+    finally:
+        dst.close(); src.close()
+
+def _alembic_revision():
+    try:
+        return db.session.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except Exception:
+        db.session.rollback()
+        return None
+
+
+# ─── imágenes ───────────────────────────────────────────
+def _media_files():
+    """Rutas relativas a static/ de las imágenes originales."""
+    root = current_app.static_folder
+    base = os.path.join(current_app.root_path, current_app.config["UPLOAD_FOLDER"])
+    for dirpath, dirnames, filenames in os.walk(base):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            yield os.path.relpath(full, root).replace(os.sep, "/"), full
+
+def _load_hashcache():
+    try:
+        with open(_dir("hashcache.json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+def _save_hashcache(cache):
+    tmp = _dir("hashcache.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(cache, fh)
+    os.replace(tmp, _dir("hashcache.json"))
+
+
+# ─── API ───────────────────────────────────────────────
+def create_backup():
+    """Crea un respaldo y devuelve (nombre, manifiesto, blobs_nuevos)."""
+    os.makedirs(_dir("manifests"), exist_ok=True)
+    os.makedirs(_dir("blobs"), exist_ok=True)
+    name = f"ciipa_{datetime.now():%Y%m%d_%H%M%S}"
+
+    tmp_db = _dir(f"{name}.db.tmp")
+    snapshot_db(tmp_db)
+    db_sha, db_size = _sha256(tmp_db), os.path.getsize(tmp_db)
+    nuevos = int(_store(tmp_db, db_sha, move=True))
+
+    cache, files = _load_hashcache(), {}
+    for rel, full in _media_files():
+        st = os.stat(full)
+        hit = cache.get(rel)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            sha = hit[2]
+        else:
+            sha = _sha256(full)
+            cache[rel] = [st.st_size, st.st_mtime_ns, sha]
+        nuevos += _store(full, sha)
+        files[rel] = {"sha256": sha, "size": st.st_size}
+
+    # particiones de archive.py: sin ellas, la BD respaldada no tiene lo archivado
+    archivo = {}
+    for fname, full in particiones.files().items():
+        st, rel = os.stat(full), f"archivo/{fname}"
+        hit = cache.get(rel)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            sha = hit[2]
+        else:
+            sha = _sha256(full)
+            cache[rel] = [st.st_size, st.st_mtime_ns, sha]
+        nuevos += _store(full, sha)
+        archivo[fname] = {"sha256": sha, "size": st.st_size}
+    vigentes = set(files) | {f"archivo/{fname}" for fname in archivo}
+    _save_hashcache({k: v for k, v in cache.items() if k in vigentes})
+
+    manifest = {
+        "format":   1,
+        "name":     name,
+        "created":  datetime.now().isoformat(timespec="seconds"),
+        "alembic":  _alembic_revision(),
+        "db":       {"path": "ciipa.db", "sha256": db_sha, "size": db_size},
+        "files":    files,
+        "archivo":  archivo,
+    }
+    tmp = _dir("manifests", f"{name}.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    os.replace(tmp, _dir("manifests", f"{name}.json"))
+
+    prune(current_app.config["BACKUP_KEEP"])
+    return name, manifest, nuevos
+
+
+def list_backups():
+    """Nombres de respaldo, del más reciente al más antiguo."""
+    try:
+        names = os.listdir(_dir("manifests"))
+    except FileNotFoundError:
+        return []
+    return sorted((n[:-5] for n in names if n.endswith(".json")), reverse=True)
+
+def load_manifest(name):
+    with open(_dir("manifests", f"{name}.json"), encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def prune(keep):
+    """Política de retención: conserva los `keep` manifiestos más recientes
+    y borra los blobs que ya no referencia ninguno."""
+    names = list_backups()
+    for old in names[keep:]:
+        os.remove(_dir("manifests", f"{old}.json"))
+
+    vivos = set()
+    for name in names[:keep]:
+        m = load_manifest(name)
+        vivos.add(m["db"]["sha256"])
+        vivos.update(f["sha256"] for f in m["files"].values())
+        vivos.update(f["sha256"] for f in m.get("archivo", {}).values())
+
+    # margen para no borrar blobs de un respaldo que se está escribiendo
+    margen = datetime.now().timestamp() - 600
+    borrados = 0
+    for dirpath, _, filenames in os.walk(_dir("blobs")):
+        for sha in filenames:
+            path = os.path.join(dirpath, sha)
+            if sha not in vivos and os.path.getmtime(path) < margen:
+                os.remove(path)
+                borrados += 1
+    return borrados
+
+
+def stream_zip(name):
+    """Genera el .zip del respaldo `name` por bloques (sin archivo temporal).
+
+    Contiene manifest.json, ciipa.db, las imágenes con su ruta en static/
+    y las particiones del archivo de inscripciones en archivo/."""
+    manifest = load_manifest(name)
+    pipe = ZipPipe()
+    with zipfile.ZipFile(pipe, "w") as zf:
+        zf.writestr("manifest.json", json.dumps(manifest, indent=1, sort_keys=True),
+                    compress_type=zipfile.ZIP_DEFLATED)
+        entries = [(manifest["db"]["path"], manifest["db"]["sha256"], zipfile.ZIP_DEFLATED)]
+        entries += [(f"static/{rel}", f["sha256"], zipfile.ZIP_STORED)   # jpg/png ya comprimen
+                    for rel, f in sorted(manifest["files"].items())]
+        entries += [(f"archivo/{name}", f["sha256"], zipfile.ZIP_STORED)   # ya van en gzip
+                    for name, f in sorted(manifest.get("archivo", {}).items())]
+        for arcname, sha, method in entries:
+            zinfo = zipfile.ZipInfo(arcname, date_time=datetime.now().timetuple()[:6])
+            zinfo.compress_type = method
+            with open(_blob(sha), "rb") as src, zf.open(zinfo, "w", force_zip64=True) as dst:
+                for chunk in iter(lambda: src.read(CHUNK), b""):
+                    dst.write(chunk)
+                    yield pipe.drain()
+    yield pipe.drain()
+
+
+# ─── restauración ──────────────────────────────────────
+class RestoreError(Exception):
+    """El archivo no es un respaldo válido; no se tocó nada."""
+
+
+def _media_dest(rel):
+    """Ruta final de una imagen del manifiesto (sólo dentro de UPLOAD_FOLDER)."""
+    base = os.path.normpath(os.path.join(current_app.root_path,
+                                         current_app.config["UPLOAD_FOLDER"]))
+    dest = os.path.normpath(os.path.join(current_app.static_folder, rel))
+    if not dest.startswith(base + os.sep) or SKIP_DIRS & set(rel.split("/")):
+        raise RestoreError(f"Ruta no permitida en el manifiesto: {rel}")
+    return dest
+
+
+def _extract(zf, arcname, meta, dest):
+    """Extrae un miembro por bloques calculando su SHA-256 al vuelo."""
+    try:
+        info = zf.getinfo(arcname)
+    except KeyError:
+        raise RestoreError(f"Falta {arcname} en el archivo.") from None
+    if info.file_size != meta["size"]:
+        raise RestoreError(f"Tamaño inesperado en {arcname}.")
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    h = hashlib.sha256()
+    with zf.open(info) as src, open(dest, "wb") as out:
+        for chunk in iter(lambda: src.read(CHUNK), b""):
+            h.update(chunk)
+            out.write(chunk)
+    if h.hexdigest() != meta["sha256"]:
+        raise RestoreError(f"Suma SHA-256 incorrecta en {arcname}.")
+
+
+def _check_db(path):
+    con = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        ok = con.execute("PRAGMA quick_check").fetchone()[0]
+    except sqlite3.DatabaseError as exc:
+        raise RestoreError(f"ciipa.db no es una BD SQLite válida ({exc}).") from None
+    finally:
+        con.close()
+    if ok != "ok":
+        raise RestoreError(f"ciipa.db está dañada: {ok}")
+
+
+def _migrate(path):
+    """Lleva la BD extraída a la última revisión de migrations/versions."""
+    from alembic.script import ScriptDirectory
+    from alembic.operations import Operations
+    from alembic.runtime.migration import MigrationContext, MigrationStep
+    from alembic.util import CommandError
+
+    migrate = current_app.extensions["migrate"]
+    script = ScriptDirectory.from_config(migrate.migrate.get_config(migrate.directory))
+    head = script.get_current_head()
+
+    def pasos(rev, _ctx):
+        # de la revisión actual a head, de la más vieja a la más nueva
+        revs = reversed(list(script.iterate_revisions(head, rev, implicit_base=True)))
+        return [MigrationStep.upgrade_from_script(script.revision_map, r) for r in revs]
+
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        with engine.begin() as conn:
+            ctx = MigrationContext.configure(conn, opts={**migrate.configure_args, "fn": pasos})
+            actual = ctx.get_current_revision()
+            if actual is None:
+                raise RestoreError("La BD del respaldo no tiene revisión de Alembic.")
+            try:
+                script.get_revision(actual)
+            except CommandError:
+                raise RestoreError(f"El respaldo es de una versión más nueva "
+                                   f"(revisión {actual}).") from None
+            if actual != head:
+                with Operations.context(ctx):
+                    ctx.run_migrations()
+    finally:
+        engine.dispose()
+    return actual, head
+
+
+def _swap_db(staged, timeout):
+    """Copia la BD verificada sobre la viva con la API de backup: un solo
+    paso bajo candado exclusivo, así todos los workers ven la BD vieja o
+    la nueva, nunca una mezcla. Espera a que terminen las transacciones
+    en curso hasta `timeout` segundos."""
+    db.session.remove()                      # no bloquearnos a nosotros mismos
+    deadline = time.monotonic() + timeout
+
+    def progress(status, remaining, total):
+        if status != sqlite3.SQLITE_DONE and time.monotonic() > deadline:
+            raise RestoreError("La BD siguió ocupada; no se restauró nada.")
+
+    src = sqlite3.connect(f"file:{staged}?mode=ro", uri=True)
+    dst = sqlite3.connect(db_path(), timeout=1)
+    try:
+        src.backup(dst, progress=progress)
+    finally:
+        dst.close(); src.close()
+    db.engine.dispose()
+
+
+def restore(archive):
+    """Restaura el .zip `archive` (ruta en disco).
+
+    Es un generador: va produciendo mensajes de progreso. Si algo no
+    cuadra lanza RestoreError antes de tocar la BD o las imágenes."""
+    staging = _dir(f"restore_{datetime.now():%Y%m%d_%H%M%S_%f}")
+    os.makedirs(staging)
+    cambios, archivadas = [], {}
+    try:
+        try:
+            zf = zipfile.ZipFile(archive)
+        except zipfile.BadZipFile:
+            raise RestoreError("El archivo no es un .zip válido.") from None
+        with zf:
+            try:
+                manifest = json.loads(zf.read("manifest.json"))
+            except (KeyError, ValueError):
+                raise RestoreError("El .zip no contiene un manifest.json válido.") from None
+            if manifest.get("format") != 1:
+                raise RestoreError("Formato de respaldo no reconocido.")
+            yield f"Respaldo {manifest['name']} ({manifest['created']})."
+
+            staged_db = os.path.join(staging, "ciipa.db")
+            _extract(zf, manifest["db"]["path"], manifest["db"], staged_db)
+            yield "Base de datos extraída y verificada."
+
+            total = len(manifest["files"])
+            for n, (rel, meta) in enumerate(sorted(manifest["files"].items()), 1):
+                dest = _media_dest(rel)
+                if os.path.exists(dest) and _sha256(dest) == meta["sha256"]:
+                    continue                 # ya está igual en disco
+                # junto al destino: os.replace es atómico en el mismo disco
+                staged = dest + ".restore-tmp"
+                cambios.append((rel, staged, dest))
+                _extract(zf, f"static/{rel}", meta, staged)
+                if n % 20 == 0:
+                    yield f"Imágenes verificadas: {n}/{total}"
+            yield f"Imágenes verificadas: {total}/{total} ({len(cambios)} distintas)."
+
+            # el archivo de inscripciones queda tal como estaba al respaldar
+            # (un respaldo sin "archivo" es anterior a él: su BD lo tiene todo)
+            for name, meta in sorted(manifest.get("archivo", {}).items()):
+                if not particiones.valid_name(name):
+                    raise RestoreError(f"Ruta no permitida en el manifiesto: archivo/{name}")
+                staged = os.path.join(particiones.path, name + ".restore-tmp")
+                archivadas[name] = staged
+                _extract(zf, f"archivo/{name}", meta, staged)
+            if archivadas:
+                yield f"Archivo de inscripciones verificado ({len(archivadas)} particiones)."
+
+        _check_db(staged_db)
+        actual, head = _migrate(staged_db)
+        yield (f"BD migrada de {actual} a {head}." if actual != head
+               else f"BD en la revisión actual ({head}).")
+
+        previo, _, _ = create_backup()
+        yield f"Respaldo previo guardado como {previo}."
+
+        # ── cambio: sin yields, un cliente que corta no lo deja a medias ──
+        # primero la BD (lo único que puede fallar por espera); los
+        # os.replace de las imágenes ya no fallan una vez extraídas
+        _swap_db(staged_db, current_app.config["RESTORE_DRAIN_TIMEOUT"])
+        for rel, staged, dest in cambios:
+            os.replace(staged, dest)
+        particiones.replace_all(archivadas)
+        page_cache.bump()
+        user_cache.invalidate()
+        testimonials.invalidate()
+        yield "Base de datos e imágenes restauradas."
+
+        for n, (rel, _, _) in enumerate(cambios, 1):
+            images.process_image(rel)
+            if n % 10 == 0 or n == len(cambios):
+                yield f"Derivados regenerados: {n}/{len(cambios)}"
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        for staged in [staged for _, staged, _ in cambios] + list(archivadas.values()):
+            if os.path.exists(staged):
+                os.remove(staged)
+
+
+def init_app(app):
+    app.config.setdefault("BACKUP_DIR", os.path.join(app.root_path, "backups"))
+    app.config.setdefault("BACKUP_KEEP", 10)
+    app.config.setdefault("RESTORE_MAX_BYTES", 1024 * 1024 * 1024)
+    app.config.setdefault("RESTORE_DRAIN_TIMEOUT", 30)      # s
@@ -0,0 +1,447 @@
+# bench.py
+# ---------------------------------------------------------
+# Benchmarks reproducibles de los flujos públicos y admin
+# ---------------------------------------------------------
+#   python bench.py seed --users 5000 --inscripciones 100000
+#   python bench.py run                        # cliente de pruebas de Flask
+#   python bench.py run --http --workers 4 --clients 16 --duration 20
+#   python bench.py run --save main            # guarda baselines/main.json
+#   python bench.py run --compare main         # exit 1 si algo empeora
+#   python bench.py startup --runs 5           # arranque en frío y con gunicorn
+#
+# Trabaja sobre su propia BD (instance/bench.db, vía DATABASE_URL):
+# la de desarrollo no se toca. El modo por defecto mide el costo del
+# servidor sin red (test client de Flask); --http levanta gunicorn en
+# un puerto local y lo ataca con varios clientes concurrentes.
+import os, re, sys, json, math, time, uuid, random, socket, argparse, threading, subprocess
+import http.cookiejar, urllib.request, urllib.parse, urllib.error
+from datetime import datetime, timedelta
+
+BASE_DIR     = os.path.abspath(os.path.dirname(__file__))
+BENCH_DB     = os.path.join(BASE_DIR, "instance", "bench.db")
+BASELINE_DIR = os.path.join(BASE_DIR, "baselines")
+PASSWORD     = "bench-1234"
+ADMINS       = 32                   # uno por cliente: el código 2FA es por usuario
+
+ENV = {
+    "DATABASE_URL":              f"sqlite:///{BENCH_DB}",
+    "FLASK_SECRET_KEY":          "bench",       # igual en todos los workers
+    "FLASK_MAIL_SUPPRESS_SEND":  "true",
+    "FLASK_PROFILE_SAMPLE_RATE": "0",           # sin cProfile midiendo encima
+    "FLASK_RATELIMIT_ENABLED":   "false",       # todos los clientes vienen de 127.0.0.1
+}
+
+CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+CODE_RE = re.compile(r"Código 2FA simulado: (\d{6})")
+NEXT_RE = re.compile(r'href="([^"]*after=[^"]+)"')
+
+
+def _app():
+    os.environ.update(ENV)
+    from app import create_app
+    return create_app()
+
+
+# ─── semilla ────────────────────────────────────────────
+def seed(args):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(BENCH_DB + suffix):
+            os.remove(BENCH_DB + suffix)
+    app = _app()
+    from flask_migrate import stamp
+    from werkzeug.security import generate_password_hash
+    from models import db, User, Inscripcion, Galeria, Testimonio, Programa
+
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    ago = lambda: now - timedelta(seconds=rng.randrange(3 * 365 * 86400))
+
+    def bulk(model, rows):
+        rows = list(rows)
+        for i in range(0, len(rows), 5000):
+            db.session.execute(db.insert(model), rows[i:i + 5000])
+        db.session.commit()
+        print(f"  {model.__name__}: {len(rows)}")
+
+    with app.app_context():
+        # la migración inicial asume una BD previa: tablas desde los modelos
+        db.create_all()
+        stamp()
+        pw = generate_password_hash(PASSWORD)            # un solo hash para todos
+        cursos = [f"Programa {i}" for i in range(1, args.programas + 1)]
+        imgs = [f"img/galeria{i}.jpg" for i in range(1, 7)]
+
+        bulk(Programa, ({"nombre": c, "tipo": rng.choice(["Carrera", "Diplomado"]),
+                         "duracion": "6 – 12 meses", "precio": "$1,500",
+                         "imagen": "img/programa.png", "visible": True} for c in cursos))
+        bulk(User, [{"email": f"admin{k}@example.com", "password": pw, "role": "admin",
+                     "created": now} for k in range(ADMINS)]
+             + [{"email": f"alumno{i}@example.com", "password": pw, "role": "student",
+                 "created": ago()} for i in range(args.users)])
+        bulk(Inscripcion, ({"nombre": f"Persona {i}", "curso": rng.choice(cursos),
+                            "email": f"persona{i}@example.com", "fecha": ago(),
+                            "telefono_contacto": f"55{rng.randrange(10**8):08d}"}
+                           for i in range(args.inscripciones)))
+        bulk(Galeria, ({"filename": imgs[i % len(imgs)], "visible": True, "timestamp": ago()}
+                       for i in range(args.galeria)))
+        bulk(Testimonio, ({"frase": f"Testimonio de prueba número {i}.", "nombre": f"Egresado {i}",
+                           "anio": rng.randrange(2020, 2026), "estado": "approved"}
+                          for i in range(args.testimonios)))
+    print(f"BD de benchmark lista en {BENCH_DB}")
+
+
+# ─── clientes ───────────────────────────────────────────
+class _Client:
+    """Registra (etiqueta, segundos, ok) de cada request medido; ok es
+    False si el status no es el esperado (un formulario rechazado
+    también cuenta como error, no como un request rápido)."""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.admin = False                     # sesión admin ya abierta
+
+    def get(self, path, label=None, expect=200):
+        return self._timed("GET", path, None, label, expect)
+
+    def post(self, path, data, label=None, expect=302):
+        return self._timed("POST", path, data, label, expect)
+
+    def _timed(self, method, path, data, label, expect):
+        t0 = time.perf_counter()
+        try:
+            status, body = self._send(method, path, data)
+        except Exception:
+            status, body = 599, ""
+        if label:
+            self.samples.append((label, time.perf_counter() - t0, status == expect))
+        return status, body
+
+
+class FlaskClient(_Client):
+    def __init__(self, samples, app):
+        super().__init__(samples)
+        self.client = app.test_client()
+
+    def _send(self, method, path, data):
+        r = self.client.open(path, method=method, data=data)
+        return r.status_code, r.get_data(as_text=True)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpClient(_Client):
+    def __init__(self, samples, base):
+        super().__init__(samples)
+        self.base = base
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def _send(self, method, path, data):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(self.base + path, data=body, timeout=30) as r:
+                return r.status, r.read().decode("utf-8", "replace")
+        except urllib.error.HTTPError as r:               # 3xx/4xx/5xx
+            return r.code, r.read().decode("utf-8", "replace")
+
+
+def _csrf(html):
+    m = CSRF_RE.search(html)
+    return m.group(1) if m else ""
+
+
+# ─── escenarios ─────────────────────────────────────────
+# Cada uno recibe su propio cliente (su propia cookie de sesión).
+def sc_home(c, rng, cfg):
+    _, html = c.get("/", "GET /")
+    m = re.search(r'data-next="([^"]+)"', html)          # scroll de la galería
+    if m:
+        c.get(f"/galeria.json?after={m.group(1)}", "GET /galeria.json")
+
+def sc_login(c, rng, cfg):
+    _, html = c.get("/login", "GET /login")
+    c.post("/login", {"csrf_token": _csrf(html), "password": PASSWORD,
+                      "email": f"alumno{rng.randrange(cfg['users'])}@example.com"}, "POST /login")
+    c.get("/logout")
+
+def sc_register(c, rng, cfg):
+    _, html = c.get("/register", "GET /register")
+    c.post("/register", {"csrf_token": _csrf(html), "email": f"nuevo-{uuid.uuid4().hex}@example.com",
+                         "password": PASSWORD, "confirm": PASSWORD}, "POST /register")
+
+def _admin_login(c, cfg, label=None):
+    _, html = c.get("/login")
+    c.post("/login", {"csrf_token": _csrf(html), "email": cfg["admin"], "password": PASSWORD})
+    _, html = c.get("/twofactor", label and "GET /twofactor")
+    m = CODE_RE.search(html)
+    c.post("/twofactor", {"code": m.group(1) if m else ""}, label and "POST /twofactor")
+
+def sc_twofactor(c, rng, cfg):
+    _admin_login(c, cfg, label=True)
+    c.get("/logout")
+
+def sc_inscripcion(c, rng, cfg):
+    _, html = c.get("/inscribirme", "GET /inscribirme")
+    c.post("/inscribirme", {"csrf_token": _csrf(html), "nombre": "Persona Benchmark",
+                            "curso": f"Programa {rng.randrange(1, cfg['programas'] + 1)}",
+                            "email": "persona@example.com", "telefono_contacto": "5512345678"},
+           "POST /inscribirme")
+
+def sc_admin(c, rng, cfg):
+    if not c.admin:
+        _admin_login(c, cfg)
+        c.admin = True
+    _, html = c.get("/admin/inscripciones", "GET /admin/inscripciones")
+    m = NEXT_RE.search(html)
+    if m:
+        c.get(m.group(1).replace("&amp;", "&"), "GET /admin/inscripciones (pág. 2)")
+    curso = urllib.parse.quote(f"Programa {rng.randrange(1, cfg['programas'] + 1)}")
+    c.get(f"/admin/inscripciones?curso={curso}&desde=2025-01-01", "GET /admin/inscripciones (filtro)")
+    c.get("/admin/alumnos", "GET /admin/alumnos")
+
+SCENARIOS = {"home": sc_home, "login": sc_login, "register": sc_register,
+             "twofactor": sc_twofactor, "inscripcion": sc_inscripcion, "admin": sc_admin}
+
+
+# ─── ejecución ──────────────────────────────────────────
+def _volumes(app):
+    from models import db, User, Programa
+    with app.app_context():
+        return {"users": db.session.scalar(db.select(db.func.count(User.id))
+                                           .where(User.role == "student")),
+                "programas": db.session.scalar(db.select(db.func.count(Programa.id)))}
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _gunicorn(workers):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-w", str(workers),
+         "-b", f"127.0.0.1:{port}", "--log-level", "warning"],
+        cwd=BASE_DIR, env={**os.environ, **ENV})
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(150):
+        try:
+            urllib.request.urlopen(base + "/", timeout=1).close()
+            return proc, base
+        except OSError:
+            if proc.poll() is not None:
+                sys.exit("gunicorn no arrancó")
+            time.sleep(0.1)
+    proc.terminate()
+    sys.exit("gunicorn no respondió")
+
+
+def _worker(make_client, names, cfg, seed, deadline, iterations, samples):
+    rng = random.Random(seed)
+    cfg = {**cfg, "admin": f"admin{seed % ADMINS}@example.com"}
+    clients = {n: make_client(samples) for n in names}
+    i = 0
+    while (iterations and i < iterations) or (deadline and time.monotonic() < deadline):
+        for n in names:
+            SCENARIOS[n](clients[n], rng, cfg)
+        i += 1
+
+
+def _pct(sorted_vals, p):
+    # percentil por rango más cercano
+    return sorted_vals[max(0, math.ceil(p / 100 * len(sorted_vals)) - 1)]
+
+def summarize(samples, elapsed):
+    by_label = {}
+    for label, secs, ok in samples:
+        by_label.setdefault(label, []).append((secs, ok))
+    results = {}
+    for label, vals in sorted(by_label.items()):
+        times = sorted(v[0] * 1000 for v in vals)
+        results[label] = {"n": len(times),
+                          "errors": sum(1 for v in vals if not v[1]),
+                          "mean_ms": round(sum(times) / len(times), 2),
+                          **{f"p{p}_ms": round(_pct(times, p), 2) for p in (50, 95, 99)}}
+    total = len(samples)
+    return {"routes": results,
+            "total": {"requests": total, "elapsed_s": round(elapsed, 2),
+                      "rps": round(total / elapsed, 1) if elapsed else 0.0,
+                      "errors": sum(r["errors"] for r in results.values())}}
+
+
+def run(args):
+    if not os.path.exists(BENCH_DB):
+        sys.exit("Primero: python bench.py seed")
+    app = _app()
+    cfg = _volumes(app)
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+
+    proc = None
+    if args.http:
+        proc, base = _gunicorn(args.workers)
+        make_client = lambda samples: HttpClient(samples, base)
+    else:
+        make_client = lambda samples: FlaskClient(samples, app)
+
+    try:
+        if args.warmup:
+            _worker(make_client, names, cfg, 0, None, args.warmup, [])
+        samples, threads = [], []
+        deadline = time.monotonic() + args.duration if args.duration else None
+        t0 = time.perf_counter()
+        for k in range(args.clients):
+            t = threading.Thread(target=_worker, args=(make_client, names, cfg, args.seed + k,
+                                                       deadline, args.iterations, samples))
+            t.start(); threads.append(t)
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+    finally:
+        if proc is not None:
+            proc.terminate(); proc.wait(10)
+
+    report = summarize(samples, elapsed)
+    report["meta"] = {"date": datetime.now().isoformat(timespec="seconds"),
+                      "git": _git_rev(), "python": sys.version.split()[0],
+                      "mode": f"gunicorn x{args.workers}" if args.http else "test-client",
+                      "clients": args.clients, "scenarios": names, **cfg}
+    _print(report)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=1, ensure_ascii=False)
+        print(f"\nBaseline guardado en {os.path.relpath(path, BASE_DIR)}")
+    if args.compare:
+        sys.exit(compare(report, args.compare, args.tolerance))
+
+
+# ─── arranque ───────────────────────────────────────────
+# Cada corrida es un proceso nuevo (imports en frío, como tras un
+# deploy o en el free tier al despertar).
+STARTUP_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app as m
+t1 = time.perf_counter()
+application = m.create_app()
+t2 = time.perf_counter()
+m.warm(application)
+t3 = time.perf_counter()
+application.test_client().get("/")
+t4 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "create_app": t2 - t1, "warm": t3 - t2,
+                  "primer GET /": t4 - t3}))
+"""
+
+def startup(args):
+    if not os.path.exists(BENCH_DB):
+        sys.exit("Primero: python bench.py seed")
+    fases = {}
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", STARTUP_PROBE], cwd=BASE_DIR,
+                             env={**os.environ, **ENV}, capture_output=True, text=True)
+        if out.returncode:
+            sys.exit(out.stderr)
+        for fase, secs in json.loads(out.stdout.strip().splitlines()[-1]).items():
+            fases.setdefault(fase, []).append(secs)
+        t0 = time.perf_counter()
+        proc, _ = _gunicorn(args.workers)
+        fases.setdefault(f"gunicorn x{args.workers} → 1er 200", []).append(time.perf_counter() - t0)
+        proc.terminate(); proc.wait(10)
+
+    print(f"\narranque · {args.runs} corrida(s) · mediana (mín–máx) en ms\n")
+    for fase, vals in fases.items():
+        vals.sort()
+        print(f"{fase:<32}{vals[len(vals) // 2] * 1000:>9.1f}"
+              f"   ({vals[0] * 1000:.1f}–{vals[-1] * 1000:.1f})")
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _print(report):
+    m, t = report["meta"], report["total"]
+    print(f"\n{m['mode']} · {m['clients']} cliente(s) · {m['users']} alumnos\n")
+    print(f"{'ruta':<40}{'n':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'err':>6}")
+    for label, r in report["routes"].items():
+        print(f"{label:<40}{r['n']:>7}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+              f"{r['p99_ms']:>9.1f}{r['errors']:>6}")
+    print(f"\n{t['requests']} requests en {t['elapsed_s']} s → {t['rps']} req/s, "
+          f"{t['errors']} errores")
+
+
+def compare(report, name, tolerance):
+    """Compara p95 por ruta y req/s con un baseline. Devuelve 1 si empeoró."""
+    with open(os.path.join(BASELINE_DIR, f"{name}.json"), encoding="utf-8") as fh:
+        base = json.load(fh)
+    if base["meta"]["mode"] != report["meta"]["mode"]:
+        print(f"\nAviso: el baseline se midió en modo {base['meta']['mode']}.")
+    peor = []
+    print(f"\nvs {name} ({base['meta'].get('git')}, tolerancia {tolerance:.0%}):")
+    for label, r in report["routes"].items():
+        old = base["routes"].get(label)
+        if not old:
+            continue
+        delta = r["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+        marca = "  ← REGRESIÓN" if delta > tolerance else ""
+        print(f"  {label:<40} p95 {old['p95_ms']:>8.1f} → {r['p95_ms']:>8.1f} ms ({delta:+.0%}){marca}")
+        if marca:
+            peor.append(label)
+    old_rps, rps = base["total"]["rps"], report["total"]["rps"]
+    delta = rps / old_rps - 1 if old_rps else 0.0
+    print(f"  {'req/s':<40}     {old_rps:>8.1f} → {rps:>8.1f}    ({delta:+.0%})")
+    if delta < -tolerance:
+        peor.append("req/s")
+    if report["total"]["errors"]:
+        peor.append("errores")
+    print("\nSin regresiones." if not peor else f"\nRegresiones: {', '.join(peor)}")
+    return 1 if peor else 0
+
+
+def main():
+    p = argparse.ArgumentParser(description="Benchmarks de CIIPA")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    s = sub.add_parser("seed", help="crea instance/bench.db con datos sintéticos")
+    s.add_argument("--users", type=int, default=5000)
+    s.add_argument("--inscripciones", type=int, default=50000)
+    s.add_argument("--galeria", type=int, default=60)
+    s.add_argument("--testimonios", type=int, default=200)
+    s.add_argument("--programas", type=int, default=12)
+    s.add_argument("--seed", type=int, default=1)
+
+    r = sub.add_parser("run", help="ejecuta los escenarios y reporta latencias")
+    r.add_argument("--http", action="store_true", help="contra gunicorn local")
+    r.add_argument("--workers", type=int, default=4, help="workers de gunicorn")
+    r.add_argument("--clients", type=int, default=1, help="clientes concurrentes")
+    r.add_argument("--iterations", type=int, default=30, help="vueltas por cliente")
+    r.add_argument("--duration", type=float, default=None,
+                   help="segundos (en lugar de --iterations)")
+    r.add_argument("--warmup", type=int, default=1)
+    r.add_argument("--scenarios", help=f"subconjunto de: {','.join(SCENARIOS)}")
+    r.add_argument("--seed", type=int, default=1)
+    r.add_argument("--save", metavar="NOMBRE", help="guarda baselines/NOMBRE.json")
+    r.add_argument("--compare", metavar="NOMBRE", help="compara con baselines/NOMBRE.json")
+    r.add_argument("--tolerance", type=float, default=0.20)
+
+    a = sub.add_parser("startup", help="mide el arranque: create_app, warm y gunicorn")
+    a.add_argument("--runs", type=int, default=5)
+    a.add_argument("--workers", type=int, default=2, help="workers de gunicorn")
+
+    args = p.parse_args()
+    if args.cmd == "run" and args.duration:
+        args.iterations = None
+    {"seed": seed, "run": run, "startup": startup}[args.cmd](args)
+
+
+if __name__ == "__main__":
+    main()
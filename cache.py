@@ -0,0 +1,177 @@
+# cache.py
+# ---------------------------------------------------------
+# Caché en memoria para las páginas públicas de CIIPA
+# ---------------------------------------------------------
+# Las páginas públicas (portada, catálogo…) sólo cambian cuando
+# un admin guarda HomeContent, Programa o Galeria, o modera un
+# testimonio (testimonials.py sube la versión a mano: un envío
+# pendiente no debe vaciar la caché).
+# Cada commit que toca esos modelos sube la "versión de contenido";
+# las páginas y fragmentos se guardan indexados por esa versión,
+# así que un GET anónimo se sirve desde memoria sin tocar SQLite.
+#
+# La versión también se refleja en un archivo del instance/ para
+# que los demás workers de gunicorn se enteren con un simple stat().
+import os, time, hashlib, threading
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+
+from flask import request, session, make_response, current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import HomeContent, Programa, Galeria
+
+CONTENT_MODELS = (HomeContent, Programa, Galeria)
+
+
+def _touches_content(objs):
+    return any(isinstance(o, CONTENT_MODELS) for o in objs)
+
+
+class PageCache:
+    """Caché LRU de páginas y fragmentos, invalidada por versión."""
+
+    def __init__(self, app=None):
+        self._lock      = threading.Lock()
+        self._pages     = OrderedDict()      # key -> (body, etag, mimetype)
+        self._fragments = {}                 # name -> (version, expira, value)
+        self._local     = 0                  # commits vistos en este worker
+        self._stamp     = None               # ruta del archivo de versión
+        if app is not None:
+            self.init_app(app)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app):
+        app.config.setdefault("PAGE_CACHE_ENABLED", True)
+        app.config.setdefault("PAGE_CACHE_MAX_ENTRIES", 256)
+
+        os.makedirs(app.instance_path, exist_ok=True)
+        self._stamp = os.path.join(app.instance_path, "content.version")
+        if not os.path.exists(self._stamp):
+            self._touch()
+
+        event.listen(Session, "after_flush", self._after_flush)
+        event.listen(Session, "do_orm_execute", self._on_execute)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_soft_rollback", self._after_rollback)
+        app.extensions["page_cache"] = self
+
+    # ─── versión de contenido ──────────────────────────
+    def _touch(self):
+        with open(self._stamp, "w") as fh:
+            fh.write(str(self._local))
+
+    def version(self):
+        """Versión actual: commits locales + mtime compartido entre workers."""
+        try:
+            shared = os.stat(self._stamp).st_mtime_ns
+        except (OSError, TypeError):
+            shared = 0
+        return (self._local, shared)
+
+    def bump(self):
+        with self._lock:
+            self._local += 1
+            self._pages.clear()
+            self._fragments.clear()
+        if self._stamp:
+            self._touch()
+
+    # ─── eventos de SQLAlchemy ─────────────────────────
+    def _after_flush(self, sess, flush_context):
+        if (_touches_content(sess.new) or _touches_content(sess.dirty)
+                or _touches_content(sess.deleted)):
+            sess.info["content_dirty"] = True
+
+    def _on_execute(self, state):
+        # query.update() / delete() masivos no pasan por el flush
+        if (state.is_update or state.is_delete) and state.bind_mapper is not None:
+            if issubclass(state.bind_mapper.class_, CONTENT_MODELS):
+                state.session.info["content_dirty"] = True
+
+    def _after_commit(self, sess):
+        if sess.info.pop("content_dirty", False):
+            self.bump()
+
+    def _after_rollback(self, sess, previous_transaction):
+        if previous_transaction.parent is None:
+            sess.info.pop("content_dirty", None)
+
+    # ─── fragmentos ────────────────────────────────────
+    def fragment(self, name, loader, ttl=None):
+        """Devuelve loader() cacheado hasta el próximo cambio de contenido
+        (o hasta que pasen `ttl` segundos, si se indica)."""
+        version, now = self.version(), time.monotonic()
+        hit = self._fragments.get(name)
+        if hit and hit[0] == version and (hit[1] is None or hit[1] > now):
+            return hit[2]
+        value = loader()
+        with self._lock:
+            self._fragments[name] = (version, now + ttl if ttl else None, value)
+        return value
+
+    # ─── páginas completas ─────────────────────────────
+    @staticmethod
+    def _cacheable():
+        # sólo visitantes anónimos y sin mensajes flash pendientes:
+        # layout.html pinta ambos, así que no se pueden compartir
+        return (request.method in ("GET", "HEAD")
+                and "_user_id" not in session
+                and "_flashes" not in session)
+
+    def _serve(self, body, etag, mimetype, max_age=0):
+        resp = make_response(body)
+        resp.mimetype = mimetype
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = (f"public, max-age={max_age}" if max_age
+                                         else "no-cache")
+        resp.vary.add("Cookie")
+        return resp.make_conditional(request)
+
+    def cached(self, view=None, *, max_age=0):
+        """Decorador para vistas públicas: HTML en memoria + ETag/304.
+
+        Con `max_age` (segundos o nombre de una clave de config) el
+        navegador puede reusar la respuesta sin revalidar, para feeds
+        donde unos minutos de retraso no importan:
+            @page_cache.cached(max_age="GALERIA_MAX_AGE")"""
+        if view is None:
+            return lambda v: self.cached(v, max_age=max_age)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cfg = current_app.config
+            ttl = cfg[max_age] if isinstance(max_age, str) else max_age
+            if not cfg["PAGE_CACHE_ENABLED"] or not self._cacheable():
+                return view(*args, **kwargs)
+
+            # el año entra en la clave por el © del footer
+            key = (request.full_path, self.version(), date.today().year)
+            hit = self._pages.get(key)
+            if hit is not None:
+                with self._lock:
+                    if key in self._pages:
+                        self._pages.move_to_end(key)
+                return self._serve(*hit, max_age=ttl)
+
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code != 200 or resp.direct_passthrough:
+                return resp
+            body = resp.get_data()
+            entry = (body, hashlib.sha1(body).hexdigest(), resp.mimetype)
+            with self._lock:
+                self._pages[key] = entry
+                while len(self._pages) > cfg["PAGE_CACHE_MAX_ENTRIES"]:
+                    self._pages.popitem(last=False)
+            return self._serve(*entry, max_age=ttl)
+        return wrapper
+
+
+def snapshot(obj):
+    """Copia plana (dict) de las columnas de un modelo, segura fuera de la sesión."""
+    return {c.key: getattr(obj, c.key) for c in obj.__table__.columns}
+
+
+page_cache = PageCache()
@@ -0,0 +1,160 @@
+# database.py
+# ---------------------------------------------------------
+# Capa de motor de BD: SQLite afinado para varios workers o
+# PostgreSQL con pool, según la configuración
+# ---------------------------------------------------------
+# SQLite (por defecto):
+#   journal_mode=WAL      lectores y escritor no se bloquean entre sí
+#   busy_timeout          un escritor espera su turno en vez de fallar
+#                         con "database is locked"
+#   synchronous=NORMAL    seguro con WAL, evita un fsync por commit
+#   mmap_size/cache_size  lecturas desde memoria
+#
+# PostgreSQL: basta con DATABASE_URL=postgresql://… (o
+# SQLALCHEMY_DATABASE_URI en config.py) y `pip install psycopg[binary]`.
+#
+# Los tamaños de pool son POR PROCESO: con 4 workers de gunicorn y
+# DB_POOL_SIZE=5 hay hasta 20 conexiones (+ overflow).
+#
+# Con DB_SPLIT_READS las consultas van a un motor de sólo lectura
+# (otra conexión al mismo archivo SQLite o DB_READ_URI, p.ej. una
+# réplica de Postgres) y las escrituras a un motor aparte; una vez
+# que la transacción escribe, el resto de sus lecturas van al de
+# escritura para que vea sus propios cambios.
+#
+# Tras un fork (gunicorn con preload_app) el hijo descarta, sin
+# cerrarlas, las conexiones que heredó del padre: un socket o archivo
+# SQLite compartido entre procesos corrompe el protocolo / los locks.
+import os, weakref
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, create_engine, Insert, Update, Delete
+from sqlalchemy.engine import make_url
+
+
+class RoutingSession(Session):
+    """Sesión que reparte lecturas/escrituras si hay motor de lectura."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        reader = current_app.extensions.get("db_read")
+        if reader is None or engine is not self._db.engine:
+            return engine
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self.info["db_wrote"] = True
+        return engine if self.info.get("db_wrote") else reader
+
+
+_ENGINES = weakref.WeakSet()          # motores de este proceso (ver _after_fork)
+
+def _after_fork():
+    for engine in list(_ENGINES):
+        engine.dispose(close=False)       # el padre sigue usando las suyas
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _reset_routing(sess, *args):
+    sess.info.pop("db_wrote", None)
+
+event.listen(RoutingSession, "after_commit", _reset_routing)
+event.listen(RoutingSession, "after_rollback", _reset_routing)
+
+
+def _normalize(url):
+    # Render/Heroku entregan postgres://, SQLAlchemy 2 sólo acepta postgresql://
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def _pool_options(app, url):
+    cfg = app.config
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}                                         # Flask-SQLAlchemy usa StaticPool
+    opts = {"pool_size":    cfg["DB_POOL_SIZE"],
+            "max_overflow": cfg["DB_MAX_OVERFLOW"],
+            "pool_timeout": cfg["DB_POOL_TIMEOUT"]}
+    if url.get_backend_name() == "sqlite":
+        # el busy_timeout lo pone el PRAGMA; aquí sólo el de pysqlite
+        opts["connect_args"] = {"timeout": cfg["SQLITE_BUSY_TIMEOUT"] / 1000}
+    else:
+        opts["pool_pre_ping"] = True                      # conexiones cortadas por el servidor
+        opts["pool_recycle"]  = cfg["DB_POOL_RECYCLE"]
+    return opts
+
+
+def _sqlite_pragmas(app, readonly=False):
+    cfg = app.config
+    pragmas = [f"PRAGMA busy_timeout = {int(cfg['SQLITE_BUSY_TIMEOUT'])}",
+               f"PRAGMA synchronous = {cfg['SQLITE_SYNCHRONOUS']}",
+               f"PRAGMA mmap_size = {int(cfg['SQLITE_MMAP_SIZE'])}",
+               f"PRAGMA cache_size = {int(cfg['SQLITE_CACHE_SIZE'])}",
+               "PRAGMA temp_store = MEMORY"]
+    if cfg["SQLITE_WAL"] and not readonly:
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")    # persiste en el archivo
+
+    def on_connect(dbapi_conn, record):
+        cur = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cur.execute(pragma)
+        cur.close()
+    return on_connect
+
+
+def _read_engine(app, engine):
+    cfg = app.config
+    if cfg["DB_READ_URI"]:
+        url = make_url(_normalize(cfg["DB_READ_URI"]))
+    elif engine.url.get_backend_name() == "sqlite" and engine.url.database:
+        path = os.path.abspath(engine.url.database)
+        url = make_url(f"sqlite:///file:{path}?mode=ro&uri=true")
+    else:
+        return None
+    reader = create_engine(url, **_pool_options(app, url))
+    if url.get_backend_name() == "sqlite":
+        event.listen(reader, "connect", _sqlite_pragmas(app, readonly=True))
+    return reader
+
+
+def init_app(app, db):
+    """Configura y registra `db` en la app (sustituye a db.init_app)."""
+    app.config.setdefault("SQLITE_WAL", True)
+    app.config.setdefault("SQLITE_BUSY_TIMEOUT", 5000)            # ms
+    app.config.setdefault("SQLITE_SYNCHRONOUS", "NORMAL")
+    app.config.setdefault("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)  # bytes
+    app.config.setdefault("SQLITE_CACHE_SIZE", -16000)            # negativo = KiB
+    app.config.setdefault("DB_POOL_SIZE", 5)
+    app.config.setdefault("DB_MAX_OVERFLOW", 10)
+    app.config.setdefault("DB_POOL_TIMEOUT", 30)                  # s esperando conexión
+    app.config.setdefault("DB_POOL_RECYCLE", 1800)                # s (sólo servidores)
+    app.config.setdefault("DB_SPLIT_READS", False)
+    app.config.setdefault("DB_READ_URI", None)
+
+    if os.environ.get("DATABASE_URL"):
+        app.config["SQLALCHEMY_DATABASE_URI"] = os.environ["DATABASE_URL"]
+    uri = app.config["SQLALCHEMY_DATABASE_URI"] = _normalize(app.config["SQLALCHEMY_DATABASE_URI"])
+
+    options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    for key, value in _pool_options(app, make_url(uri)).items():
+        options.setdefault(key, value)
+
+    db.init_app(app)
+    with app.app_context():
+        engine = db.engine
+        if engine.url.get_backend_name() == "sqlite":
+            event.listen(engine, "connect", _sqlite_pragmas(app))
+        if app.config["DB_SPLIT_READS"]:
+            app.extensions["db_read"] = _read_engine(app, engine)
+        _ENGINES.update(e for e in (engine, app.extensions.get("db_read")) if e)
+
+
+def dispose(app):
+    """Cierra todas las conexiones de `app` en este proceso (p.ej. en el
+    maestro de gunicorn después de precalentar, antes del fork)."""
+    with app.app_context():
+        for engine in app.extensions["sqlalchemy"].engines.values():
+            engine.dispose()
+    if app.extensions.get("db_read") is not None:
+        app.extensions["db_read"].dispose()
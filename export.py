@@ -0,0 +1,134 @@
+# export.py
+# ---------------------------------------------------------
+# Exportación en streaming (CSV / XLSX) de los listados admin
+# ---------------------------------------------------------
+# Las filas salen de la BD con un cursor del lado del servidor
+# (yield_per) y se van escribiendo al cliente por bloques, así
+# que exportar 500k inscripciones usa memoria constante y el
+# primer byte sale de inmediato. El XLSX se arma con zipfile
+# sobre un flujo no "seekable" (sin openpyxl ni archivo temporal).
+import io, re, csv, zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from models import db
+
+CHUNK_ROWS = 1000
+# Excel interpreta como fórmula lo que empieza con estos caracteres
+_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+_XML_BAD = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def iter_rows(stmt):
+    """Itera filas con cursor del servidor, de CHUNK_ROWS en CHUNK_ROWS."""
+    result = db.session.execute(stmt.execution_options(yield_per=CHUNK_ROWS))
+    for row in result:
+        yield row
+
+
+def _cell(value, guard=False):
+    """Valor listo para escribir; `guard` neutraliza fórmulas (sólo CSV:
+    en XLSX las celdas inlineStr ya son texto literal)."""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if guard and isinstance(value, str) and value.startswith(_FORMULA):
+        return "'" + value
+    return value
+
+
+# ─── CSV ───────────────────────────────────────────────
+def stream_csv(headers, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")                      # BOM: Excel abre bien los acentos
+    writer.writerow(headers)
+    for n, row in enumerate(rows, 1):
+        writer.writerow([_cell(v, guard=True) for v in row])
+        if n % CHUNK_ROWS == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0); buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+
+# ─── XLSX ──────────────────────────────────────────────
+class ZipPipe(io.RawIOBase):
+    """Destino de zipfile que acumula bytes hasta que el generador los saca."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>')
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>')
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>')
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>')
+
+
+def _xml_row(values):
+    cells = []
+    for v in values:
+        v = _cell(v)
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            cells.append(f"<c><v>{v}</v></c>")
+        else:
+            text = escape(_XML_BAD.sub("", str(v)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return "<row>" + "".join(cells) + "</row>"
+
+
+def stream_xlsx(headers, rows, sheet="Datos"):
+    pipe = ZipPipe()
+    with zipfile.ZipFile(pipe, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK.format(name=escape(sheet)))
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as fh:
+            fh.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                     b'<worksheet xmlns="http://schemas.openxmlformats.org/'
+                     b'spreadsheetml/2006/main"><sheetData>')
+            fh.write(_xml_row(headers).encode("utf-8"))
+            for n, row in enumerate(rows, 1):
+                fh.write(_xml_row(row).encode("utf-8"))
+                if n % CHUNK_ROWS == 0:
+                    yield pipe.drain()
+            fh.write(b"</sheetData></worksheet>")
+    yield pipe.drain()
+
+
+FORMATS = {
+    "csv":  (stream_csv,  "text/csv; charset=utf-8"),
+    "xlsx": (stream_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
@@ -10,6 +10,11 @@ from wtforms.validators import (
     Email, EqualTo
 )
 
+from models import normalize_email
+
+# todos los campos de correo guardan / buscan la forma normalizada
+EMAIL_FILTERS = [normalize_email]
+
 # ───────────────────────────
 # 1) Portada  (admin)
 # ───────────────────────────
@@ -39,7 +44,7 @@ class InscripcionForm(FlaskForm):
         ],
         validators=[DataRequired()]
     )
-    email  = StringField('Correo electrónico',
+    email  = StringField('Correo electrónico', filters=EMAIL_FILTERS,
                          validators=[DataRequired(), Email(), Length(min=6)])
     telefono_contacto = StringField(
         'Número de contacto (celular / WhatsApp)',
@@ -72,24 +77,27 @@ class GaleriaForm(FlaskForm):
     submit  = SubmitField('Subir')
 
 class TestiForm(FlaskForm):
-    frase  = TextAreaField('Frase', validators=[DataRequired()])
-    nombre = StringField('Nombre', validators=[DataRequired()])
+    frase  = TextAreaField('Frase', validators=[DataRequired(), Length(10, 500)])
+    nombre = StringField('Nombre', validators=[DataRequired(), Length(max=60)])
     anio   = IntegerField('Año',
                           validators=[DataRequired(), NumberRange(2020, 2100)])
+    sitio  = StringField('Sitio web')       # trampa para bots: oculto, debe llegar vacío
     submit = SubmitField('Guardar')
 
 # ───────────────────────────
 # 4) Autenticación
 # ───────────────────────────
 class LoginForm(FlaskForm):
-    email    = StringField('Correo',    validators=[DataRequired(), Email()])
+    email    = StringField('Correo',    filters=EMAIL_FILTERS,
+                           validators=[DataRequired(), Email()])
     password = PasswordField('Contraseña', validators=[DataRequired()])
     submit   = SubmitField('Ingresar')
 
 # ---- FORMULARIOS NUEVOS --------------------------------------
 class PublicRegisterForm(FlaskForm):
     """Registro público (solo rol 'student')."""
-    email    = StringField('Correo',    validators=[DataRequired(), Email()])
+    email    = StringField('Correo',    filters=EMAIL_FILTERS,
+                           validators=[DataRequired(), Email()])
     password = PasswordField('Contraseña', validators=[
         DataRequired(),
         EqualTo('confirm', message='Las contraseñas deben coincidir.')
@@ -107,7 +115,8 @@ class AdminUserForm(PublicRegisterForm):
 
 class RegisterForm(FlaskForm):
     """(Antiguo) Registro con elección de rol – lo mantiene el admin."""
-    email    = StringField('Correo',    validators=[DataRequired(), Email()])
+    email    = StringField('Correo',    filters=EMAIL_FILTERS,
+                           validators=[DataRequired(), Email()])
     password = PasswordField('Contraseña', validators=[
         DataRequired(),
         EqualTo('confirm', message='Las contraseñas deben coincidir.')
@@ -123,7 +132,8 @@ class RegisterForm(FlaskForm):
 # 5) Reset de contraseña
 # ───────────────────────────
 class ResetRequestForm(FlaskForm):
-    email  = StringField('Correo', validators=[DataRequired(), Email()])
+    email  = StringField('Correo', filters=EMAIL_FILTERS,
+                         validators=[DataRequired(), Email()])
     submit = SubmitField('Enviar enlace')
 
 class ResetPasswordForm(FlaskForm):
@@ -142,3 +152,14 @@ class RestoreForm(FlaskForm):
                         validators=[FileRequired(),
                                     FileAllowed(['zip'], 'Sólo archivos .zip')])
     submit  = SubmitField('Restaurar')
+
+# ───────────────────────────
+# 7) Importar inscripciones
+# ───────────────────────────
+class ImportForm(FlaskForm):
+    archivo = FileField('Archivo CSV o JSON',
+                        validators=[FileRequired(),
+                                    FileAllowed(['csv', 'json', 'ndjson', 'jsonl'],
+                                                'Sólo .csv, .json o .ndjson')])
+    dry_run = BooleanField('Sólo validar (no guardar nada)')
+    submit  = SubmitField('Importar')
@@ -0,0 +1,34 @@
+# gunicorn.conf.py
+# ---------------------------------------------------------
+# Servidor de producción (Render, VPS…):
+#   gunicorn -c gunicorn.conf.py
+# ---------------------------------------------------------
+# Variables de entorno:
+#   PORT               puerto (Render lo define solo)      8000
+#   WEB_CONCURRENCY    procesos worker                     2
+#   GUNICORN_THREADS   hilos por worker                    4
+#   GUNICORN_MAX_REQUESTS  reciclar cada worker tras N     1000 (0 = nunca)
+#
+# Los pools de la BD, de hash, de trabajos y de correo son POR
+# PROCESO y se crean solos en cada worker (ver database.py, jobs.py…).
+import os
+
+wsgi_app = "wsgi:app"
+bind     = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+workers      = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = "gthread"
+threads      = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# la app se importa y precalienta una vez en el maestro (wsgi.py)
+preload_app = True
+
+# reciclar workers acota fugas de memoria; con preload un worker
+# nuevo es un fork ya caliente, no un arranque en frío
+max_requests        = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+
+timeout          = 60        # s sin responder antes de reiniciar el worker
+graceful_timeout = 30        # s para terminar lo que está en curso
+keepalive        = 5
+
@@ -0,0 +1,158 @@
+# identity.py
+# ---------------------------------------------------------
+# current_user sin consulta: caché de "principales" por id
+# ---------------------------------------------------------
+# Flask-Login llama a user_loader en cada request autenticado. En
+# vez de cargar la fila User completa (hash, reseña…) se guarda un
+# Principal mínimo (id, email, role) en un LRU con TTL.
+#
+# Cualquier commit que modifique o borre un User (contraseña, rol,
+# perfil) lo saca de la caché y toca instance/users.version; los
+# demás workers de gunicorn lo notan con un stat() y vacían la suya.
+import os, time, threading
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, User
+
+
+class Principal:
+    """Identidad ligera para current_user (interfaz de Flask-Login)."""
+    __slots__ = ("id", "email", "role")
+
+    is_authenticated = True
+    is_active        = True
+    is_anonymous     = False
+
+    def __init__(self, id, email, role):
+        self.id, self.email, self.role = id, email, role
+
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, (Principal, User)) and self.get_id() == other.get_id()
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"<Principal {self.email} ({self.role})>"
+
+
+# el código 2FA cambia en cada login de admin y no afecta a la identidad
+WATCHED = ("email", "password", "role", "resena")
+
+def _identity_changed(user):
+    attrs = inspect(user).attrs
+    return any(attrs[name].history.has_changes() for name in WATCHED)
+
+
+class UserCache:
+    """LRU + TTL de Principal por id, invalidado por commits sobre User."""
+
+    def __init__(self, app=None):
+        self.app     = None
+        self._lock   = threading.Lock()
+        self._items  = OrderedDict()       # id -> (expira, Principal)
+        self._stamp  = None
+        self._seen   = None                # mtime del stamp ya aplicado
+        if app is not None:
+            self.init_app(app)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app):
+        app.config.setdefault("USER_CACHE_SIZE", 1024)
+        app.config.setdefault("USER_CACHE_TTL", 300)       # s
+        self.app = app
+        os.makedirs(app.instance_path, exist_ok=True)
+        self._stamp = os.path.join(app.instance_path, "users.version")
+        if not os.path.exists(self._stamp):
+            self._touch()
+        self._seen = self._mtime()
+
+        event.listen(Session, "after_flush", self._after_flush)
+        event.listen(Session, "do_orm_execute", self._on_execute)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_soft_rollback", self._after_rollback)
+        app.extensions["user_cache"] = self
+
+    def _touch(self):
+        with open(self._stamp, "w") as fh:
+            fh.write(str(time.time()))
+
+    def _mtime(self):
+        try:
+            return os.stat(self._stamp).st_mtime_ns
+        except OSError:
+            return None
+
+    # ─── API ───────────────────────────────────────────
+    def get(self, user_id):
+        """Principal del usuario o None si no existe."""
+        mtime = self._mtime()
+        if mtime != self._seen:                # otro worker cambió usuarios
+            with self._lock:
+                self._items.clear()
+                self._seen = mtime
+
+        now = time.monotonic()
+        hit = self._items.get(user_id)
+        if hit and hit[0] > now:
+            with self._lock:
+                self._items.move_to_end(user_id, last=True)
+            return hit[1]
+
+        row = db.session.execute(db.select(User.id, User.email, User.role)
+                                 .where(User.id == user_id)).first()
+        if row is None:
+            return None
+        principal = Principal(*row)
+        with self._lock:
+            self._items[user_id] = (now + self.app.config["USER_CACHE_TTL"], principal)
+            self._items.move_to_end(user_id, last=True)
+            while len(self._items) > self.app.config["USER_CACHE_SIZE"]:
+                self._items.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id=None):
+        """Olvida un usuario (o todos) aquí y en los demás workers."""
+        self._forget({user_id})
+
+    def _forget(self, ids):
+        with self._lock:
+            for uid in ids:
+                if uid is None:
+                    self._items.clear()
+                else:
+                    self._items.pop(uid, None)
+        self._touch()
+        self._seen = self._mtime()
+
+    # ─── eventos de SQLAlchemy ─────────────────────────
+    def _after_flush(self, sess, flush_context):
+        ids = {o.id for o in sess.deleted if isinstance(o, User)}
+        ids.update(o.id for o in sess.dirty
+                   if isinstance(o, User) and _identity_changed(o))
+        if ids:
+            sess.info.setdefault("users_dirty", set()).update(ids)
+
+    def _on_execute(self, state):
+        # db.update(User) / delete masivos no pasan por el flush
+        if (state.is_update or state.is_delete) and state.bind_mapper is not None:
+            if issubclass(state.bind_mapper.class_, User):
+                state.session.info.setdefault("users_dirty", set()).add(None)
+
+    def _after_commit(self, sess):
+        ids = sess.info.pop("users_dirty", None)
+        if ids:
+            self._forget(ids)
+
+    def _after_rollback(self, sess, previous_transaction):
+        if previous_transaction.parent is None:
+            sess.info.pop("users_dirty", None)
+
+
+user_cache = UserCache()
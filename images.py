@@ -0,0 +1,139 @@
+# images.py
+# ---------------------------------------------------------
+# Derivados responsivos de las imágenes subidas (galería,
+# programas y portada): varios anchos en WebP + JPEG, sin
+# metadatos, para que las plantillas emitan srcset/sizes.
+# ---------------------------------------------------------
+import os, json, threading
+
+from PIL import Image, ImageOps
+from flask import current_app, url_for
+
+DERIV_DIR     = "img/derivados"            # relativo a static/
+MANIFEST_NAME = "manifest.json"            # {ruta_original: [ancho, alto]}
+DEFAULT_WIDTHS = (320, 640, 960, 1280)
+
+_lock     = threading.Lock()
+_manifest = {"mtime": None, "data": {}}
+
+
+# ─── rutas ──────────────────────────────────────────────
+def _static(*parts):
+    return os.path.join(current_app.static_folder, *parts)
+
+def derivative_name(path, width, ext):
+    """'img/galeria3.jpg', 640, 'webp' → 'img/derivados/galeria3-640.webp'"""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return f"{DERIV_DIR}/{stem}-{width}.{ext}"
+
+def variant_widths(ancho):
+    """Anchos generados para un original de `ancho` px (nunca se amplía)."""
+    tope = min(ancho, current_app.config["IMAGE_WIDTHS"][-1])
+    return [w for w in current_app.config["IMAGE_WIDTHS"] if w < tope] + [tope]
+
+
+# ─── procesamiento ─────────────────────────────────────
+def process_image(path):
+    """Genera los derivados de static/<path> y devuelve (ancho, alto).
+
+    Se corrige la orientación EXIF y se guardan sin metadatos
+    (ni EXIF ni GPS) en WebP y JPEG progresivo."""
+    cfg = current_app.config
+    os.makedirs(_static(DERIV_DIR), exist_ok=True)
+
+    with Image.open(_static(path)) as im:
+        ancho, alto = im.size
+        # JPEG grandes: decodificar ya reducido acelera mucho el proceso
+        im.draft("RGB", (cfg["IMAGE_WIDTHS"][-1], cfg["IMAGE_WIDTHS"][-1]))
+        im = ImageOps.exif_transpose(im)
+        if (im.width > im.height) != (ancho > alto):      # rotada por EXIF
+            ancho, alto = alto, ancho
+        if "A" in im.getbands() or im.mode == "P":    # PNG con transparencia
+            rgba = im.convert("RGBA")
+            im = Image.new("RGB", rgba.size, "white")
+            im.paste(rgba, mask=rgba.getchannel("A"))
+        elif im.mode != "RGB":
+            im = im.convert("RGB")
+
+        # del más grande al más chico, reutilizando el anterior
+        src = im
+        for w in sorted(variant_widths(ancho), reverse=True):
+            h = max(1, round(alto * w / ancho))
+            src = src.resize((w, h), Image.LANCZOS, reducing_gap=3.0) \
+                if src.size != (w, h) else src
+            src.save(_static(derivative_name(path, w, "webp")), "WEBP",
+                     quality=cfg["IMAGE_QUALITY"], method=4)
+            src.save(_static(derivative_name(path, w, "jpg")), "JPEG",
+                     quality=cfg["IMAGE_QUALITY"], optimize=True, progressive=True)
+
+    _update_manifest(path, ancho, alto)
+    return ancho, alto
+
+
+def remove_derivatives(path, ancho=None):
+    """Borra los derivados de `path` (p.ej. al reemplazar la imagen).
+    Sin `ancho` se toma el del manifiesto."""
+    ancho = ancho or _load_manifest().get(path, (None,))[0]
+    widths = variant_widths(ancho) if ancho else current_app.config["IMAGE_WIDTHS"]
+    for w in widths:
+        for ext in ("webp", "jpg"):
+            try:
+                os.remove(_static(derivative_name(path, w, ext)))
+            except FileNotFoundError:
+                pass
+
+
+# ─── manifiesto (para imágenes sin fila en BD) ─────────
+def _manifest_path():
+    return _static(DERIV_DIR, MANIFEST_NAME)
+
+def _load_manifest():
+    try:
+        mtime = os.stat(_manifest_path()).st_mtime_ns
+    except OSError:
+        return {}
+    if mtime != _manifest["mtime"]:
+        with open(_manifest_path(), encoding="utf-8") as fh:
+            _manifest.update(mtime=mtime, data=json.load(fh))
+    return _manifest["data"]
+
+def _update_manifest(path, ancho, alto):
+    with _lock:
+        data = dict(_load_manifest())
+        data[path] = [ancho, alto]
+        tmp = _manifest_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(data, fh, indent=1, sort_keys=True)
+        os.replace(tmp, _manifest_path())
+
+
+# ─── helper de plantillas ──────────────────────────────
+def variantes(path, ancho=None, alto=None):
+    """Datos para <picture>: srcset WebP/JPEG, fallback y dimensiones.
+
+    Si la imagen aún no tiene derivados devuelve `widths` vacío y la
+    plantilla usa el original tal cual."""
+    if not ancho:
+        ancho, alto = _load_manifest().get(path, (None, None))
+    if not ancho:
+        return {"widths": [], "src": url_for("static", filename=path),
+                "width": None, "height": None}
+
+    widths = variant_widths(ancho)
+    def srcset(ext):
+        return ", ".join(f"{url_for('static', filename=derivative_name(path, w, ext))} {w}w"
+                         for w in widths)
+    return {
+        "widths": widths,
+        "webp":   srcset("webp"),
+        "jpg":    srcset("jpg"),
+        "src":    url_for("static", filename=derivative_name(path, widths[-1], "jpg")),
+        "width":  ancho,
+        "height": alto,
+    }
+
+
+def init_app(app):
+    app.config.setdefault("IMAGE_WIDTHS", DEFAULT_WIDTHS)
+    app.config.setdefault("IMAGE_QUALITY", 80)
+    app.jinja_env.globals["variantes"] = variantes
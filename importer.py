@@ -0,0 +1,241 @@
+# importer.py
+# ---------------------------------------------------------
+# Importación masiva de inscripciones (CSV / JSON) en lotes
+# ---------------------------------------------------------
+# Las filas se leen del archivo en streaming (nunca el archivo
+# entero en memoria), se validan con las mismas reglas que
+# InscripcionForm y se insertan de IMPORT_BATCH_SIZE en
+# IMPORT_BATCH_SIZE con un solo executemany + commit por lote.
+#
+# Duplicados: un correo que ya tiene inscripción (consulta por el
+# índice de Inscripcion.email, un IN por lote) o que se repite en
+# el mismo archivo se omite y se reporta. Se comparan en minúsculas
+# (models.normalize_email, igual que lo guardado). Cuentan también
+# las inscripciones archivadas (archive.py), que ya no están en la tabla.
+#
+# CSV: separado por comas o punto y coma (Excel en español), UTF-8
+# o Windows-1252; encabezados como los del export (Nombre, Curso,
+# Email, Teléfono, Fecha opcional) o sus variantes (correo,
+# celular…). JSON: un arreglo de objetos o un objeto por línea
+# (NDJSON), con las mismas claves.
+#
+# No se envía el correo de confirmación del formulario público.
+import io, re, csv, json, time, codecs, itertools
+from datetime import datetime
+
+from wtforms import Form
+
+from forms import InscripcionForm
+from models import db, Inscripcion, normalize_email
+from archive import archive
+
+CHUNK = 64 * 1024
+MAX_JSON_OBJECT = 1024 * 1024                 # un objeto no debería pasar de esto
+
+# encabezado (sin mayúsculas) → campo de Inscripcion
+ALIASES = {
+    "nombre": "nombre", "nombre completo": "nombre", "alumno": "nombre",
+    "curso": "curso", "programa": "curso", "programa de interés": "curso",
+    "email": "email", "correo": "email", "correo electrónico": "email", "e-mail": "email",
+    "teléfono": "telefono_contacto", "telefono": "telefono_contacto",
+    "telefono_contacto": "telefono_contacto", "celular": "telefono_contacto",
+    "whatsapp": "telefono_contacto",
+    "fecha": "fecha",
+}
+_PHONE_SEP = re.compile(r"[\s\-().]")
+
+
+class ImportFileError(Exception):
+    """El archivo no se puede leer (formato o codificación)."""
+
+
+class RowForm(Form):
+    """Los campos (y validadores) de InscripcionForm, sin CSRF ni request."""
+    nombre            = InscripcionForm.nombre
+    curso             = InscripcionForm.curso
+    email             = InscripcionForm.email
+    telefono_contacto = InscripcionForm.telefono_contacto
+
+
+class Report:
+    """Resultado de una importación; `errores` se trunca a max_errors."""
+
+    def __init__(self, max_errors):
+        self.total = self.insertadas = self.duplicadas = self.invalidas = 0
+        self.errores, self.max_errors = [], max_errors
+        self.segundos = 0.0
+        self.fatal = None                     # el archivo dejó de poder leerse
+
+    def error(self, fila, motivo):
+        if len(self.errores) < self.max_errors:
+            self.errores.append({"fila": fila, "errores": motivo})
+
+    def to_dict(self):
+        return {"total": self.total, "insertadas": self.insertadas,
+                "duplicadas": self.duplicadas, "invalidas": self.invalidas,
+                "segundos": round(self.segundos, 2), "fatal": self.fatal,
+                "errores": self.errores,
+                "errores_omitidos": self.duplicadas + self.invalidas - len(self.errores)}
+
+
+# ─── lectura en streaming ──────────────────────────────
+def sniff_encoding(binary):
+    """'utf-8-sig' o 'cp1252' según el inicio del archivo (sólo si es seekable)."""
+    if not binary.seekable():
+        return "utf-8-sig"
+    head = binary.read(CHUNK)
+    binary.seek(0)
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1252"                       # "CSV" de Excel en Windows
+
+
+def csv_rows(binary, encoding="utf-8-sig"):
+    """(nº de línea, dict) por fila del CSV."""
+    text = io.TextIOWrapper(binary, encoding=encoding, newline="")
+    try:
+        first = text.readline()
+        delimiter = ";" if first.count(";") > first.count(",") else ","
+        reader = csv.DictReader(itertools.chain([first], text), delimiter=delimiter)
+        for row in reader:
+            yield reader.line_num, row
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise ImportFileError(f"No se pudo leer el CSV: {exc}")
+
+
+def json_rows(binary, encoding="utf-8-sig"):
+    """(nº de objeto, dict) de un arreglo JSON o de NDJSON, sin cargarlo entero."""
+    text = io.TextIOWrapper(binary, encoding=encoding)
+    try:
+        yield from _json_objects(text)
+    except UnicodeDecodeError as exc:
+        raise ImportFileError(f"No se pudo leer el JSON: {exc}")
+
+
+def _json_objects(text):
+    decoder = json.JSONDecoder()
+    buf, pos, n = "", 0, 0
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,[]":
+            pos += 1
+        if pos >= len(buf):
+            buf, pos = text.read(CHUNK), 0
+            if not buf:
+                return
+            continue
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            more = text.read(CHUNK)            # objeto cortado entre dos bloques
+            if not more or len(buf) - pos > MAX_JSON_OBJECT:
+                raise ImportFileError(f"JSON inválido cerca del objeto {n + 1}.")
+            buf, pos = buf[pos:] + more, 0
+            continue
+        n += 1
+        yield n, obj
+        pos = end
+
+
+def rows_for(binary, fmt):
+    """Lector según el formato: 'csv' o 'json' (arreglo o NDJSON)."""
+    reader = {"csv": csv_rows, "json": json_rows}[fmt]
+    return reader(binary, sniff_encoding(binary))
+
+
+# ─── validación + inserción ────────────────────────────
+def _normalize(raw):
+    rec = {}
+    for key, value in raw.items():
+        field = ALIASES.get(str(key).strip().lower()) if key is not None else None
+        if field and value is not None:
+            rec[field] = str(value).strip()
+    if "telefono_contacto" in rec:
+        rec["telefono_contacto"] = _PHONE_SEP.sub("", rec["telefono_contacto"])
+    return rec
+
+
+def run(rows, cursos, batch_size=1000, dry_run=False, max_errors=1000):
+    """Valida e inserta `rows` ((fila, dict)…). `cursos` son los valores
+    permitidos para curso (los mismos que ofrece el formulario)."""
+    report = Report(max_errors)
+    t0 = time.perf_counter()
+    form = RowForm()
+    form.curso.choices = [(c, c) for c in cursos]
+    canon = {c.lower(): c for c in cursos}    # "diplomado en tic" → nombre exacto
+    seen, batch = set(), []
+
+    try:
+        for fila, raw in rows:
+            report.total += 1
+            if not isinstance(raw, dict):
+                report.invalidas += 1
+                report.error(fila, {"fila": ["Se esperaba un objeto con nombre, curso, email…"]})
+                continue
+            rec = _normalize(raw)
+            rec["curso"] = canon.get(rec.get("curso", "").lower(), rec.get("curso"))
+            form.process(data=rec)
+            errors = dict(form.errors) if not form.validate() else {}
+            fecha = None
+            if rec.get("fecha"):
+                try:
+                    fecha = datetime.fromisoformat(rec["fecha"])
+                except ValueError:
+                    errors["fecha"] = ["Fecha inválida (AAAA-MM-DD [HH:MM])."]
+            if errors:
+                report.invalidas += 1
+                report.error(fila, errors)
+                continue
+
+            email = normalize_email(form.email.data)
+            if email in seen:
+                report.duplicadas += 1
+                report.error(fila, {"email": ["Repetido en el archivo."]})
+                continue
+            seen.add(email)
+            row = {"nombre": form.nombre.data, "curso": form.curso.data, "email": email,
+                   "telefono_contacto": form.telefono_contacto.data}
+            if fecha:
+                row["fecha"] = fecha
+            batch.append((fila, row))
+            if len(batch) >= batch_size:
+                _flush(batch, report, dry_run)
+                batch = []
+    except ImportFileError as exc:
+        report.fatal = str(exc)           # lo ya validado se guarda igual
+
+    _flush(batch, report, dry_run)
+    report.segundos = time.perf_counter() - t0
+    return report
+
+
+def _flush(batch, report, dry_run):
+    if not batch:
+        return
+    emails = [row["email"] for _, row in batch]
+    existing = set(db.session.scalars(
+        db.select(Inscripcion.email).where(Inscripcion.email.in_(emails))))
+    archivados = archive.emails().intersection(emails)
+    nuevas = []
+    for fila, row in batch:
+        if row["email"] in existing:
+            report.duplicadas += 1
+            report.error(fila, {"email": ["Ya tiene una inscripción."]})
+        elif row["email"] in archivados:
+            report.duplicadas += 1
+            report.error(fila, {"email": ["Ya tiene una inscripción (archivada)."]})
+        else:
+            nuevas.append(row)
+    if nuevas and not dry_run:
+        # ORM bulk insert: un executemany por lote, sin objetos en la sesión
+        db.session.execute(db.insert(Inscripcion), nuevas)
+        db.session.commit()
+    report.insertadas += len(nuevas)
+
+
+def init_app(app):
+    app.config.setdefault("IMPORT_BATCH_SIZE", 1000)
+    app.config.setdefault("IMPORT_MAX_BYTES", 50 * 1024 * 1024)
+    app.config.setdefault("IMPORT_MAX_ERRORS", 1000)       # filas detalladas en el reporte
+    app.config.setdefault("IMPORT_TOKEN", None)            # `Authorization: Bearer …` para la API
@@ -0,0 +1,204 @@
+# jobs.py
+# ---------------------------------------------------------
+# Trabajos en segundo plano (procesar imágenes, etc.)
+# ---------------------------------------------------------
+# Cada trabajo es una fila de la tabla Job; un pool de hilos
+# acotado los ejecuta fuera del request. Como el estado vive en
+# SQLite, varios workers de gunicorn pueden compartir la cola:
+# un trabajo sólo lo "reclama" quien logra el UPDATE condicional.
+#
+# Un hilo barrendero recoge lo pendiente (reintentos con backoff,
+# trabajos que no cupieron en el pool, huérfanos de un worker caído).
+import os, json, atexit, threading, traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from models import db, Job
+
+
+class JobQueue:
+
+    def __init__(self, app=None):
+        self.app       = None
+        self._handlers = {}
+        self._pid      = None
+        self._pool     = None
+        self._slots    = None
+        self._stop     = threading.Event()
+        self._lock     = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app):
+        app.config.setdefault("JOBS_WORKERS", 2)
+        app.config.setdefault("JOBS_MAX_ATTEMPTS", 3)
+        app.config.setdefault("JOBS_POLL_INTERVAL", 5)      # s
+        app.config.setdefault("JOBS_STALE_AFTER", 300)      # s en 'running'
+        self.app = app
+        app.extensions["jobs"] = self
+        atexit.register(self.shutdown)
+
+    def handler(self, kind):
+        """Decorador: registra la función que ejecuta los trabajos `kind`."""
+        def deco(fn):
+            self._handlers[kind] = fn
+            return fn
+        return deco
+
+    # ─── arranque perezoso (sobrevive a fork) ──────────
+    def start(self):
+        """Crea pool y barrendero en este proceso (idempotente, barato)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            n = self.app.config["JOBS_WORKERS"]
+            self._pool  = ThreadPoolExecutor(max_workers=n, thread_name_prefix="job")
+            self._slots = threading.BoundedSemaphore(n)
+            self._stop.clear()
+            threading.Thread(target=self._sweeper, name="job-sweeper",
+                             daemon=True).start()
+            self._pid = os.getpid()
+
+    # ─── API ───────────────────────────────────────────
+    def enqueue(self, kind, **payload):
+        """Guarda el trabajo y lo lanza si hay un hilo libre. Hace commit."""
+        if kind not in self._handlers:
+            raise ValueError(f"Trabajo desconocido: {kind}")
+        job = Job(kind=kind, payload=json.dumps(payload),
+                  max_attempts=self.app.config["JOBS_MAX_ATTEMPTS"])
+        db.session.add(job); db.session.commit()
+        self.start()
+        self._submit(job.id)
+        return job
+
+    def counts(self):
+        """{status: n} – profundidad de la cola para el panel."""
+        rows = (db.session.query(Job.status, db.func.count(Job.id))
+                .group_by(Job.status).all())
+        return dict(rows)
+
+    def retry(self, job_id):
+        job = db.session.get(Job, job_id)
+        if job and job.status == "failed":
+            job.status, job.attempts, job.error = "pending", 0, None
+            job.run_after = datetime.utcnow()
+            db.session.commit()
+            self.start()
+            self._submit(job.id)
+        return job
+
+    def run_pending(self):
+        """Ejecuta en este hilo todo lo pendiente (CLI / sin servidor)."""
+        done = 0
+        while True:
+            ids = self._due_ids(limit=50)
+            if not ids:
+                return done
+            for job_id in ids:
+                self._run(job_id)
+                done += 1
+
+    def shutdown(self, wait=True):
+        """Drena el pool: deja terminar lo que está corriendo. Lo que no
+        empezó sigue 'pending' en la BD y lo toma el próximo proceso."""
+        self._stop.set()
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pid = None
+
+    # ─── ejecución ─────────────────────────────────────
+    def _submit(self, job_id):
+        # pool acotado: si no hay hilo libre se queda en la BD
+        if self._stop.is_set() or not self._slots.acquire(blocking=False):
+            return False
+        try:
+            self._pool.submit(self._run_slot, job_id)
+        except RuntimeError:                 # pool ya cerrado
+            self._slots.release()
+            return False
+        return True
+
+    def _run_slot(self, job_id):
+        try:
+            with self.app.app_context():
+                self._run(job_id)
+        finally:
+            self._slots.release()
+
+    def _claim(self, job_id):
+        now = datetime.utcnow()
+        res = db.session.execute(
+            db.update(Job)
+            .where(Job.id == job_id, Job.status == "pending", Job.run_after <= now)
+            .values(status="running", attempts=Job.attempts + 1, updated=now))
+        db.session.commit()
+        return res.rowcount == 1
+
+    def _run(self, job_id):
+        if not self._claim(job_id):
+            return
+        job = db.session.get(Job, job_id)
+        try:
+            self._handlers[job.kind](**json.loads(job.payload))
+        except Exception:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.error = traceback.format_exc(limit=5)[-2000:]
+            if job.attempts >= job.max_attempts:
+                job.status = "failed"
+            else:                           # backoff exponencial: 10 s, 20 s, 40 s…
+                job.status = "pending"
+                job.run_after = datetime.utcnow() + timedelta(
+                    seconds=10 * 2 ** (job.attempts - 1))
+            self.app.logger.warning("Job %s (%s) falló: intento %s/%s",
+                                    job.id, job.kind, job.attempts, job.max_attempts)
+        else:
+            job.status, job.error = "done", None
+        job.updated = datetime.utcnow()
+        db.session.commit()
+
+    # ─── barrendero ────────────────────────────────────
+    def _due_ids(self, limit):
+        return db.session.scalars(
+            db.select(Job.id)
+            .where(Job.status == "pending", Job.run_after <= datetime.utcnow())
+            .order_by(Job.id).limit(limit)).all()
+
+    def _sweep(self):
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=self.app.config["JOBS_STALE_AFTER"])
+        # huérfanos: el worker murió en pleno trabajo (OOM, segfault) y _run
+        # no llegó a contar el fallo; mismos límites y backoff que allí
+        huerfanos = db.session.execute(
+            db.select(Job.id, Job.kind, Job.attempts, Job.max_attempts)
+            .where(Job.status == "running", Job.updated < stale)).all()
+        for job_id, kind, attempts, max_attempts in huerfanos:
+            if attempts >= max_attempts:
+                values = dict(status="failed", error="El worker murió mientras lo ejecutaba.")
+            else:
+                values = dict(status="pending", run_after=now + timedelta(
+                    seconds=10 * 2 ** max(attempts - 1, 0)))
+            db.session.execute(
+                db.update(Job).where(Job.id == job_id, Job.status == "running",
+                                     Job.updated < stale)
+                .values(updated=now, **values))
+            self.app.logger.warning("Job %s (%s) huérfano: intento %s/%s",
+                                    job_id, kind, attempts, max_attempts)
+        db.session.commit()
+        for job_id in self._due_ids(limit=self.app.config["JOBS_WORKERS"]):
+            if not self._submit(job_id):
+                break
+
+    def _sweeper(self):
+        while not self._stop.wait(self.app.config["JOBS_POLL_INTERVAL"]):
+            try:
+                with self.app.app_context():
+                    self._sweep()
+            except Exception:
+                self.app.logger.exception("job-sweeper")
+
+
+jobs = JobQueue()
@@ -0,0 +1,197 @@
+# listings.py
+# ---------------------------------------------------------
+# Listados del panel admin (y la galería pública): filtros y
+# paginación por cursor (keyset) resueltos en SQL, pensados
+# para 100k+ filas.
+# ---------------------------------------------------------
+# En vez de OFFSET (que recorre todas las filas anteriores) cada
+# página pide "las N siguientes a (valor, id)" usando el índice
+# de la columna de orden. El cursor viaja en la URL como token opaco.
+#
+# Las inscripciones archivadas (archive.py) entran al listado y a la
+# exportación sólo si el filtro de fechas llega a un mes archivado:
+# se filtran en memoria y se mezclan con la página de la BD.
+import json, base64
+from datetime import datetime, timedelta
+from itertools import islice
+from operator import attrgetter
+from typing import NamedTuple
+
+from sqlalchemy import select, tuple_
+
+from models import db, Inscripcion, User, Galeria
+from archive import archive
+
+
+class Page(NamedTuple):
+    items: list
+    next_cursor: str | None
+    prev_cursor: str | None
+
+
+# ─── cursores ───────────────────────────────────────────
+def encode_cursor(value, ident):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, ident], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token, col):
+    """Devuelve (valor, id) o None si el token no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value, ident = json.loads(raw)
+        if value is not None and isinstance(col.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        return value, int(ident)
+    except (ValueError, TypeError):
+        return None
+
+
+def keyset(stmt, col, id_col, desc=True, after=None, before=None, per_page=50, cold=None):
+    """Aplica orden + cursor a `stmt` y devuelve una Page.
+
+    `stmt` debe seleccionar `col` e `id_col` (se leen por nombre).
+    `cold(reverse)`, si se pasa, da filas de fuera de la BD ya ordenadas
+    por (col, id) en ese sentido; se mezclan con las de `stmt`."""
+    key = tuple_(col, id_col)
+    backwards = bool(before)
+    cursor = decode_cursor(before or after, col) if (before or after) else None
+
+    if cursor:
+        # hacia adelante en orden desc = valores menores; hacia atrás, al revés
+        forward_lt = desc != backwards
+        # (comparar con una tupla de Python hereda los tipos de las columnas)
+        stmt = stmt.where(key < cursor if forward_lt else key > cursor)
+
+    reverse = desc != backwards
+    stmt = stmt.order_by(col.desc() if reverse else col.asc(),
+                         id_col.desc() if reverse else id_col.asc())
+    rows = db.session.execute(stmt.limit(per_page + 1)).all()
+    if cold is not None:
+        key = lambda row: (getattr(row, col.key), getattr(row, id_col.key))
+        extra = cold(reverse)
+        if cursor:
+            extra = (r for r in extra if (key(r) < cursor if reverse else key(r) > cursor))
+        rows = sorted(rows + list(islice(extra, per_page + 1)),
+                      key=key, reverse=reverse)[:per_page + 1]
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_next, has_prev = bool(cursor), more
+    else:
+        has_next, has_prev = more, bool(cursor)
+
+    def cur(row):
+        return encode_cursor(getattr(row, col.key), getattr(row, id_col.key))
+    return Page(rows,
+                cur(rows[-1]) if rows and has_next else None,
+                cur(rows[0]) if rows and has_prev else None)
+
+
+# ─── filtros comunes ────────────────────────────────────
+def _parse_date(s):
+    try:
+        return datetime.strptime(s, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+def _prefix_range(col, prefix):
+    """email LIKE 'abc%' no usa el índice en SQLite (LIKE ignora
+    mayúsculas); un rango [abc, abd) sí. Los correos se guardan en
+    minúsculas (models.normalize_email), así que basta bajar el prefijo."""
+    prefix = prefix.strip().lower()
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return (col >= prefix) & (col < upper)
+
+def _date_bounds(args):
+    """[desde, hasta) de los filtros; 'hasta' incluye todo ese día."""
+    desde, hasta = _parse_date(args.get("desde")), _parse_date(args.get("hasta"))
+    return desde, hasta + timedelta(days=1) if hasta else None
+
+def _date_range(stmt, col, args):
+    desde, hasta = _date_bounds(args)
+    if desde:
+        stmt = stmt.where(col >= desde)
+    if hasta:
+        stmt = stmt.where(col < hasta)
+    return stmt
+
+
+# ─── listados concretos ────────────────────────────────
+INSCRIPCION_SORTS = {"fecha": Inscripcion.fecha, "email": Inscripcion.email}
+ALUMNO_SORTS      = {"created": User.created, "email": User.email}
+
+
+def inscripciones_stmt(args):
+    """SELECT filtrado de inscripciones (lo reutilizan listado y exportación)."""
+    stmt = select(Inscripcion.id, Inscripcion.nombre, Inscripcion.curso,
+                  Inscripcion.email, Inscripcion.fecha,
+                  Inscripcion.telefono_contacto)
+    if args.get("curso"):
+        stmt = stmt.where(Inscripcion.curso == args["curso"])
+    if args.get("email", "").strip():
+        stmt = stmt.where(_prefix_range(Inscripcion.email, args["email"]))
+    return _date_range(stmt, Inscripcion.fecha, args)
+
+
+def alumnos_stmt(args):
+    stmt = select(User.id, User.email, User.created).where(User.role == "student")
+    if args.get("email", "").strip():
+        stmt = stmt.where(_prefix_range(User.email, args["email"]))
+    return _date_range(stmt, User.created, args)
+
+
+def archivadas(args, orden="fecha", reverse=False):
+    """Inscripciones archivadas con los filtros de inscripciones_stmt,
+    ordenadas por (orden, id). Sólo abre los meses que tocan las fechas."""
+    desde, hasta = _date_bounds(args)
+    curso = args.get("curso")
+    email = args.get("email", "").strip().lower()
+
+    def filas():
+        periodos = archive.periods_between(desde, hasta)
+        for periodo in reversed(periodos) if reverse else periodos:
+            rows = archive.rows(periodo)
+            for r in reversed(rows) if reverse else rows:
+                # (particiones escritas antes de normalizar los correos)
+                if ((not curso or r.curso == curso) and r.email.lower().startswith(email)
+                        and (desde is None or r.fecha >= desde)
+                        and (hasta is None or r.fecha < hasta)):
+                    yield r
+    if orden == "fecha":
+        return filas()                   # los meses ya vienen en orden: se corta al llenar la página
+    return iter(sorted(filas(), key=attrgetter(orden, "id"), reverse=reverse))
+
+def reaches_archive(args):
+    """¿El filtro de fechas llega a algún mes archivado?"""
+    return bool(archive.periods_between(*_date_bounds(args)))
+
+
+def _page(stmt, sorts, default, id_col, args, per_page, cold=None):
+    col = sorts.get(args.get("orden"), sorts[default])
+    return keyset(stmt, col, id_col, desc=args.get("dir", "desc") != "asc",
+                  after=args.get("after"), before=args.get("before"),
+                  per_page=per_page, cold=cold)
+
+def inscripciones_page(args, per_page=50):
+    cold = None
+    if reaches_archive(args):
+        orden = args.get("orden") if args.get("orden") in INSCRIPCION_SORTS else "fecha"
+        cold = lambda reverse: archivadas(args, orden, reverse)
+    return _page(inscripciones_stmt(args), INSCRIPCION_SORTS, "fecha",
+                 Inscripcion.id, args, per_page, cold)
+
+def alumnos_page(args, per_page=50):
+    return _page(alumnos_stmt(args), ALUMNO_SORTS, "created",
+                 User.id, args, per_page)
+
+
+def galeria_page(after=None, per_page=12):
+    """Fotos visibles, de la más reciente a la más antigua, por el
+    índice (visible, timestamp, id): cada página lee sólo sus filas."""
+    stmt = select(Galeria.id, Galeria.filename, Galeria.ancho, Galeria.alto,
+                  Galeria.timestamp).where(Galeria.visible.is_(True))
+    return keyset(stmt, Galeria.timestamp, Galeria.id, after=after, per_page=per_page)
@@ -0,0 +1,228 @@
+# mailqueue.py
+# ---------------------------------------------------------
+# Cola de correo saliente (outbox) para Flask-Mail
+# ---------------------------------------------------------
+# Las vistas sólo insertan una fila Outbox dentro de su propia
+# transacción (la inscripción y su correo se guardan juntos).
+# Un hilo de fondo envía por lotes reutilizando UNA conexión SMTP
+# (mail.connect()), con límite de envíos por minuto y reintentos
+# con backoff. Un candado de archivo garantiza que sólo un proceso
+# de gunicorn envíe a la vez, así el límite es global.
+#
+# Pruebas locales sin Gmail (config.py):
+#     MAIL_SERVER = "localhost"; MAIL_PORT = 1025; MAIL_USE_TLS = False
+#     python -m aiosmtpd -n -l localhost:1025
+import os, time, atexit, smtplib, threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Outbox
+
+try:
+    import fcntl
+except ImportError:                 # Windows: un solo proceso (python app.py)
+    fcntl = None
+
+# errores que afectan sólo a ese mensaje; el resto se trata como
+# fallo de la conexión y reintenta el lote entero
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                  smtplib.SMTPDataError)
+
+
+class MailQueue:
+
+    def __init__(self, app=None, mail=None):
+        self.app   = None
+        self.mail  = None
+        self._pid  = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        if app is not None:
+            self.init_app(app, mail)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app, mail):
+        app.config.setdefault("MAIL_BATCH_SIZE", 20)
+        app.config.setdefault("MAIL_RATE_PER_MINUTE", 30)
+        app.config.setdefault("MAIL_MAX_ATTEMPTS", 5)
+        app.config.setdefault("MAIL_POLL_INTERVAL", 30)     # s, para reintentos
+        app.config.setdefault("MAIL_KEEP_SENT_DAYS", 7)
+        self.app, self.mail = app, mail
+        app.extensions["mailqueue"] = self
+        event.listen(Session, "after_commit", self._after_commit)
+        atexit.register(self.shutdown)
+
+    # ─── API ───────────────────────────────────────────
+    def enqueue(self, to, subject, body, html=None):
+        """Añade el correo a la sesión actual; se envía tras el commit."""
+        to = [to] if isinstance(to, str) else list(to)
+        msg = Outbox(to=", ".join(to), subject=subject, body=body, html=html)
+        db.session.add(msg)
+        db.session.info["outbox_new"] = True
+        return msg
+
+    def depth(self):
+        """Métricas de la cola: {status: n, 'oldest_pending_s': s}."""
+        counts = dict(db.session.query(Outbox.status, db.func.count(Outbox.id))
+                      .group_by(Outbox.status).all())
+        oldest = db.session.scalar(db.select(db.func.min(Outbox.created))
+                                   .where(Outbox.status == "pending"))
+        counts["oldest_pending_s"] = (
+            int((datetime.utcnow() - oldest).total_seconds()) if oldest else 0)
+        return counts
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        """Lanza el hilo emisor en este proceso (idempotente, sobrevive a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, name="mail-outbox",
+                                                daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def shutdown(self, timeout=10):
+        """Drena: el emisor termina el mensaje en curso, devuelve el resto
+        del lote a 'pending' y se detiene."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+            self._pid = None
+
+    # ─── envío ─────────────────────────────────────────
+    def flush(self):
+        """Envía todo lo pendiente por lotes. Devuelve cuántos salieron."""
+        with self._exclusive() as ok:
+            if not ok:
+                return 0
+            # con el candado en mano, cualquier 'sending' es de un proceso muerto
+            db.session.execute(db.update(Outbox).where(Outbox.status == "sending")
+                               .values(status="pending"))
+            db.session.commit()
+
+            sent = 0
+            while not self._stop.is_set():
+                batch = self._claim()
+                if not batch:
+                    break
+                sent += self._send_batch(batch)
+            self._purge()
+            return sent
+
+    def _claim(self):
+        ids = db.session.scalars(
+            db.select(Outbox.id)
+            .where(Outbox.status == "pending", Outbox.run_after <= datetime.utcnow())
+            .order_by(Outbox.id).limit(self.app.config["MAIL_BATCH_SIZE"])).all()
+        if not ids:
+            return []
+        db.session.execute(db.update(Outbox).where(Outbox.id.in_(ids))
+                           .values(status="sending"))
+        db.session.commit()
+        return db.session.scalars(db.select(Outbox).where(Outbox.id.in_(ids))
+                                  .order_by(Outbox.id)).all()
+
+    def _send_batch(self, batch):
+        sent = 0
+        try:
+            with self.mail.connect() as conn:         # un handshake/TLS por lote
+                for msg in batch:
+                    if self._stop.is_set():
+                        break
+                    self._throttle()
+                    try:
+                        conn.send(Message(subject=msg.subject,
+                                          recipients=msg.to.split(", "),
+                                          body=msg.body, html=msg.html))
+                    except MESSAGE_ERRORS as exc:
+                        self._fail(msg, exc)
+                    else:
+                        msg.status, msg.sent_at, msg.error = "sent", datetime.utcnow(), None
+                        sent += 1
+                    db.session.commit()
+        except (smtplib.SMTPException, OSError) as exc:
+            self.app.logger.warning("Outbox: fallo SMTP (%s)", exc)
+            for msg in batch:
+                if msg.status == "sending":
+                    self._fail(msg, exc)
+            db.session.commit()
+            self._stop.wait(5)                         # no martillar al servidor
+        # lo que quedó sin enviar por un shutdown vuelve a la cola
+        for msg in batch:
+            if msg.status == "sending":
+                msg.status = "pending"
+        db.session.commit()
+        return sent
+
+    def _fail(self, msg, exc):
+        msg.attempts += 1
+        msg.error = f"{type(exc).__name__}: {exc}"[:1000]
+        if msg.attempts >= self.app.config["MAIL_MAX_ATTEMPTS"]:
+            msg.status = "failed"
+        else:                           # backoff: 1, 2, 4, 8… minutos
+            msg.status = "pending"
+            msg.run_after = datetime.utcnow() + timedelta(minutes=2 ** (msg.attempts - 1))
+
+    def _throttle(self):
+        interval = 60.0 / self.app.config["MAIL_RATE_PER_MINUTE"]
+        delay = self._next_slot - time.monotonic()
+        if delay > 0:
+            self._stop.wait(delay)
+        self._next_slot = max(self._next_slot, time.monotonic()) + interval
+
+    def _purge(self):
+        limite = datetime.utcnow() - timedelta(days=self.app.config["MAIL_KEEP_SENT_DAYS"])
+        db.session.execute(db.delete(Outbox).where(Outbox.status == "sent",
+                                                   Outbox.sent_at < limite))
+        db.session.commit()
+
+    @contextmanager
+    def _exclusive(self):
+        if fcntl is None:
+            yield True
+            return
+        path = os.path.join(self.app.instance_path, "outbox.lock")
+        with open(path, "a") as fh:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False                  # otro worker está enviando
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    # ─── hilo de fondo ─────────────────────────────────
+    def _after_commit(self, sess):
+        if sess.info.pop("outbox_new", False):
+            self.wake()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.app.config["MAIL_POLL_INTERVAL"])
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception:
+                self.app.logger.exception("mail-outbox")
+
+
+outbox = MailQueue()
@@ -90,9 +90,15 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # el índice FTS5 de search.py (tabla virtual y sus tablas sombra)
+    # no es un modelo: que autogenerate no proponga borrarlo
+    def include_object(obj, name, type_, reflected, compare_to):
+        return not (type_ == "table" and reflected and name.startswith("busqueda"))
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
@@ -0,0 +1,36 @@
+"""image dimensions for responsive derivatives
+
+Revision ID: 5b1f0c2a9d4e
+Revises: 38db02e12fdb
+Create Date: 2026-10-17 10:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1f0c2a9d4e'
+down_revision = '38db02e12fdb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('programa', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ancho', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('alto', sa.Integer(), nullable=True))
+
+    with op.batch_alter_table('galeria', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ancho', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('alto', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('galeria', schema=None) as batch_op:
+        batch_op.drop_column('alto')
+        batch_op.drop_column('ancho')
+
+    with op.batch_alter_table('programa', schema=None) as batch_op:
+        batch_op.drop_column('alto')
+        batch_op.drop_column('ancho')
@@ -0,0 +1,42 @@
+"""indexes for paginated admin listings
+
+Revision ID: 9f2b6c4d8e31
+Revises: 8e4a1b7c5d20
+Create Date: 2026-10-17 14:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f2b6c4d8e31'
+down_revision = '8e4a1b7c5d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # la paginación por cursor no admite NULL en la columna de orden
+    op.execute("UPDATE inscripcion SET fecha = CURRENT_TIMESTAMP WHERE fecha IS NULL")
+    op.execute('UPDATE "user" SET created = CURRENT_TIMESTAMP WHERE created IS NULL')
+
+    with op.batch_alter_table('inscripcion', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_inscripcion_fecha'), ['fecha'], unique=False)
+        batch_op.create_index(batch_op.f('ix_inscripcion_email'), ['email'], unique=False)
+        batch_op.create_index('ix_inscripcion_curso_fecha', ['curso', 'fecha'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_user_created'), ['created'], unique=False)
+        batch_op.create_index('ix_user_role_created', ['role', 'created'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_role_created')
+        batch_op.drop_index(batch_op.f('ix_user_created'))
+
+    with op.batch_alter_table('inscripcion', schema=None) as batch_op:
+        batch_op.drop_index('ix_inscripcion_curso_fecha')
+        batch_op.drop_index(batch_op.f('ix_inscripcion_email'))
+        batch_op.drop_index(batch_op.f('ix_inscripcion_fecha'))
@@ -0,0 +1,42 @@
+"""daily enrollment rollup for the analytics panel
+
+Revision ID: a4d7e2c9b613
+Revises: 9f2b6c4d8e31
+Create Date: 2026-10-17 19:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d7e2c9b613'
+down_revision = '9f2b6c4d8e31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('estadistica_diaria',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('serie', sa.String(length=20), nullable=False),
+    sa.Column('curso', sa.String(length=200), nullable=False),
+    sa.Column('n', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('dia', 'serie', 'curso')
+    )
+    # conteos de lo que ya existe (lo mismo que `flask analytics-rebuild`)
+    op.execute("INSERT INTO estadistica_diaria (dia, serie, curso, n) "
+               "SELECT date(fecha), 'inscripcion', curso, count(*) "
+               "FROM inscripcion GROUP BY date(fecha), curso")
+    op.execute("INSERT INTO estadistica_diaria (dia, serie, curso, n) "
+               "SELECT date(created), 'registro', '', count(*) "
+               "FROM \"user\" WHERE role = 'student' GROUP BY date(created)")
+    op.execute("INSERT INTO estadistica_diaria (dia, serie, curso, n) "
+               "SELECT date(u.created), 'conversion', '', count(*) FROM \"user\" u "
+               "WHERE u.role = 'student' AND EXISTS "
+               "(SELECT 1 FROM inscripcion i WHERE i.email = u.email) "
+               "GROUP BY date(u.created)")
+
+
+def downgrade():
+    op.drop_table('estadistica_diaria')
@@ -0,0 +1,61 @@
+"""FTS5 search index over inscripcion, user and testimonio
+
+Revision ID: c3e8f5a1d472
+Revises: a4d7e2c9b613
+Create Date: 2026-10-17 21:40:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8f5a1d472'
+down_revision = 'a4d7e2c9b613'
+branch_labels = None
+depends_on = None
+
+SHIFT = 2 ** 40                       # rowid = tipo * SHIFT + id
+
+# tabla → (tipo, columnas que disparan reindexar, SELECT de las 4 columnas)
+SOURCES = {
+    "inscripcion": (1, "nombre, email, telefono_contacto, curso",
+                    "{r}.nombre, {r}.email, {r}.telefono_contacto, {r}.curso"),
+    "user":        (2, "email, role, resena",
+                    "'', {r}.email, '', coalesce({r}.role, '') || ' ' || coalesce({r}.resena, '')"),
+    "testimonio":  (3, "nombre, frase",
+                    "{r}.nombre, '', '', {r}.frase"),
+}
+
+
+def upgrade():
+    # sólo SQLite: en PostgreSQL search.py busca con ILIKE
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute("CREATE VIRTUAL TABLE busqueda USING fts5("
+               "nombre, email, telefono, detalle, "
+               "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')")
+    op.execute("INSERT INTO busqueda(busqueda, rank) "
+               "VALUES ('rank', 'bm25(10.0, 5.0, 5.0, 1.0)')")
+    for table, (kind, watched, cols) in SOURCES.items():
+        insert = (f"INSERT INTO busqueda(rowid, nombre, email, telefono, detalle) "
+                  f"VALUES ({kind * SHIFT} + new.id, {cols.format(r='new')});")
+        delete = f"DELETE FROM busqueda WHERE rowid = {kind * SHIFT} + old.id;"
+        op.execute(f"CREATE TRIGGER busqueda_{table}_ai AFTER INSERT ON \"{table}\" "
+                   f"BEGIN {insert} END")
+        op.execute(f"CREATE TRIGGER busqueda_{table}_ad AFTER DELETE ON \"{table}\" "
+                   f"BEGIN {delete} END")
+        op.execute(f"CREATE TRIGGER busqueda_{table}_au AFTER UPDATE OF id, {watched} "
+                   f"ON \"{table}\" BEGIN {delete} {insert} END")
+        # lo que ya existe (lo mismo que `flask search-rebuild`)
+        op.execute(f"INSERT INTO busqueda(rowid, nombre, email, telefono, detalle) "
+                   f"SELECT {kind * SHIFT} + id, {cols.format(r='t')} FROM \"{table}\" t")
+    op.execute("INSERT INTO busqueda(busqueda) VALUES ('optimize')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table in SOURCES:
+        for suffix in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS busqueda_{table}_{suffix}")
+    op.execute("DROP TABLE IF EXISTS busqueda")
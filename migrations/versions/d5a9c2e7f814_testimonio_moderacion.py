@@ -0,0 +1,63 @@
+"""testimonial moderation state
+
+Revision ID: d5a9c2e7f814
+Revises: c3e8f5a1d472
+Create Date: 2026-10-17 23:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a9c2e7f814'
+down_revision = 'c3e8f5a1d472'
+branch_labels = None
+depends_on = None
+
+# batch_alter_table rehace la tabla en SQLite y se lleva sus triggers:
+# los del índice de búsqueda (c3e8f5a1d472) se vuelven a crear
+SHIFT = 2 ** 40
+TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS busqueda_testimonio_ai AFTER INSERT ON \"testimonio\" "
+    "BEGIN INSERT INTO busqueda(rowid, nombre, email, telefono, detalle) "
+    f"VALUES ({3 * SHIFT} + new.id, new.nombre, '', '', new.frase); END",
+    "CREATE TRIGGER IF NOT EXISTS busqueda_testimonio_ad AFTER DELETE ON \"testimonio\" "
+    f"BEGIN DELETE FROM busqueda WHERE rowid = {3 * SHIFT} + old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS busqueda_testimonio_au AFTER UPDATE OF id, nombre, frase "
+    f"ON \"testimonio\" BEGIN DELETE FROM busqueda WHERE rowid = {3 * SHIFT} + old.id; "
+    "INSERT INTO busqueda(rowid, nombre, email, telefono, detalle) "
+    f"VALUES ({3 * SHIFT} + new.id, new.nombre, '', '', new.frase); END",
+)
+
+
+def _search_triggers():
+    if op.get_bind().dialect.name == "sqlite":
+        for stmt in TRIGGERS:
+            op.execute(stmt)
+
+
+def upgrade():
+    op.add_column('testimonio', sa.Column('estado', sa.String(length=10),
+                                          nullable=False, server_default='pending'))
+    op.add_column('testimonio', sa.Column('created', sa.DateTime(), nullable=True))
+    op.add_column('testimonio', sa.Column('moderado', sa.DateTime(), nullable=True))
+    # lo que ya se mostraba queda aprobado; lo oculto, rechazado
+    op.execute("UPDATE testimonio SET estado = CASE WHEN visible THEN 'approved' "
+               "ELSE 'rejected' END, moderado = CURRENT_TIMESTAMP")
+    with op.batch_alter_table('testimonio', schema=None) as batch_op:
+        batch_op.drop_column('visible')
+        batch_op.create_index('ix_testimonio_estado_id', ['estado', 'id'], unique=False)
+    _search_triggers()
+
+
+def downgrade():
+    with op.batch_alter_table('testimonio', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('visible', sa.Boolean(), nullable=True))
+    op.execute("UPDATE testimonio SET visible = (estado = 'approved')")
+    with op.batch_alter_table('testimonio', schema=None) as batch_op:
+        batch_op.drop_index('ix_testimonio_estado_id')
+        batch_op.drop_column('moderado')
+        batch_op.drop_column('created')
+        batch_op.drop_column('estado')
+    _search_triggers()
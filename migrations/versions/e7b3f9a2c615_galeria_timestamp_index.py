@@ -0,0 +1,30 @@
+"""index for the paginated public gallery
+
+Revision ID: e7b3f9a2c615
+Revises: d5a9c2e7f814
+Create Date: 2026-10-18 00:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3f9a2c615'
+down_revision = 'd5a9c2e7f814'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # la paginación por cursor no admite NULL en la columna de orden
+    op.execute("UPDATE galeria SET timestamp = CURRENT_TIMESTAMP WHERE timestamp IS NULL")
+
+    with op.batch_alter_table('galeria', schema=None) as batch_op:
+        batch_op.create_index('ix_galeria_visible_timestamp',
+                              ['visible', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('galeria', schema=None) as batch_op:
+        batch_op.drop_index('ix_galeria_visible_timestamp')
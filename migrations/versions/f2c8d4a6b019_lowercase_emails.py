@@ -0,0 +1,34 @@
+"""store emails in lowercase
+
+Revision ID: f2c8d4a6b019
+Revises: e7b3f9a2c615
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8d4a6b019'
+down_revision = 'e7b3f9a2c615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # los filtros por prefijo y la deduplicación comparan en minúsculas
+    # (models.normalize_email); el trigger de búsqueda reindexa lo cambiado
+    op.execute("UPDATE inscripcion SET email = lower(trim(email)) "
+               "WHERE email != lower(trim(email))")
+    # user.email es único: si dos cuentas sólo difieren en mayúsculas se
+    # dejan como están (hay que unirlas a mano)
+    op.execute('UPDATE "user" SET email = lower(trim(email)) '
+               'WHERE email != lower(trim(email)) AND NOT EXISTS ('
+               ' SELECT 1 FROM "user" otro WHERE otro.id != "user".id'
+               ' AND lower(trim(otro.email)) = lower(trim("user".email)))')
+
+
+def downgrade():
+    # no se sabe cómo estaban escritos; los correos en minúsculas siguen siendo válidos
+    pass
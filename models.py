@@ -5,10 +5,18 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import validates
+from database import RoutingSession
+from passwords import hasher
 
-# instancia global del ORM
-db = SQLAlchemy()
+# instancia global del ORM (la configura database.init_app)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+def normalize_email(value):
+    """Correo tal como se guarda y se compara: sin espacios y en minúsculas
+    (los filtros por prefijo y la deduplicación dependen de ello)."""
+    return value.strip().lower() if isinstance(value, str) else value
 
 # ---------------------------------------------------------
 # 1. Portada (HomeContent)
@@ -29,45 +37,73 @@ class Programa(db.Model):
     duracion = db.Column(db.String(40))
     precio   = db.Column(db.String(40))
     imagen   = db.Column(db.String(120))
+    ancho    = db.Column(db.Integer)             # px del original (derivados)
+    alto     = db.Column(db.Integer)
     visible  = db.Column(db.Boolean, default=True)
 
 # ---------------------------------------------------------
 # 3. Galería de imágenes
 # ---------------------------------------------------------
 class Galeria(db.Model):
+    # (visible, timestamp, id): la galería pública se pagina por cursor sobre él
+    __table_args__ = (db.Index('ix_galeria_visible_timestamp', 'visible', 'timestamp', 'id'),)
+
     id        = db.Column(db.Integer, primary_key=True)
     filename  = db.Column(db.String(120), nullable=False)
+    ancho     = db.Column(db.Integer)            # px del original (derivados)
+    alto      = db.Column(db.Integer)
     visible   = db.Column(db.Boolean, default=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
 # ---------------------------------------------------------
-# 4. Testimonios
+# 4. Testimonios (moderados: ver testimonials.py)
 # ---------------------------------------------------------
 class Testimonio(db.Model):
-    id      = db.Column(db.Integer, primary_key=True)
-    frase   = db.Column(db.Text,        nullable=False)
-    nombre  = db.Column(db.String(60),  nullable=False)
-    anio    = db.Column(db.Integer,     nullable=False)
-    visible = db.Column(db.Boolean,     default=True)
+    # (estado, id): cola de moderación y carrusel (últimos aprobados) por índice
+    __table_args__ = (db.Index('ix_testimonio_estado_id', 'estado', 'id'),)
+
+    id       = db.Column(db.Integer, primary_key=True)
+    frase    = db.Column(db.Text,        nullable=False)
+    nombre   = db.Column(db.String(60),  nullable=False)
+    anio     = db.Column(db.Integer,     nullable=False)
+    estado   = db.Column(db.String(10),  nullable=False,
+                         default='pending')   # pending / approved / rejected
+    created  = db.Column(db.DateTime,    default=datetime.utcnow)
+    moderado = db.Column(db.DateTime)    # cuándo se aprobó / rechazó
+
+    def __repr__(self):
+        return f'<Testimonio {self.id} {self.nombre} [{self.estado}]>'
 
 # ---------------------------------------------------------
 # 5. Usuarios y roles
 # ---------------------------------------------------------
 class User(db.Model, UserMixin):
+    # (role, created): listado de alumnos filtrado por rol y ordenado por alta
+    __table_args__ = (db.Index('ix_user_role_created', 'role', 'created'),)
+
     id             = db.Column(db.Integer, primary_key=True)
     email          = db.Column(db.String(120), unique=True, nullable=False)
     password       = db.Column(db.String(256), nullable=False)
     role           = db.Column(db.String(20),  default='guest')
-    created        = db.Column(db.DateTime,    default=datetime.utcnow)
+    created        = db.Column(db.DateTime,    default=datetime.utcnow, index=True)
     resena         = db.Column(db.Text)             # campo extra para bio/opinión
     twofactor_code = db.Column(db.String(6))        # código 2FA temporal
 
     # utilidades
     def set_password(self, pwd):
-        self.password = generate_password_hash(pwd)
+        self.password = hasher.hash(pwd)
 
     def check_password(self, pwd):
-        return check_password_hash(self.password, pwd)
+        """Verifica y, si el hash usa una política vieja, lo rehace
+        (queda pendiente en la sesión hasta el próximo commit)."""
+        ok = hasher.verify(self.password, pwd)
+        if ok and hasher.needs_rehash(self.password):
+            self.set_password(pwd)
+        return ok
+
+    @validates("email")
+    def _normalize_email(self, key, value):
+        return normalize_email(value)
 
     def __repr__(self):
         return f'<User {self.email} ({self.role})>'
@@ -76,12 +112,70 @@ class User(db.Model, UserMixin):
 # 6. Inscripciones (nuevo – ORM)
 # ---------------------------------------------------------
 class Inscripcion(db.Model):
+    # (curso, fecha): filtro por programa + orden por fecha sin ordenar en memoria
+    __table_args__ = (db.Index('ix_inscripcion_curso_fecha', 'curso', 'fecha'),)
+
     id                = db.Column(db.Integer, primary_key=True)
     nombre            = db.Column(db.String(120), nullable=False)
     curso             = db.Column(db.String(200), nullable=False)
-    email             = db.Column(db.String(120), nullable=False)
-    fecha             = db.Column(db.DateTime, default=datetime.utcnow)
+    email             = db.Column(db.String(120), nullable=False, index=True)
+    fecha             = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     telefono_contacto = db.Column(db.String(30),  nullable=False)
 
+    @validates("email")
+    def _normalize_email(self, key, value):
+        return normalize_email(value)
+
     def __repr__(self):
         return f'<Inscripcion {self.nombre} – {self.curso}>'
+
+# ---------------------------------------------------------
+# 7. Trabajos en segundo plano (ver jobs.py)
+# ---------------------------------------------------------
+class Job(db.Model):
+    id           = db.Column(db.Integer, primary_key=True)
+    kind         = db.Column(db.String(40),  nullable=False)
+    payload      = db.Column(db.Text,        nullable=False, default='{}')  # JSON
+    status       = db.Column(db.String(10),  nullable=False, default='pending',
+                             index=True)    # pending / running / done / failed
+    attempts     = db.Column(db.Integer,     nullable=False, default=0)
+    max_attempts = db.Column(db.Integer,     nullable=False, default=3)
+    error        = db.Column(db.Text)
+    run_after    = db.Column(db.DateTime,    default=datetime.utcnow)
+    created      = db.Column(db.DateTime,    default=datetime.utcnow)
+    updated      = db.Column(db.DateTime,    default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} [{self.status}]>'
+
+# ---------------------------------------------------------
+# 8. Correo saliente (outbox – ver mailqueue.py)
+# ---------------------------------------------------------
+class Outbox(db.Model):
+    id         = db.Column(db.Integer, primary_key=True)
+    to         = db.Column(db.String(500), nullable=False)    # separados por coma
+    subject    = db.Column(db.String(200), nullable=False)
+    body       = db.Column(db.Text,        nullable=False)
+    html       = db.Column(db.Text)
+    status     = db.Column(db.String(10),  nullable=False, default='pending',
+                           index=True)      # pending / sending / sent / failed
+    attempts   = db.Column(db.Integer,     nullable=False, default=0)
+    error      = db.Column(db.Text)
+    run_after  = db.Column(db.DateTime,    default=datetime.utcnow)
+    created    = db.Column(db.DateTime,    default=datetime.utcnow)
+    sent_at    = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Outbox {self.id} → {self.to} [{self.status}]>'
+
+# ---------------------------------------------------------
+# 9. Analítica: conteos diarios precalculados (ver analytics.py)
+# ---------------------------------------------------------
+class EstadisticaDiaria(db.Model):
+    dia   = db.Column(db.Date,        primary_key=True)
+    serie = db.Column(db.String(20),  primary_key=True)   # inscripcion / registro / conversion
+    curso = db.Column(db.String(200), primary_key=True, default='')   # sólo en 'inscripcion'
+    n     = db.Column(db.Integer,     nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<EstadisticaDiaria {self.dia} {self.serie} {self.curso} = {self.n}>'
@@ -0,0 +1,179 @@
+# passwords.py
+# ---------------------------------------------------------
+# Política de hashing de contraseñas (algoritmo y costo)
+# ---------------------------------------------------------
+#   PASSWORD_HASH = "scrypt" | "pbkdf2" | "bcrypt"
+#   PASSWORD_SCRYPT_N / PASSWORD_PBKDF2_ITERATIONS / PASSWORD_BCRYPT_ROUNDS
+#
+# Los hashes guardados llevan sus parámetros, así que cambiar la
+# política no invalida nada: al siguiente login correcto el hash se
+# rehace con los parámetros nuevos (User.check_password).
+#
+# Hashear es CPU pura. Se hace en un pool acotado por proceso
+# (PASSWORD_HASH_WORKERS) y, además, con un tope global entre los
+# workers de gunicorn (candados de archivo en instance/hash-slots/):
+# por defecto la mitad de los núcleos, para que una ráfaga de logins
+# no deje sin CPU al resto de las peticiones.
+# Si ya hay PASSWORD_HASH_QUEUE esperando, se rechaza de inmediato
+# con HashingBusy en vez de encolar más trabajo que no se va a servir.
+#
+#   flask --app app passwords-calibrate --target-ms 250
+import os, time, threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    import fcntl
+except ImportError:                 # Windows: sólo el tope por proceso
+    fcntl = None
+
+ALGORITHMS = ("scrypt", "pbkdf2", "bcrypt")
+
+
+class HashingBusy(Exception):
+    """Demasiadas verificaciones en curso; reintentar en unos segundos."""
+
+
+def method_for(algorithm, cost):
+    """Cadena de método de werkzeug (o rondas de bcrypt) para un costo."""
+    if algorithm == "scrypt":
+        return f"scrypt:{cost}:8:1"
+    if algorithm == "pbkdf2":
+        return f"pbkdf2:sha256:{cost}"
+    if algorithm == "bcrypt":
+        return cost
+    raise ValueError(f"Algoritmo de hash desconocido: {algorithm}")
+
+
+def hash_with(algorithm, cost, pwd):
+    if algorithm == "bcrypt":
+        return bcrypt.hashpw(pwd.encode(), bcrypt.gensalt(rounds=cost)).decode()
+    return generate_password_hash(pwd, method=method_for(algorithm, cost))
+
+
+def verify_hash(stored, pwd):
+    if stored.startswith("$2"):
+        return bcrypt.checkpw(pwd.encode(), stored.encode())
+    return check_password_hash(stored, pwd)
+
+
+class Hasher:
+
+    def __init__(self, app=None):
+        self.app    = None
+        self._pid   = None
+        self._pool  = None
+        self._queue = None
+        self._lock  = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app):
+        app.config.setdefault("PASSWORD_HASH", "scrypt")
+        app.config.setdefault("PASSWORD_SCRYPT_N", 2 ** 15)            # default de werkzeug
+        app.config.setdefault("PASSWORD_PBKDF2_ITERATIONS", 600_000)
+        app.config.setdefault("PASSWORD_BCRYPT_ROUNDS", 12)
+        app.config.setdefault("PASSWORD_HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2))
+        app.config.setdefault("PASSWORD_HASH_GLOBAL", max(1, (os.cpu_count() or 2) // 2))
+        app.config.setdefault("PASSWORD_HASH_QUEUE", 16)
+        app.config.setdefault("PASSWORD_HASH_TIMEOUT", 10)            # s esperando turno
+        if app.config["PASSWORD_HASH"] not in ALGORITHMS:
+            raise ValueError(f"PASSWORD_HASH debe ser uno de {ALGORITHMS}")
+        self.app = app
+        app.extensions["hasher"] = self
+
+    @property
+    def policy(self):
+        """(algoritmo, costo) vigentes."""
+        cfg = self.app.config
+        algorithm = cfg["PASSWORD_HASH"]
+        cost = {"scrypt": cfg["PASSWORD_SCRYPT_N"],
+                "pbkdf2": cfg["PASSWORD_PBKDF2_ITERATIONS"],
+                "bcrypt": cfg["PASSWORD_BCRYPT_ROUNDS"]}[algorithm]
+        return algorithm, cost
+
+    # ─── API ───────────────────────────────────────────
+    def hash(self, pwd):
+        return self._run(hash_with, *self.policy, pwd)
+
+    def verify(self, stored, pwd):
+        return self._run(verify_hash, stored, pwd)
+
+    def needs_rehash(self, stored):
+        """True si `stored` no usa el algoritmo/costo de la política actual."""
+        algorithm, cost = self.policy
+        if algorithm == "bcrypt":
+            return not stored.startswith("$2") or stored.split("$")[2] != f"{cost:02d}"
+        return stored.split("$", 1)[0] != method_for(algorithm, cost)
+
+    # ─── pool acotado ──────────────────────────────────
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():          # tras fork: pool propio
+                cfg = self.app.config
+                self._pool = ThreadPoolExecutor(cfg["PASSWORD_HASH_WORKERS"],
+                                                thread_name_prefix="hash")
+                self._queue = threading.BoundedSemaphore(
+                    cfg["PASSWORD_HASH_WORKERS"] + cfg["PASSWORD_HASH_QUEUE"])
+                self._pid = os.getpid()
+
+    def _run(self, fn, *args):
+        self._start()
+        if not self._queue.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            return self._pool.submit(self._in_slot, fn, *args).result()
+        finally:
+            self._queue.release()
+
+    def _in_slot(self, fn, *args):
+        if fcntl is None:
+            return fn(*args)
+        base = os.path.join(self.app.instance_path, "hash-slots")
+        os.makedirs(base, exist_ok=True)
+        deadline = time.monotonic() + self.app.config["PASSWORD_HASH_TIMEOUT"]
+        while True:
+            for i in range(self.app.config["PASSWORD_HASH_GLOBAL"]):
+                with open(os.path.join(base, str(i)), "a") as fh:
+                    try:
+                        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue                  # slot ocupado por otro proceso
+                    try:
+                        return fn(*args)
+                    finally:
+                        fcntl.flock(fh, fcntl.LOCK_UN)
+            if time.monotonic() > deadline:
+                raise HashingBusy()
+            time.sleep(0.01)
+
+
+def calibrate(algorithm, target_ms):
+    """Sube el costo hasta que un hash tarde ~target_ms en esta máquina.
+    Devuelve (recomendado, [(costo, ms)]): el mayor costo que no pasa
+    del objetivo."""
+    cost, step = {"scrypt": (2 ** 12, lambda c: c * 2),
+                  "pbkdf2": (50_000, lambda c: c * 2),
+                  "bcrypt": (8, lambda c: c + 1)}[algorithm]
+    results = []
+    while True:
+        t0 = time.perf_counter()
+        hash_with(algorithm, cost, "calibración-1234")
+        ms = (time.perf_counter() - t0) * 1000
+        results.append((cost, ms))
+        if ms >= target_ms or len(results) >= 12:
+            break
+        if algorithm == "pbkdf2" and len(results) == 1:   # lineal: saltar cerca del objetivo
+            cost = max(cost + 1, int(cost * 0.95 * target_ms / max(ms, 0.1)))
+        else:
+            cost = step(cost)
+    dentro = [c for c, ms in results if ms <= target_ms]
+    return (dentro[-1] if dentro else results[0][0]), results
+
+
+hasher = Hasher()
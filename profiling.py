@@ -0,0 +1,293 @@
+# profiling.py
+# ---------------------------------------------------------
+# Instrumentación por request: SQL, plantillas, vista y total
+# ---------------------------------------------------------
+# · Cada request acumula en g: nº y tiempo de consultas SQL (eventos
+#   del Engine), tiempo de render de plantillas (señales de Flask) y
+#   tramos propios medidos con `profiler.timer("hash")`. La vista es
+#   lo que queda del total (en respuestas en streaming, el total
+#   llega hasta que empieza el envío).
+# · Requests lentos (SLOW_REQUEST_MS) se registran en el log; una
+#   muestra (PROFILE_SAMPLE_RATE) corre bajo cProfile y, si resulta
+#   lenta, deja su volcado en instance/profiles/*.prof
+#       python -m pstats instance/profiles/<archivo>.prof
+# · /metrics expone contadores en formato de texto de Prometheus
+#   (sólo admin o `Authorization: Bearer METRICS_TOKEN`). Cada worker
+#   vuelca los suyos a instance/metrics/<pid>.json y /metrics suma
+#   todos, así el total no depende de qué worker atiende el scrape.
+# · Con SERVER_TIMING (o en modo debug) cada respuesta lleva la
+#   cabecera Server-Timing, visible en la pestaña Red del navegador.
+import os, hmac, json, time, random, cProfile, threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import (g, request, has_request_context, abort,
+                   before_render_template, template_rendered)
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# familia: (tipo, ayuda)
+METRICS = {
+    "ciipa_requests_total":         ("counter",   "Requests atendidos"),
+    "ciipa_request_seconds":        ("histogram", "Duración del request"),
+    "ciipa_sql_queries_total":      ("counter",   "Consultas SQL emitidas"),
+    "ciipa_sql_seconds_total":      ("counter",   "Tiempo en consultas SQL"),
+    "ciipa_template_seconds_total": ("counter",   "Tiempo renderizando plantillas"),
+    "ciipa_slow_requests_total":    ("counter",   "Requests por encima de SLOW_REQUEST_MS"),
+}
+
+
+class _Stats:
+    """Medidas del request en curso (vive en g._prof)."""
+    __slots__ = ("start", "sql_n", "sql_t", "segments", "tpl_stack", "profile")
+
+    def __init__(self):
+        self.start     = time.perf_counter()
+        self.sql_n     = 0
+        self.sql_t     = 0.0
+        self.segments  = {}                    # nombre → segundos
+        self.tpl_stack = []
+        self.profile   = None
+
+    def add(self, name, seconds):
+        self.segments[name] = self.segments.get(name, 0.0) + seconds
+
+
+def _current():
+    return g.get("_prof") if has_request_context() else None
+
+def _labels(**kw):
+    return ",".join(f'{k}="{v}"' for k, v in kw.items())
+
+def _order(item):
+    # buckets del histograma en orden numérico de `le`
+    labels, _ = item
+    base, _, le = labels.partition(',le="')
+    return base, float(le.rstrip('"')) if le else 0.0
+
+
+class Profiler:
+
+    def __init__(self, app=None):
+        self.app     = None
+        self._series = {}                      # nombre → {etiquetas: valor}
+        self._gauges = []
+        self._lock   = threading.Lock()
+        self._flushed = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app):
+        app.config.setdefault("SLOW_REQUEST_MS", 500)
+        app.config.setdefault("PROFILE_SAMPLE_RATE", 0.01)     # 1 de cada 100
+        app.config.setdefault("PROFILE_KEEP", 50)              # volcados .prof
+        app.config.setdefault("SERVER_TIMING", False)          # además de app.debug
+        app.config.setdefault("METRICS_TOKEN", None)
+        app.config.setdefault("METRICS_FLUSH_INTERVAL", 5)     # s
+        self.app = app
+        app.extensions["profiler"] = self
+
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+        before_render_template.connect(self._tpl_start, app)
+        template_rendered.connect(self._tpl_end, app)
+        event.listen(Engine, "before_cursor_execute", self._sql_start)
+        event.listen(Engine, "after_cursor_execute", self._sql_end)
+        app.add_url_rule("/metrics", "metrics", self._metrics_view)
+
+    def gauge(self, name, help):
+        """Decorador: fn() → [(etiquetas, valor)], se evalúa en cada /metrics."""
+        def deco(fn):
+            self._gauges.append((name, help, fn))
+            return fn
+        return deco
+
+    @contextmanager
+    def timer(self, name):
+        """Mide un tramo del request: `with profiler.timer("hash"): …`"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            st = _current()
+            if st is not None:
+                st.add(name, time.perf_counter() - t0)
+
+    # ─── ciclo del request ─────────────────────────────
+    def _before(self):
+        st = g._prof = _Stats()
+        if random.random() < self.app.config["PROFILE_SAMPLE_RATE"]:
+            prof = cProfile.Profile()
+            try:
+                prof.enable()
+                st.profile = prof
+            except ValueError:                 # otro perfilador activo
+                pass
+
+    def _after(self, response):
+        st = g.pop("_prof", None)
+        if st is None:
+            return response
+        if st.profile is not None:
+            st.profile.disable()
+        total = time.perf_counter() - st.start
+        tpl = st.segments.pop("tpl", 0.0)
+        view = max(total - st.sql_t - tpl - sum(st.segments.values()), 0.0)
+
+        endpoint = request.endpoint or "none"
+        self._record(endpoint, response.status_code, total, st, tpl)
+
+        slow = total * 1000 >= self.app.config["SLOW_REQUEST_MS"]
+        if slow:
+            extra = "".join(f", {k} {v * 1000:.0f} ms" for k, v in st.segments.items())
+            self.app.logger.warning(
+                "Lento: %s %s %.0f ms (sql %d× %.0f ms, tpl %.0f ms, vista %.0f ms%s)",
+                request.method, request.full_path.rstrip("?"), total * 1000,
+                st.sql_n, st.sql_t * 1000, tpl * 1000, view * 1000, extra)
+            if st.profile is not None:
+                self._dump(st.profile, endpoint, total)
+
+        if self.app.config["SERVER_TIMING"] or self.app.debug:
+            parts = [f'sql;dur={st.sql_t * 1000:.1f};desc="{st.sql_n} consultas"',
+                     f"tpl;dur={tpl * 1000:.1f}",
+                     *(f"{k};dur={v * 1000:.1f}" for k, v in st.segments.items()),
+                     f"view;dur={view * 1000:.1f}",
+                     f"total;dur={total * 1000:.1f}"]
+            response.headers["Server-Timing"] = ", ".join(parts)
+        return response
+
+    def _teardown(self, exc):
+        # si hubo excepción after_request no corrió: no dejar cProfile encendido
+        st = g.pop("_prof", None)
+        if st is not None and st.profile is not None:
+            st.profile.disable()
+
+    # ─── señales / eventos ─────────────────────────────
+    def _tpl_start(self, sender, template, context, **kw):
+        st = _current()
+        if st is not None:
+            st.tpl_stack.append(time.perf_counter())
+
+    def _tpl_end(self, sender, template, context, **kw):
+        st = _current()
+        if st is not None and st.tpl_stack:
+            t0 = st.tpl_stack.pop()
+            if not st.tpl_stack:               # anidadas: contar sólo la externa
+                st.add("tpl", time.perf_counter() - t0)
+
+    def _sql_start(self, conn, cursor, statement, parameters, context, executemany):
+        if _current() is not None:
+            conn.info.setdefault("_prof_t0", []).append(time.perf_counter())
+
+    def _sql_end(self, conn, cursor, statement, parameters, context, executemany):
+        st = _current()
+        starts = conn.info.get("_prof_t0")
+        if st is not None and starts:
+            st.sql_n += 1
+            st.sql_t += time.perf_counter() - starts.pop()
+
+    # ─── métricas ──────────────────────────────────────
+    def _inc(self, name, labels, value=1):
+        serie = self._series.setdefault(name, {})
+        serie[labels] = serie.get(labels, 0) + value
+
+    def _record(self, endpoint, status, total, st, tpl):
+        with self._lock:
+            self._inc("ciipa_requests_total",
+                      _labels(endpoint=endpoint, method=request.method, status=status))
+            ep = _labels(endpoint=endpoint)
+            for le in BUCKETS:
+                if total <= le:
+                    self._inc("ciipa_request_seconds_bucket", _labels(endpoint=endpoint, le=le))
+            self._inc("ciipa_request_seconds_bucket", _labels(endpoint=endpoint, le="+Inf"))
+            self._inc("ciipa_request_seconds_sum", ep, total)
+            self._inc("ciipa_request_seconds_count", ep)
+            self._inc("ciipa_sql_queries_total", ep, st.sql_n)
+            self._inc("ciipa_sql_seconds_total", ep, st.sql_t)
+            self._inc("ciipa_template_seconds_total", ep, tpl)
+            if total * 1000 >= self.app.config["SLOW_REQUEST_MS"]:
+                self._inc("ciipa_slow_requests_total", ep)
+        if time.monotonic() - self._flushed >= self.app.config["METRICS_FLUSH_INTERVAL"]:
+            self._flush()
+
+    def _metrics_dir(self):
+        path = os.path.join(self.app.instance_path, "metrics")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _flush(self):
+        """Vuelca los contadores de este worker para que /metrics los sume."""
+        with self._lock:
+            data = json.dumps(self._series)
+            self._flushed = time.monotonic()
+        path = os.path.join(self._metrics_dir(), f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as fh:
+            fh.write(data)
+        os.replace(path + ".tmp", path)
+
+    def collect(self):
+        """Suma los contadores de todos los workers (incluidos los ya muertos,
+        para que los totales no retrocedan)."""
+        self._flush()
+        total = {}
+        base = self._metrics_dir()
+        viejo = time.time() - 7 * 86400           # workers de deploys antiguos
+        for name in os.listdir(base):
+            path = os.path.join(base, name)
+            if not name.endswith(".json"):
+                continue
+            try:
+                if os.path.getmtime(path) < viejo:
+                    os.remove(path)
+                    continue
+                with open(path) as fh:
+                    series = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            for metric, values in series.items():
+                acc = total.setdefault(metric, {})
+                for labels, v in values.items():
+                    acc[labels] = acc.get(labels, 0) + v
+        return total
+
+    def render(self):
+        series, lines = self.collect(), []
+        for family, (kind, help) in METRICS.items():
+            names = ([f"{family}_bucket", f"{family}_sum", f"{family}_count"]
+                     if kind == "histogram" else [family])
+            lines += [f"# HELP {family} {help}", f"# TYPE {family} {kind}"]
+            for name in names:
+                for labels, v in sorted(series.get(name, {}).items(), key=_order):
+                    lines.append(f"{name}{{{labels}}} {v:g}")
+        for name, help, fn in self._gauges:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+            for labels, v in fn():
+                lines.append(f"{name}{{{_labels(**labels)}}} {v:g}")
+        return "\n".join(lines) + "\n"
+
+    def _metrics_view(self):
+        token = self.app.config["METRICS_TOKEN"]
+        enviado = request.headers.get("Authorization", "")
+        if not (token and hmac.compare_digest(enviado.encode(), f"Bearer {token}".encode())):
+            if not (current_user.is_authenticated and current_user.role == "admin"):
+                abort(403)
+        return self.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+    # ─── volcados de cProfile ──────────────────────────
+    def _dump(self, prof, endpoint, total):
+        base = os.path.join(self.app.instance_path, "profiles")
+        os.makedirs(base, exist_ok=True)
+        name = f"{datetime.now():%Y%m%d_%H%M%S}_{endpoint}_{total * 1000:.0f}ms.prof"
+        prof.dump_stats(os.path.join(base, name))
+        self.app.logger.warning("Perfil guardado en instance/profiles/%s", name)
+        dumps = sorted(f for f in os.listdir(base) if f.endswith(".prof"))
+        for old in dumps[:-self.app.config["PROFILE_KEEP"]]:
+            os.remove(os.path.join(base, old))
+
+
+profiler = Profiler()
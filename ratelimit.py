@@ -0,0 +1,242 @@
+# ratelimit.py
+# ---------------------------------------------------------
+# Límites de frecuencia (token bucket) para login, 2FA, registro,
+# inscripción, testimonios y reset de contraseña
+# ---------------------------------------------------------
+# Cada cubeta tiene N fichas que se reponen de forma continua en el
+# periodo ("5/minute" = 5 seguidas y luego una cada 12 s). Las claves
+# combinan ruta + IP o ruta + correo, así un bot no agota el cupo de
+# los demás y una cuenta no se ataca desde muchas IPs.
+#
+# El estado vive en instance/ratelimit.db (SQLite aparte, no la BD
+# principal): lo comparten todos los workers de gunicorn y un rechazo
+# no escribe nada en ciipa.db. RATELIMIT_STORAGE = "memory" lo deja
+# en el proceso (desarrollo con un solo worker).
+#
+# El rechazo ocurre antes de validar el formulario, hashear o tocar
+# la BD; la respuesta es un 429 con Retry-After.
+#
+# 2FA: tras RATELIMIT_2FA_MAX_FAILS códigos erróneos el código se
+# invalida y la cuenta queda bloqueada RATELIMIT_2FA_LOCKOUT segundos
+# (tampoco puede pedir uno nuevo desde /login).
+import os, time, random, sqlite3, hashlib, threading
+from functools import wraps
+
+from flask import request
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class RateLimited(Exception):
+    """Cupo agotado; `retry_after` en segundos."""
+
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+def parse_rate(rate):
+    """"5/minute" → (5, 60.0)"""
+    n, _, period = rate.partition("/")
+    return int(n), float(PERIODS[period.strip()])
+
+
+def _key(name, value):
+    # correos e IPs no se guardan en claro
+    digest = hashlib.blake2b(str(value).lower().encode(), digest_size=12).hexdigest()
+    return f"{name}:{digest}"
+
+
+# ─── almacenes: (fichas, instante, bloqueado_hasta) por clave ──
+class MemoryStore:
+    """Por proceso; sólo para desarrollo o un único worker."""
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._rows.get(key)
+
+    def update(self, key, fn):
+        with self._lock:
+            row, result = fn(self._rows.get(key))
+            if row is None:
+                self._rows.pop(key, None)
+            else:
+                self._rows[key] = row
+            return result
+
+    def sweep(self, now):
+        with self._lock:
+            for key in [k for k, r in self._rows.items() if r[3] < now]:
+                del self._rows[key]
+
+
+class SqliteStore:
+    """Archivo SQLite compartido entre procesos; una conexión por hilo."""
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS bucket ("
+              " key TEXT PRIMARY KEY, tokens REAL, stamp REAL,"
+              " locked_until REAL, expires REAL)")
+
+    def __init__(self, path, timeout_ms):
+        self.path, self.timeout_ms = path, timeout_ms
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():     # tras fork: conexión propia
+            conn = sqlite3.connect(self.path, isolation_level=None,
+                                   timeout=self.timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")          # perder cupos no importa
+            conn.execute(self.SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        return self._conn().execute("SELECT tokens, stamp, locked_until, expires "
+                                    "FROM bucket WHERE key = ?", (key,)).fetchone()
+
+    def update(self, key, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, stamp, locked_until, expires "
+                               "FROM bucket WHERE key = ?", (key,)).fetchone()
+            row, result = fn(row)
+            if row is None:
+                conn.execute("DELETE FROM bucket WHERE key = ?", (key,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO bucket VALUES (?, ?, ?, ?, ?)",
+                             (key, *row))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def sweep(self, now):
+        self._conn().execute("DELETE FROM bucket WHERE expires < ?", (now,))
+
+
+class Limiter:
+
+    def __init__(self, app=None):
+        self.app   = None
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app):
+        app.config.setdefault("RATELIMIT_ENABLED", True)
+        app.config.setdefault("RATELIMIT_STORAGE", "sqlite")       # sqlite | memory
+        app.config.setdefault("RATELIMIT_PROXY_HOPS", 0)           # 1 detrás del proxy de Render
+        app.config.setdefault("RATELIMIT_LOGIN_IP", "20/minute")
+        app.config.setdefault("RATELIMIT_LOGIN_EMAIL", "5/minute")
+        app.config.setdefault("RATELIMIT_TWOFACTOR_IP", "10/minute")
+        app.config.setdefault("RATELIMIT_REGISTER_IP", "5/hour")
+        app.config.setdefault("RATELIMIT_INSCRIPCION_IP", "10/hour")
+        app.config.setdefault("RATELIMIT_RESET_IP", "5/hour")
+        app.config.setdefault("RATELIMIT_TESTIMONIO_IP", "3/hour")
+        app.config.setdefault("RATELIMIT_2FA_MAX_FAILS", 5)
+        app.config.setdefault("RATELIMIT_2FA_LOCKOUT", 900)        # s
+        self.app = app
+        if app.config["RATELIMIT_STORAGE"] == "memory":
+            self.store = MemoryStore()
+        else:
+            os.makedirs(app.instance_path, exist_ok=True)
+            self.store = SqliteStore(os.path.join(app.instance_path, "ratelimit.db"),
+                                     app.config.get("SQLITE_BUSY_TIMEOUT", 5000))
+        app.extensions["limiter"] = self
+
+    def client_ip(self):
+        """IP del cliente; con RATELIMIT_PROXY_HOPS confía en esa cantidad
+        de proxies al final de X-Forwarded-For."""
+        hops = self.app.config["RATELIMIT_PROXY_HOPS"]
+        route = request.access_route if hops else [request.remote_addr]
+        return route[-hops] if len(route) >= hops else route[0]
+
+    # ─── API ───────────────────────────────────────────
+    def hit(self, name, value, rate):
+        """Gasta una ficha de la cubeta (name, value) o lanza RateLimited.
+        `rate` es "N/periodo" o el nombre de una clave de config."""
+        if not self.app.config["RATELIMIT_ENABLED"]:
+            return
+        capacity, period = parse_rate(self.app.config.get(rate, rate))
+        refill = capacity / period
+        now = time.time()
+
+        def take(row):
+            tokens, stamp, locked, _ = row or (capacity, now, 0.0, 0.0)
+            tokens = min(capacity, tokens + (now - stamp) * refill)
+            wait = (1 - tokens) / refill if tokens < 1 else None
+            if wait is None:
+                tokens -= 1
+            return (tokens, now, locked, now + (capacity - tokens) / refill), wait
+
+        wait = self._update(_key(name, value), take)
+        if wait is not None:
+            raise RateLimited(wait)
+
+    def check(self, name, value):
+        """Lanza RateLimited si (name, value) está bloqueado por fallos."""
+        if not self.app.config["RATELIMIT_ENABLED"]:
+            return
+        row = self._call(self.store.get, _key(name, value))
+        if row and row[2] > time.time():
+            raise RateLimited(row[2] - time.time())
+
+    def fail(self, name, value, max_fails, lockout):
+        """Anota un intento fallido; devuelve True si con éste queda
+        bloqueado `lockout` segundos. Los fallos se olvidan al mismo
+        ritmo (max_fails por lockout)."""
+        if not self.app.config["RATELIMIT_ENABLED"]:
+            return False
+        refill = max_fails / lockout
+        now = time.time()
+
+        def take(row):
+            tokens, stamp, locked, _ = row or (max_fails, now, 0.0, 0.0)
+            tokens = min(max_fails, tokens + (now - stamp) * refill) - 1
+            if tokens < 1:
+                locked, tokens = now + lockout, max_fails     # al desbloquear, cupo entero
+            return (tokens, now, locked, max(locked, now + (max_fails - tokens) / refill)), locked > now
+
+        return self._update(_key(name, value), take)
+
+    def reset(self, name, value):
+        """Olvida los fallos de (name, value), p.ej. tras un login correcto."""
+        if self.app.config["RATELIMIT_ENABLED"]:
+            self._update(_key(name, value), lambda row: (None, None))
+
+    def limit(self, rate, methods=("POST",)):
+        """Decorador de vista: cupo por IP y endpoint. `rate` como en hit()."""
+        def deco(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method in methods:
+                    self.hit(request.endpoint, self.client_ip(), rate)
+                return view(*args, **kwargs)
+            return wrapper
+        return deco
+
+    # ─── interno ───────────────────────────────────────
+    def _update(self, key, fn):
+        result = self._call(self.store.update, key, fn)
+        if random.random() < 0.002:                           # limpieza ocasional
+            self._call(self.store.sweep, time.time())
+        return result
+
+    def _call(self, method, *args):
+        try:
+            return method(*args)
+        except sqlite3.Error:
+            # sin almacén no se bloquea a nadie: mejor dejar pasar que tirar el login
+            self.app.logger.warning("ratelimit: almacén no disponible", exc_info=True)
+            return None
+
+
+limiter = Limiter()
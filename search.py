@@ -0,0 +1,264 @@
+# search.py
+# ---------------------------------------------------------
+# Búsqueda de texto completo (SQLite FTS5) sobre inscripciones,
+# alumnos y testimonios
+# ---------------------------------------------------------
+# Una sola tabla virtual `busqueda` con (nombre, email, telefono,
+# detalle) de las tres tablas. El rowid codifica origen e id
+# (tipo * 2**40 + id): borrar o actualizar una fila del índice es
+# una búsqueda por rowid, y cada origen ocupa un rango contiguo.
+#
+# La mantienen triggers de SQLite (formulario, ORM, importación
+# masiva o SQL a mano: todo pasa por ellos, en la misma
+# transacción). Sólo se reindexa cuando cambian las columnas
+# indexadas: el código 2FA o la contraseña no tocan el índice.
+#
+# Cada palabra buscada es un prefijo ("jua pere" encuentra "Juan
+# Pérez"; sin acentos ni mayúsculas), los resultados se ordenan por
+# bm25 (pesa más el nombre) y las coincidencias se resaltan.
+#
+# Encontrar coincidencias es barato; puntuarlas no (bm25 sobre
+# 300 000 "García" tarda ~0.3 s). Si una búsqueda trae más de
+# SEARCH_RANK_WINDOW filas se puntúan sólo las de rowid más alto:
+# todos los alumnos y testimonios (su rango va por encima del de
+# inscripciones) y las inscripciones más recientes. Una búsqueda
+# específica siempre se ordena completa; una muy amplia no pasa de
+# unas decenas de ms con un millón de filas. Los índices de
+# prefijo de 2 a 6 letras evitan fusionar listas enteras al buscar
+# "marti*" (a cambio, el índice ocupa ~1.7× más).
+#
+# Si el índice se pierde o se sospecha de él:
+#   flask --app app search-rebuild
+#
+# Con PostgreSQL no hay FTS5: se busca con ILIKE por prefijo (sin
+# ranking), suficiente para volúmenes chicos.
+#
+# Las inscripciones archivadas (archive.py) salen del índice al
+# archivarse. Con archivo=True se recorren además sus particiones,
+# de la más reciente a la más antigua, con la misma regla de
+# prefijos y sin ranking: es un recorrido completo, así que sólo a
+# pedido.
+import re, unicodedata
+from collections import namedtuple
+
+from markupsafe import Markup, escape
+from sqlalchemy import event, or_, text
+
+from models import db, Inscripcion, User, Testimonio
+from archive import archive
+
+KINDS = {1: "inscripcion", 2: "alumno", 3: "testimonio"}   # de más a menos filas
+SHIFT = 2 ** 40                       # rowid = tipo * SHIFT + id
+
+# resaltado: marcadores que no aparecen en los datos; se escapan los
+# datos y después se cambian por <mark>
+_OPEN, _CLOSE = "\x02", "\x03"
+_TERM = re.compile(r"[^\s\"]+")
+_PHONE = re.compile(r"^\+?[\d\s\-().]{4,}$")
+_WORD = re.compile(r"\w+")
+
+Hit = namedtuple("Hit", "tipo id nombre email telefono detalle")
+
+# ─── esquema ───────────────────────────────────────────
+# (las migraciones llevan su propia copia de este SQL)
+FTS_TABLE = ("CREATE VIRTUAL TABLE IF NOT EXISTS busqueda USING fts5("
+             "nombre, email, telefono, detalle, "
+             "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6')")
+FTS_RANK = ("INSERT INTO busqueda(busqueda, rank) "
+            "VALUES ('rank', 'bm25(10.0, 5.0, 5.0, 1.0)')")
+
+# tabla → (tipo, columnas que disparan reindexar, SELECT de las 4 columnas)
+SOURCES = {
+    "inscripcion": (1, "nombre, email, telefono_contacto, curso",
+                    "{r}.nombre, {r}.email, {r}.telefono_contacto, {r}.curso"),
+    "user":        (2, "email, role, resena",
+                    "'', {r}.email, '', coalesce({r}.role, '') || ' ' || coalesce({r}.resena, '')"),
+    "testimonio":  (3, "nombre, frase",
+                    "{r}.nombre, '', '', {r}.frase"),
+}
+
+
+def _triggers(table, kind, watched, cols):
+    quoted = f'"{table}"'
+    insert = (f"INSERT INTO busqueda(rowid, nombre, email, telefono, detalle) "
+              f"VALUES ({kind * SHIFT} + new.id, {cols.format(r='new')});")
+    delete = f"DELETE FROM busqueda WHERE rowid = {kind * SHIFT} + old.id;"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS busqueda_{table}_ai AFTER INSERT ON {quoted} "
+        f"BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS busqueda_{table}_ad AFTER DELETE ON {quoted} "
+        f"BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS busqueda_{table}_au AFTER UPDATE OF id, {watched} "
+        f"ON {quoted} BEGIN {delete} {insert} END",
+    ]
+
+
+def schema():
+    """Sentencias para crear el índice y sus triggers (idempotentes)."""
+    stmts = [FTS_TABLE, FTS_RANK]
+    for table, (kind, watched, cols) in SOURCES.items():
+        stmts += _triggers(table, kind, watched, cols)
+    return stmts
+
+
+def populate():
+    """INSERT … SELECT que llena el índice desde las tablas."""
+    return [f"INSERT INTO busqueda(rowid, nombre, email, telefono, detalle) "
+            f"SELECT {kind * SHIFT} + id, {cols.format(r='t')} FROM \"{table}\" t"
+            for table, (kind, _, cols) in SOURCES.items()]
+
+
+def drop():
+    stmts = [f"DROP TRIGGER IF EXISTS busqueda_{table}_{op}"
+             for table in SOURCES for op in ("ai", "ad", "au")]
+    return stmts + ["DROP TABLE IF EXISTS busqueda"]
+
+
+# ─── consulta ──────────────────────────────────────────
+def fts_query(q):
+    """Texto libre → consulta FTS5: cada palabra entre comillas y como
+    prefijo, todas obligatorias. Un teléfono con guiones o espacios se
+    junta en un solo término. None si no queda nada que buscar."""
+    q = q.strip()
+    if _PHONE.match(q):
+        q = re.sub(r"[^\d]", "", q)
+    terms = [t for t in _TERM.findall(q) if any(ch.isalnum() for ch in t)]
+    if not terms:
+        return None
+    return " ".join('"{}"*'.format(t.replace('"', '""')) for t in terms[:8])
+
+
+def _fold(value):
+    """Minúsculas y sin acentos (como remove_diacritics del índice)."""
+    return "".join(ch for ch in unicodedata.normalize("NFKD", value.lower())
+                   if not unicodedata.combining(ch))
+
+def _mark(value):
+    return Markup(str(escape(value or "")).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>"))
+
+
+class Search:
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app):
+        app.config.setdefault("SEARCH_LIMIT", 50)            # resultados por búsqueda
+        app.config.setdefault("SEARCH_MIN_CHARS", 2)         # = prefijo más corto indexado
+        app.config.setdefault("SEARCH_RANK_WINDOW", 2000)    # máx. de filas puntuadas
+        self.app = app
+        # db.create_all() (bench, pruebas) crea también el índice y los triggers
+        if not event.contains(db.metadata, "after_create", _create_index):
+            event.listen(db.metadata, "after_create", _create_index)
+        app.extensions["search"] = self
+
+    @staticmethod
+    def enabled():
+        return db.engine.dialect.name == "sqlite"
+
+    # ─── mantenimiento ─────────────────────────────────
+    def rebuild(self):
+        """Borra y vuelve a crear el índice desde las tablas. Devuelve filas indexadas."""
+        if not self.enabled():
+            return 0
+        with db.engine.begin() as conn:
+            for stmt in drop() + schema() + populate():
+                conn.exec_driver_sql(stmt)
+            conn.exec_driver_sql("INSERT INTO busqueda(busqueda) VALUES ('optimize')")
+            return conn.exec_driver_sql("SELECT count(*) FROM busqueda").scalar()
+
+    # ─── búsqueda ──────────────────────────────────────
+    def search(self, q, limit=None, archivo=False):
+        """[Hit] ordenados por relevancia; los campos de texto vienen
+        como Markup con <mark> en lo que coincidió. Con `archivo`, al
+        final van las inscripciones archivadas que coincidan."""
+        limit = limit or self.app.config["SEARCH_LIMIT"]
+        if len(q.strip()) < self.app.config["SEARCH_MIN_CHARS"]:
+            return []
+        hits = self._search(q, limit)
+        if archivo and len(hits) < limit:
+            hits += self._search_archive(q, limit - len(hits))
+        return hits
+
+    def _search(self, q, limit):
+        if not self.enabled():
+            return self._search_like(q, limit)
+        match = fts_query(q)
+        if match is None:
+            return []
+        cfg = self.app.config
+        found = db.session.execute(text(
+            "SELECT count(*) FROM busqueda WHERE busqueda MATCH :q"), {"q": match}).scalar()
+        if not found:
+            return []
+        floor = 0
+        if found > cfg["SEARCH_RANK_WINDOW"]:
+            # demasiadas para puntuar: sólo las más recientes (rowid más alto)
+            floor = db.session.execute(text(
+                "SELECT rowid FROM busqueda WHERE busqueda MATCH :q"
+                " ORDER BY rowid DESC LIMIT 1 OFFSET :w"),
+                {"q": match, "w": cfg["SEARCH_RANK_WINDOW"]}).scalar()
+        rows = db.session.execute(text(
+            "SELECT rowid,"
+            f" highlight(busqueda, 0, '{_OPEN}', '{_CLOSE}'),"
+            f" highlight(busqueda, 1, '{_OPEN}', '{_CLOSE}'),"
+            f" highlight(busqueda, 2, '{_OPEN}', '{_CLOSE}'),"
+            f" snippet(busqueda, 3, '{_OPEN}', '{_CLOSE}', '…', 16) "
+            "FROM busqueda WHERE busqueda MATCH :q AND rowid > :floor "
+            "ORDER BY rank LIMIT :n"),
+            {"q": match, "floor": floor, "n": limit})
+        return [Hit(KINDS[rowid // SHIFT], rowid % SHIFT, _mark(nombre), _mark(email),
+                    _mark(telefono), _mark(detalle))
+                for rowid, nombre, email, telefono, detalle in rows]
+
+    def _search_like(self, q, limit):
+        terms = [t.lower() for t in _TERM.findall(q)][:8]
+        like = lambda col: or_(*[col.ilike(f"{t}%") for t in terms])
+        hits = []
+        for r in db.session.execute(
+                db.select(Inscripcion.id, Inscripcion.nombre, Inscripcion.email,
+                          Inscripcion.telefono_contacto, Inscripcion.curso)
+                .where(or_(like(Inscripcion.nombre), like(Inscripcion.email),
+                           like(Inscripcion.telefono_contacto)))
+                .order_by(Inscripcion.id.desc()).limit(limit)):
+            hits.append(Hit("inscripcion", r[0], *map(escape, r[1:])))
+        for r in db.session.execute(
+                db.select(User.id, User.email, User.role).where(like(User.email))
+                .order_by(User.id.desc()).limit(limit)):
+            hits.append(Hit("alumno", r[0], "", escape(r[1]), "", escape(r[2])))
+        for r in db.session.execute(
+                db.select(Testimonio.id, Testimonio.nombre, Testimonio.frase)
+                .where(like(Testimonio.nombre)).order_by(Testimonio.id.desc()).limit(limit)):
+            hits.append(Hit("testimonio", r[0], escape(r[1]), "", "", escape(r[2])))
+        return hits[:limit]
+
+    def _search_archive(self, q, limit):
+        q = q.strip()
+        if _PHONE.match(q):
+            q = re.sub(r"[^\d]", "", q)
+        terms = _WORD.findall(_fold(q))[:8]     # "juan.perez" → juan, perez (como el tokenizador)
+        if not terms:
+            return []
+        hits = []
+        for periodo in reversed(archive.periods()):
+            for r in reversed(archive.rows(periodo)):
+                words = _WORD.findall(_fold(f"{r.nombre} {r.email} {r.telefono_contacto} {r.curso}"))
+                words.append(re.sub(r"[^\d]", "", r.telefono_contacto or ""))
+                if all(any(w.startswith(t) for w in words) for t in terms):
+                    hits.append(Hit("archivada", r.id, *map(escape, (r.nombre, r.email,
+                                                                     r.telefono_contacto, r.curso))))
+                    if len(hits) >= limit:
+                        return hits
+        return hits
+
+
+def _create_index(metadata, conn, **kw):
+    if conn.dialect.name == "sqlite":
+        for stmt in schema():
+            conn.exec_driver_sql(stmt)
+
+
+search = Search()
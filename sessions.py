@@ -0,0 +1,333 @@
+# sessions.py
+# ---------------------------------------------------------
+# Sesiones del lado del servidor: la cookie sólo lleva un id
+# opaco y los datos viven en instance/ (SQLite o archivos)
+# ---------------------------------------------------------
+# Con la sesión de Flask por defecto, el 2FA pendiente, el estado
+# de Flask-Login, el token CSRF y los mensajes flash viajan firmados
+# en la cookie: el navegador la sube en cada request y el servidor la
+# vuelve a serializar y firmar cada vez que cambia.
+#
+# Aquí la cookie es "<id>.<versión>":
+#   · id       256 bits aleatorios; en el almacén sólo se guarda su hash
+#   · versión  etiqueta al azar que cambia en cada escritura. Cada
+#              worker guarda en memoria (LRU) las últimas sesiones
+#              leídas: si la versión de la cookie coincide con la
+#              cacheada no se lee el almacén, y si otro worker la cambió,
+#              la cookie ya trae la nueva y se relee. Al azar y no un
+#              contador: dos requests simultáneos que escriben no dejan
+#              la misma versión con datos distintos en dos workers.
+#
+# Sólo se escribe (almacén + Set-Cookie) cuando la sesión cambió.
+# Una visita que no toca la sesión no crea nada. La caducidad es
+# deslizante (SESSION_LIFETIME): se renueva con un UPDATE pequeño
+# cuando queda menos de la mitad, no en cada request. Las vencidas se
+# barren cada SESSION_SWEEP_INTERVAL segundos.
+#
+# SESSION_STORAGE:
+#   "sqlite"  instance/sessions.db, compartida por los workers (defecto)
+#   "file"    un archivo por sesión en instance/sessions/ (la caducidad
+#             es el mtime del archivo)
+#   "memory"  por proceso; sólo desarrollo con un único worker
+#   "cookie"  la sesión firmada de Flask, como antes
+#
+# Al iniciar sesión el id cambia (evita fijación de sesión).
+import os, time, sqlite3, hashlib, secrets, threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from flask.sessions import SecureCookieSession, SessionInterface, session_json_serializer
+from flask_login import user_logged_in
+
+
+class ServerSession(SecureCookieSession):
+    """dict de la sesión + su id y versión en el almacén."""
+
+    def __init__(self, initial=None, sid=None, version=0, expires=None):
+        super().__init__(initial)
+        self.sid, self.version, self.expires = sid, version, expires
+        self.rotate = False
+
+    def regenerate(self):
+        """Mismo contenido con un id nuevo (el viejo se borra al guardar)."""
+        self.rotate = self.modified = True
+
+
+def _key(sid):
+    # el almacén no guarda ids utilizables
+    return hashlib.blake2b(sid.encode(), digest_size=16).hexdigest()
+
+
+# ─── almacenes: (datos, versión, expira) por clave ─────
+class MemoryStore:
+    """Por proceso; sólo para desarrollo o un único worker."""
+
+    def __init__(self):
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._rows.get(key)
+
+    def put(self, key, data, version, expires):
+        with self._lock:
+            self._rows[key] = (data, version, expires)
+
+    def touch(self, key, expires):
+        with self._lock:
+            if key in self._rows:
+                self._rows[key] = self._rows[key][:2] + (expires,)
+
+    def delete(self, key):
+        with self._lock:
+            self._rows.pop(key, None)
+
+    def sweep(self, now):
+        with self._lock:
+            for key in [k for k, r in self._rows.items() if r[2] < now]:
+                del self._rows[key]
+
+
+class SqliteStore:
+    """Archivo SQLite compartido entre procesos; una conexión por hilo."""
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS session ("
+              " key TEXT PRIMARY KEY, data TEXT NOT NULL,"
+              " version INTEGER NOT NULL, expires REAL NOT NULL) WITHOUT ROWID")
+
+    def __init__(self, path, timeout_ms):
+        self.path, self.timeout_ms = path, timeout_ms
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():     # tras fork: conexión propia
+            conn = sqlite3.connect(self.path, isolation_level=None,
+                                   timeout=self.timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(self.SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_session_expires ON session (expires)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key):
+        return self._conn().execute("SELECT data, version, expires FROM session "
+                                    "WHERE key = ?", (key,)).fetchone()
+
+    def put(self, key, data, version, expires):
+        self._conn().execute("INSERT OR REPLACE INTO session VALUES (?, ?, ?, ?)",
+                             (key, data, version, expires))
+
+    def touch(self, key, expires):
+        self._conn().execute("UPDATE session SET expires = ? WHERE key = ?", (expires, key))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM session WHERE key = ?", (key,))
+
+    def sweep(self, now):
+        self._conn().execute("DELETE FROM session WHERE expires < ?", (now,))
+
+
+class FileStore:
+    """Un archivo por sesión: "<versión>\\n<datos>", mtime = expira."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, key)
+
+    def get(self, key):
+        try:
+            with open(self._file(key), encoding="utf-8") as fh:
+                expires = os.fstat(fh.fileno()).st_mtime
+                version, _, data = fh.read().partition("\n")
+            return data, int(version), expires
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, data, version, expires):
+        tmp = f"{self._file(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(f"{version}\n{data}")
+        os.utime(tmp, (expires, expires))
+        os.replace(tmp, self._file(key))
+
+    def touch(self, key, expires):
+        try:
+            os.utime(self._file(key), (expires, expires))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, key):
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self, now):
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < now:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+# ─── interfaz para Flask ────────────────────────────────
+class ServerSessionInterface(SessionInterface):
+
+    serializer = session_json_serializer      # el mismo de la cookie (tuplas, bytes, fechas…)
+
+    def __init__(self, store, lifetime, cache_size, sweep_interval):
+        self.store          = store
+        self.lifetime       = lifetime        # s
+        self.cache_size     = cache_size
+        self.sweep_interval = sweep_interval
+        self._cache  = OrderedDict()          # key -> (datos, versión, expira)
+        self._lock   = threading.Lock()
+        self._swept  = time.time()
+
+    # ─── caché en memoria ──────────────────────────────
+    def _cached(self, key, version):
+        hit = self._cache.get(key)
+        if hit is None or hit[1] != version:
+            return None
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+        return hit
+
+    def _remember(self, key, row):
+        with self._lock:
+            self._cache[key] = row
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
+    # ─── lectura ───────────────────────────────────────
+    def open_session(self, app, request):
+        sid, _, version = request.cookies.get(self.get_cookie_name(app), "").partition(".")
+        if not (sid and version.isdigit()):
+            return ServerSession()
+        key, version = _key(sid), int(version)
+        row = self._cached(key, version)
+        if row is None or row[2] < time.time():   # otro worker pudo renovarla
+            try:
+                row = self.store.get(key)
+            except sqlite3.Error:
+                app.logger.warning("sessions: almacén no disponible", exc_info=True)
+                return ServerSession()
+            if row is not None:
+                self._remember(key, tuple(row))
+        if row is None or row[2] < time.time():
+            return ServerSession()            # desconocida o vencida: empieza de cero
+        data, stored_version, expires = row
+        return ServerSession(self.serializer.loads(data), sid, stored_version, expires)
+
+    # ─── escritura ─────────────────────────────────────
+    def save_session(self, app, session, response):
+        if session.accessed:
+            response.vary.add("Cookie")
+        now = time.time()
+        if now - self._swept > self.sweep_interval:
+            self._swept = now
+            self._call(app, self.store.sweep, now)
+
+        if not session.modified:
+            # sin cambios: ni almacén ni Set-Cookie, salvo renovar la caducidad
+            if session.sid and session.expires - now < self.lifetime / 2:
+                session.expires = now + self.lifetime
+                key = _key(session.sid)
+                self._call(app, self.store.touch, key, session.expires)
+                self._forget(key)
+                if session.permanent:
+                    self._set_cookie(app, session, response)
+            return
+
+        if session.sid and (session.rotate or not session):
+            key = _key(session.sid)
+            self._call(app, self.store.delete, key)
+            self._forget(key)
+            session.sid = None
+        if not session:
+            response.delete_cookie(self.get_cookie_name(app),
+                                   domain=self.get_cookie_domain(app),
+                                   path=self.get_cookie_path(app),
+                                   secure=self.get_cookie_secure(app),
+                                   partitioned=self.get_cookie_partitioned(app),
+                                   samesite=self.get_cookie_samesite(app),
+                                   httponly=self.get_cookie_httponly(app))
+            response.vary.add("Cookie")
+            return
+
+        session.sid = session.sid or secrets.token_urlsafe(32)
+        session.version = secrets.randbits(32)
+        session.expires = now + self.lifetime
+        row = (self.serializer.dumps(dict(session)), session.version, session.expires)
+        key = _key(session.sid)
+        if self._call(app, self.store.put, key, *row) is not False:
+            self._remember(key, row)
+            self._set_cookie(app, session, response)
+
+    def _set_cookie(self, app, session, response):
+        expires = None
+        if session.permanent:
+            expires = datetime.fromtimestamp(session.expires, timezone.utc)
+        response.set_cookie(self.get_cookie_name(app), f"{session.sid}.{session.version}",
+                            expires=expires,
+                            httponly=self.get_cookie_httponly(app),
+                            domain=self.get_cookie_domain(app),
+                            path=self.get_cookie_path(app),
+                            secure=self.get_cookie_secure(app),
+                            partitioned=self.get_cookie_partitioned(app),
+                            samesite=self.get_cookie_samesite(app))
+        response.vary.add("Cookie")
+
+    @staticmethod
+    def _call(app, method, *args):
+        try:
+            method(*args)
+        except (sqlite3.Error, OSError):
+            # sin almacén la respuesta sale igual; la sesión no se guarda
+            app.logger.warning("sessions: almacén no disponible", exc_info=True)
+            return False
+
+
+def _rotate_on_login(sender, user, **extra):
+    from flask import session
+    if isinstance(session, ServerSession):
+        session.regenerate()
+
+
+def init_app(app):
+    app.config.setdefault("SESSION_STORAGE", "sqlite")        # sqlite | file | memory | cookie
+    app.config.setdefault("SESSION_LIFETIME", int(app.permanent_session_lifetime.total_seconds()))
+    app.config.setdefault("SESSION_CACHE_SIZE", 2048)         # sesiones en memoria por worker
+    app.config.setdefault("SESSION_SWEEP_INTERVAL", 600)      # s entre barridos de vencidas
+    cfg = app.config
+
+    storage = cfg["SESSION_STORAGE"]
+    if storage == "cookie":
+        return
+    if storage == "memory":
+        store = MemoryStore()
+    elif storage == "file":
+        store = FileStore(os.path.join(app.instance_path, "sessions"))
+    else:
+        os.makedirs(app.instance_path, exist_ok=True)
+        store = SqliteStore(os.path.join(app.instance_path, "sessions.db"),
+                            cfg.get("SQLITE_BUSY_TIMEOUT", 5000))
+    lifetime = cfg["SESSION_LIFETIME"]
+    if isinstance(lifetime, timedelta):
+        lifetime = lifetime.total_seconds()
+    app.session_interface = ServerSessionInterface(store, lifetime, cfg["SESSION_CACHE_SIZE"],
+                                                   cfg["SESSION_SWEEP_INTERVAL"])
+    user_logged_in.connect(_rotate_on_login, app)
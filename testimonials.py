@@ -0,0 +1,127 @@
+# testimonials.py
+# ---------------------------------------------------------
+# Testimonios: envío público con filtro de spam, cola de
+# moderación y carrusel de la portada
+# ---------------------------------------------------------
+# Lo que llega desde la portada entra como 'pending' y no se ve
+# hasta que un admin lo aprueba (uno o muchos a la vez en
+# /admin/testimonios). Recibir un envío NO toca la caché de páginas:
+# sólo moderar cambia lo publicado.
+#
+# El carrusel es una lista acotada (los TESTIMONIOS_CAROUSEL_SIZE
+# aprobados más recientes, por el índice (estado, id)) que cada
+# worker guarda en memoria. Moderar la marca vieja con
+# instance/testimonios.version y sube la versión de contenido,
+# porque la portada se cachea entera.
+#
+# Antispam del formulario (es anónimo y va dentro de la portada
+# cacheada, así que no lleva CSRF):
+#   · cupo por IP (RATELIMIT_TESTIMONIO_IP)
+#   · campo trampa oculto: si llega con algo se finge éxito
+#   · sin enlaces, longitud acotada (TestiForm), repetidos descartados
+#   · tope de la cola (TESTIMONIOS_MAX_PENDING): si se llena, no se
+#     acepta nada más hasta que alguien modere
+import os, re, time, threading
+from datetime import datetime
+
+from sqlalchemy import func
+
+from cache import page_cache, snapshot
+from models import db, Testimonio
+
+ESTADOS = ("pending", "approved", "rejected")
+_LINK = re.compile(r"https?://|www\.|\b[\w-]+\.(com|net|org|info|xyz|ru|io|ly)\b", re.I)
+
+
+class Testimonials:
+
+    def __init__(self, app=None):
+        self.app    = None
+        self._lock  = threading.Lock()
+        self._items = None                   # (versión, [dict]) del carrusel
+        self._stamp = None
+        if app is not None:
+            self.init_app(app)
+
+    # ─── configuración ─────────────────────────────────
+    def init_app(self, app):
+        app.config.setdefault("TESTIMONIOS_CAROUSEL_SIZE", 12)
+        app.config.setdefault("TESTIMONIOS_MAX_PENDING", 200)
+        self.app = app
+        os.makedirs(app.instance_path, exist_ok=True)
+        self._stamp = os.path.join(app.instance_path, "testimonios.version")
+        if not os.path.exists(self._stamp):
+            self.invalidate()
+        app.extensions["testimonials"] = self
+
+    def invalidate(self):
+        """El carrusel se vuelve a leer (en todos los workers)."""
+        with open(self._stamp, "w") as fh:
+            fh.write(str(time.time()))
+
+    def version(self):
+        try:
+            return os.stat(self._stamp).st_mtime_ns
+        except OSError:
+            return None
+
+    # ─── carrusel ──────────────────────────────────────
+    def carousel(self):
+        """Últimos aprobados (dicts), en memoria hasta la próxima moderación."""
+        version, hit = self.version(), self._items
+        if hit is not None and hit[0] == version:
+            return hit[1]
+        items = [snapshot(t) for t in db.session.scalars(
+            db.select(Testimonio).where(Testimonio.estado == "approved")
+            .order_by(Testimonio.id.desc())
+            .limit(self.app.config["TESTIMONIOS_CAROUSEL_SIZE"]))]
+        with self._lock:
+            self._items = (version, items)
+        return items
+
+    # ─── envío público ─────────────────────────────────
+    def submit(self, nombre, anio, frase, trampa=""):
+        """Guarda un envío como 'pending'. Devuelve 'queued', 'ignored'
+        (bot o repetido: al cliente se le dice que llegó), 'link' o 'full'."""
+        if trampa:
+            return "ignored"
+        nombre, frase = " ".join(nombre.split()), " ".join(frase.split())
+        if _LINK.search(frase) or _LINK.search(nombre):
+            return "link"
+        pendientes = db.select(Testimonio.id).where(Testimonio.estado == "pending")
+        if db.session.scalar(pendientes.where(Testimonio.frase == frase).limit(1)):
+            return "ignored"
+        if self.counts().get("pending", 0) >= self.app.config["TESTIMONIOS_MAX_PENDING"]:
+            return "full"
+        db.session.add(Testimonio(nombre=nombre, anio=anio, frase=frase, estado="pending"))
+        db.session.commit()
+        return "queued"
+
+    # ─── moderación ────────────────────────────────────
+    def counts(self):
+        """{estado: n}, contado sobre el índice (estado, id)."""
+        return dict(db.session.execute(
+            db.select(Testimonio.estado, func.count()).group_by(Testimonio.estado)).all())
+
+    def pending_ids(self):
+        return list(db.session.scalars(
+            db.select(Testimonio.id).where(Testimonio.estado == "pending")))
+
+    def moderate(self, ids, estado):
+        """Pasa `ids` a `estado` en un solo UPDATE. Devuelve cuántos cambiaron."""
+        if estado not in ESTADOS:
+            raise ValueError(f"Estado desconocido: {estado}")
+        if not ids:
+            return 0
+        n = db.session.execute(
+            db.update(Testimonio)
+            .where(Testimonio.id.in_(ids), Testimonio.estado != estado)
+            .values(estado=estado, moderado=datetime.utcnow())).rowcount
+        db.session.commit()
+        if n:
+            self.invalidate()
+            page_cache.bump()                # la portada lleva el carrusel
+        return n
+
+
+testimonials = Testimonials()
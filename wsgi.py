@@ -0,0 +1,19 @@
+# wsgi.py
+# ---------------------------------------------------------
+# Punto de entrada de producción:
+#   gunicorn -c gunicorn.conf.py
+# ---------------------------------------------------------
+# Con preload_app este módulo corre UNA vez, en el proceso maestro:
+# la app se construye y precalienta aquí y los workers la heredan
+# por fork (copy-on-write), así que arrancar o reciclar un worker
+# no vuelve a importar, compilar plantillas ni leer la BD.
+import gc
+
+from app import create_app, warm
+
+app = create_app()
+warm(app)
+
+# lo que existe ya vive lo que dure el proceso: fuera del recolector,
+# que si no lo recorre (y toca sus páginas) en cada worker
+gc.freeze()